@@ -1,126 +1,243 @@
-import pandas as pd
-import glob
-from pathlib import Path
-import os
-import csv
-import sys
-
-# -----------------------------------------------------------------
-# 1. 【设置】
-# (已为您的 'obsclim-histsoc' 情景更新)
-# -----------------------------------------------------------------
-
-# 您的父目录，即情景目录
-base_dir = Path("F:/fyp/obsclim-histsoc")
-
-# 您的情景名称 (用于输出文件名)
-scenario_name = "obsclim-histsoc"
-
-# 临时均值文件所在的文件夹
-temp_mean_dir = base_dir / "TEMP_MEANS"
-
-# 临时统计文件将要保存的文件夹
-temp_stats_dir = base_dir / "TEMP_STATS"
-temp_stats_dir.mkdir(exist_ok=True)  # 创建 'TEMP_STATS' 文件夹
-
-# 定义干旱和洪涝的阈值
-thresholds = {
-    "Drought_1.0": (lambda x: x <= -1.0),
-    "Drought_1.5": (lambda x: x <= -1.5),
-    "Flood_1.0": (lambda x: x >= 1.0),
-    "Flood_1.5": (lambda x: x >= 1.5)
-}
-
-print(f"--- ----------------------------------------- ---")
-print(f"--- 正在为 {scenario_name} 计算干旱/洪涝频率 ---")
-print(f"--- ----------------------------------------- ---")
-
-# -----------------------------------------------------------------
-# 2. 按批次计算频率
-# -----------------------------------------------------------------
-max_int = sys.maxsize
-while True:
-    try:
-        csv.field_size_limit(max_int)
-        break
-    except OverflowError:
-        max_int = int(max_int / 10)
-
-batch_mean_files = glob.glob(str(temp_mean_dir / "TEMP_MEAN_*.csv"))
-
-if not batch_mean_files:
-    print(f"!! 严重错误: 在 {temp_mean_dir} 中未找到任何 TEMP_MEAN_ 文件。")
-    print("!! 请先运行 'calculate_means.py' 脚本。")
-    exit()
-
-print(f"找到 {len(batch_mean_files)} 个均值批次文件。开始计算频率...")
-
-temp_stat_files = []
-
-for mean_file_path in batch_mean_files:
-
-    file_name = Path(mean_file_path).name
-    print(f"  -- 正在处理: {file_name} --")
-
-    try:
-        # 使用 'latin-1' 编码来读取，并跳过可能的损坏行
-        df = pd.read_csv(mean_file_path, engine='python', encoding='latin-1', on_bad_lines='warn')
-
-        grouped = df.groupby('Grid_ID')
-        batch_stats_list = []
-
-        for thresh_name, thresh_func in thresholds.items():
-            # (使用 include_groups=False 消除 FutureWarning)
-            freq_counts = grouped.apply(lambda x: thresh_func(x['Mean_SCI']).sum(), include_groups=False).reset_index(
-                name=thresh_name)
-
-            freq_counts = freq_counts.set_index('Grid_ID')
-            batch_stats_list.append(freq_counts)
-
-        batch_final_stats = pd.concat(batch_stats_list, axis=1)
-
-        # 获取 Lon/Lat 信息
-        grid_info = df[['Grid_ID', 'Lon', 'Lat']].drop_duplicates().set_index('Grid_ID')
-
-        # 将 Lon/Lat 添加到统计结果中
-        batch_final_stats_with_coords = grid_info.join(batch_final_stats).reset_index()
-
-        # 步骤 3: 保存 *临时的* 统计文件
-        temp_stat_file = temp_stats_dir / f"STAT_{file_name.replace('TEMP_MEAN_', '')}"
-        batch_final_stats_with_coords.to_csv(temp_stat_file, index=False)
-        temp_stat_files.append(temp_stat_file)
-
-    except Exception as e:
-        print(f"  !! 严重错误: 处理文件 {file_name} 时失败: {e}")
-
-# -----------------------------------------------------------------
-# 3. 【最终合并 统计文件】(内存安全)
-# -----------------------------------------------------------------
-if not temp_stat_files:
-    print("!! 严重错误: 未能处理任何批次，没有临时统计文件可合并。")
-else:
-    print(f"\n...所有批次的频率计算完毕。")
-    print(f"开始合并 {len(temp_stat_files)} 个临时统计文件...")
-
-    try:
-        final_df_list = [pd.read_csv(f, engine='python', encoding='latin-1') for f in temp_stat_files]
-        final_data = pd.concat(final_df_list, ignore_index=True)
-        final_data = final_data.sort_values(by='Grid_ID')
-
-        # 3. 最终输出文件
-        output_file_name = f"{scenario_name}_FREQUENCY_STATS.csv"
-        output_file_path = base_dir / output_file_name
-        final_data.to_csv(output_file_path, index=False)
-
-        print(f"\n====================================================")
-        print(f"--- 成功！情景 {scenario_name} 的最终频率文件已保存到: {output_file_path} ---")
-        print("====================================================")
-
-        print("正在清理 TEMP_STATS 文件夹...")
-        for f in temp_stat_files:
-            os.remove(f)
-        os.rmdir(temp_stats_dir)
-        print("清理完毕。")
-
-    except Exception as e:
-        print(f"!! 严重错误: 在最终合并时失败: {e}")
\ No newline at end of file
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sci_store import STORE_DIR_NAME, CUBE_STEM, open_cube, batch_files
+from sci_frequency import DEFAULT_THRESHOLDS, frequency_frame, model_frequency_frame
+from sci_ensemble import MODEL_DIR_NAME
+from sci_events import event_frame
+from sci_threshold import (PERCENTILE_FILE_SUFFIX, CURVE_FILE_SUFFIX, percentile_names, percentile_thresholds,
+                           grid_cutoffs, curve_levels, curve_columns, curve_frame)
+from sci_manifest import MANIFEST_NAME, Manifest, file_signature
+from sci_pipeline import stage_overrides
+from sci_metrics import METRICS_FILE_NAME, MetricsLog, file_bytes
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# (已为您的 'obsclim-histsoc' 情景更新)
+# -----------------------------------------------------------------
+
+# 您的父目录，即情景目录
+base_dir = Path("F:/fyp/obsclim-histsoc")
+
+# 您的情景名称 (用于输出文件名)
+scenario_name = "obsclim-histsoc"
+
+# 每次从内存映射立方体中读取的网格数
+CHUNK_GRIDS = 1000
+
+# 定义干旱和洪涝的阈值
+# ("Drought_X" 表示 SCI <= -X，"Flood_X" 表示 SCI >= X，可任意增加)
+# ("Drought_Q10" / "Flood_Q95" 表示逐网格的百分位阈值，见下方的参考情景)
+# (默认为 Drought_1.0 / Drought_1.5 / Flood_1.0 / Flood_1.5)
+thresholds = list(DEFAULT_THRESHOLDS)
+
+# 百分位阈值的参考情景 (其 MEANS_STORE) 和参考期:
+# 逐网格的切点只由参考情景计算一次，所有情景都用同一组切点计数
+PERCENTILE_REFERENCE_DIR = Path("E:/dissertation/countclim-1901soc")
+PERCENTILE_REFERENCE_PERIOD = None  # 例如 ("1981-01-01", "2010-12-31")；None 为整个时段
+
+# 同时识别事件 (次数、持续时间、累计亏缺/盈余、峰值强度)
+EVENT_STATS = False
+
+# 超过频率曲线: 在 0 ~ CURVE_MAX_LEVEL (步长 CURVE_STEP) 的密集阈值网格上
+# 同时计算干旱/洪涝次数 (用于阈值敏感性分析)
+EXCEEDANCE_CURVE = False
+CURVE_MAX_LEVEL = 3.0
+CURVE_STEP = 0.05
+
+# 逐模型计数: 存在各模型立方体时 ('calculate_means.py' 的 SAVE_MODEL_CUBES)，
+# 同时对每个模型计数，写出 *_MODEL_FREQUENCY_STATS.csv (列为 <阈值>_<模型名>)
+MODEL_FREQUENCY = False
+
+# 由 'run_pipeline.py' 启动时，用配置文件中该情景的设置覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    base_dir = Path(overrides['base_dir'])
+    scenario_name = overrides['scenario_name']
+    thresholds = overrides.get('thresholds', thresholds)
+    PERCENTILE_REFERENCE_DIR = Path(overrides.get('percentile_reference_dir', PERCENTILE_REFERENCE_DIR))
+    PERCENTILE_REFERENCE_PERIOD = overrides.get('percentile_reference_period', PERCENTILE_REFERENCE_PERIOD)
+    EVENT_STATS = overrides.get('event_stats', EVENT_STATS)
+    EXCEEDANCE_CURVE = overrides.get('exceedance_curve', EXCEEDANCE_CURVE)
+    MODEL_FREQUENCY = overrides.get('model_frequency', MODEL_FREQUENCY)
+
+# 均值立方体所在的文件夹 (由 'calculate_means.py' 生成)
+store_dir = base_dir / STORE_DIR_NAME
+
+# 最终输出文件
+output_file_path = base_dir / f"{scenario_name}_FREQUENCY_STATS.csv"
+event_file_path = base_dir / f"{scenario_name}_EVENT_STATS.csv"
+threshold_file_path = base_dir / f"{scenario_name}{PERCENTILE_FILE_SUFFIX}"
+curve_file_path = base_dir / f"{scenario_name}{CURVE_FILE_SUFFIX}"
+model_file_path = base_dir / f"{scenario_name}_MODEL_FREQUENCY_STATS.csv"
+
+# 各模型立方体 (如果有)
+model_dirs = {}
+if MODEL_FREQUENCY:
+    model_dirs = {d.name: d for d in sorted((store_dir / MODEL_DIR_NAME).glob("*"))
+                  if (d / f"{CUBE_STEM}.grid.npy").exists()}
+
+# 百分位阈值 (如果有) 以及参考情景的均值立方体
+percentile_columns = percentile_names(thresholds)
+reference_store_dir = PERCENTILE_REFERENCE_DIR / STORE_DIR_NAME
+
+print(f"--- ----------------------------------------- ---")
+print(f"--- 正在为 {scenario_name} 计算干旱/洪涝频率 ---")
+print(f"--- ----------------------------------------- ---")
+
+# -----------------------------------------------------------------
+# 2. 按网格块计算频率
+# -----------------------------------------------------------------
+if not (store_dir / f"{CUBE_STEM}.grid.npy").exists():
+    print(f"!! 严重错误: 在 {store_dir} 中未找到均值立方体。")
+    print("!! 请先运行 'calculate_means.py' 脚本。")
+    exit(1)
+if percentile_columns and not (reference_store_dir / f"{CUBE_STEM}.grid.npy").exists():
+    print(f"!! 严重错误: 百分位阈值 {percentile_columns} 需要参考情景的均值立方体: {reference_store_dir}")
+    exit(1)
+
+# 均值立方体 (及参考情景的立方体) 和阈值都未变化时，直接沿用上次的结果
+manifest = Manifest(base_dir / MANIFEST_NAME)
+stage_inputs = file_signature(batch_files(store_dir, CUBE_STEM)
+                              + (batch_files(reference_store_dir, CUBE_STEM) if percentile_columns else [])
+                              + [p for d in model_dirs.values() for p in batch_files(d, CUBE_STEM)])
+# 曲线参数记录为输出列名 (列名的写法变化时也会重新计算)
+stage_params = {'thresholds': thresholds, 'events': EVENT_STATS,
+                'curve': curve_columns(curve_levels(CURVE_MAX_LEVEL, CURVE_STEP)) if EXCEEDANCE_CURVE else None,
+                'models': list(model_dirs)}
+if percentile_columns:
+    stage_params['percentile_reference'] = [str(PERCENTILE_REFERENCE_DIR), PERCENTILE_REFERENCE_PERIOD]
+stage_outputs = ([output_file_path] + ([event_file_path] if EVENT_STATS else [])
+                 + ([threshold_file_path] if percentile_columns else [])
+                 + ([curve_file_path] if EXCEEDANCE_CURVE else [])
+                 + ([model_file_path] if model_dirs else []))
+if manifest.is_current('frequency', scenario_name, stage_inputs, stage_params, stage_outputs):
+    print(f"均值立方体和阈值均未变化，沿用已有结果: {output_file_path}")
+    exit()
+
+# 运行指标 (耗时、行数、读写字节数、峰值内存) 追加到 PIPELINE_METRICS.jsonl
+metrics = MetricsLog(base_dir / METRICS_FILE_NAME)
+timer = metrics.start("frequency.total", batch=scenario_name)
+
+# 内存映射打开，只有被切片的网格才会真正从磁盘读取
+cube = open_cube(store_dir)
+timer.add(bytes_read=file_bytes(batch_files(store_dir, CUBE_STEM)))
+print(f"找到 {len(cube)} 个网格 x {len(cube.dates)} 个月的均值立方体。开始计算频率...")
+
+# 百分位阈值: 由参考情景逐网格计算一次，保存一份供查阅
+threshold_table = None
+if percentile_columns:
+    with timer.phase('percentiles'):
+        threshold_table = percentile_thresholds(open_cube(reference_store_dir), thresholds,
+                                                reference=PERCENTILE_REFERENCE_PERIOD, chunk_grids=CHUNK_GRIDS)
+    threshold_table.to_csv(threshold_file_path, index=False)
+    print(f"百分位阈值 ({', '.join(percentile_columns)}) 由参考情景 {PERCENTILE_REFERENCE_DIR.name} 计算，"
+          f"已保存到: {threshold_file_path}")
+
+levels = curve_levels(CURVE_MAX_LEVEL, CURVE_STEP)
+
+model_cubes = {name: open_cube(d) for name, d in model_dirs.items()}
+if model_cubes:
+    print(f"找到 {len(model_cubes)} 个模型的立方体 ({', '.join(model_cubes)})，将同时逐模型计数。")
+
+stats_list = []
+event_list = []
+curve_list = []
+model_list = []
+failed_chunks = []
+
+for start in range(0, len(cube), CHUNK_GRIDS):
+    chunk = cube.rows(start, start + CHUNK_GRIDS)
+    print(f"  -- 正在处理网格: {start + 1} - {start + len(chunk)} --")
+
+    try:
+        # 百分位阈值按 Grid_ID 对齐到本块 (固定阈值不需要)
+        cutoffs = grid_cutoffs(threshold_table, thresholds, chunk.grid_ids) if percentile_columns else None
+
+        # 所有阈值在一次向量化遍历中完成计数 (结果已带 Grid_ID/Lon/Lat)
+        with timer.phase('count'):
+            batch_final_stats_with_coords = frequency_frame(chunk, thresholds, cutoffs)
+        stats_list.append(batch_final_stats_with_coords)
+        timer.add(rows=chunk.values.size)
+
+        # 事件识别复用同一块数据 (游程边界一次向量化求出)
+        if EVENT_STATS:
+            with timer.phase('events'):
+                event_list.append(event_frame(chunk, thresholds, cutoffs))
+
+        # 超过频率曲线: 所有阈值一次 searchsorted
+        if EXCEEDANCE_CURVE:
+            with timer.phase('curve'):
+                curve_list.append(curve_frame(chunk, levels))
+
+        # 逐模型计数: 各模型按 Grid_ID 对齐到本块，[model, grid, month] 一次计数
+        if model_cubes:
+            with timer.phase('models'):
+                model_values = np.stack([c.align(chunk.grid_ids) for c in model_cubes.values()])
+                model_list.append(model_frequency_frame(chunk, model_values, list(model_cubes), thresholds, cutoffs))
+
+    except Exception as e:
+        print(f"  !! 严重错误: 处理网格 {start + 1} - {start + len(chunk)} 时失败: {e}")
+        failed_chunks.append(f"{start + 1}-{start + len(chunk)}")
+
+# 任何网格块失败时不写出部分结果，也不更新清单 (否则之后的运行会认为结果已是最新而跳过)
+if failed_chunks:
+    print(f"!! 严重错误: {len(failed_chunks)} 个网格块失败 ({', '.join(failed_chunks)})，未写入任何结果。")
+    metrics.finish(timer)
+    exit(1)
+
+# -----------------------------------------------------------------
+# 3. 【最终合并 统计结果】
+# (每个网格只有一行统计，直接在内存中合并，不再写 TEMP_STATS)
+# -----------------------------------------------------------------
+if not stats_list:
+    print("!! 严重错误: 未能处理任何网格块，没有统计结果可合并。")
+    metrics.finish(timer)
+    exit(1)
+
+print(f"\n...所有网格块的频率计算完毕。")
+print(f"开始合并 {len(stats_list)} 个网格块的统计结果...")
+
+try:
+    final_data = pd.concat(stats_list, ignore_index=True)
+    final_data = final_data.sort_values(by='Grid_ID')
+
+    with timer.phase('write'):
+        final_data.to_csv(output_file_path, index=False)
+
+    if EVENT_STATS:
+        event_data = pd.concat(event_list, ignore_index=True).sort_values(by='Grid_ID')
+        with timer.phase('write'):
+            event_data.to_csv(event_file_path, index=False)
+        print(f"--- 事件统计已保存到: {event_file_path} ---")
+
+    if EXCEEDANCE_CURVE:
+        curve_data = pd.concat(curve_list, ignore_index=True).sort_values(by='Grid_ID')
+        with timer.phase('write'):
+            curve_data.to_csv(curve_file_path, index=False)
+        print(f"--- 超过频率曲线 ({len(levels)} 个阈值) 已保存到: {curve_file_path} ---")
+
+    if model_cubes:
+        model_data = pd.concat(model_list, ignore_index=True).sort_values(by='Grid_ID')
+        with timer.phase('write'):
+            model_data.to_csv(model_file_path, index=False)
+        print(f"--- 逐模型频率 ({len(model_cubes)} 个模型) 已保存到: {model_file_path} ---")
+    timer.add(bytes_written=file_bytes(stage_outputs))
+
+except Exception as e:
+    print(f"!! 严重错误: 在最终合并时失败: {e}")
+    manifest.forget('frequency', scenario_name)
+    manifest.save()
+    metrics.finish(timer)
+    exit(1)
+
+manifest.record('frequency', scenario_name, stage_inputs, stage_params, stage_outputs)
+manifest.save()
+
+print(f"\n====================================================")
+print(f"--- 成功！情景 {scenario_name} 的最终频率文件已保存到: {output_file_path} ---")
+print("====================================================")
+
+metrics.finish(timer)
+print(f"运行指标已追加到: {metrics.path}")
@@ -1,156 +1,646 @@
-import pandas as pd
-import glob
-from pathlib import Path
-import os
-import multiprocessing
-import csv
-import sys
-
-# -----------------------------------------------------------------
-# 1. 【!! 关键修复 !!】: 强行突破 CSV 读取限制
-# -----------------------------------------------------------------
-max_int = sys.maxsize
-while True:
-    try:
-        csv.field_size_limit(max_int)
-        break
-    except OverflowError:
-        max_int = int(max_int / 10)
-print(f"!!! 已将 CSV 字段大小限制提高到 {max_int} 以处理损坏文件 !!!")
-# -----------------------------------------------------------------
-
-
-# -----------------------------------------------------------------
-# 2. 【设置】
-# -----------------------------------------------------------------
-base_dir = Path("E:/dissertation/countclim-histsoc")
-models = [
-    "h08", "hydropy", "jules-w2", "lpjml5-7-10-fire",
-    "miroc-integ-land", "watergap2-2e", "web-dhm-sg"
-]
-
-# 我们知道 R 脚本生成的正确列名
-# (来自 R 脚本: data.table(Grid_ID, Lon, Lat, Date, Qtot, SCI))
-CORRECT_COLUMN_NAMES = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
-
-try:
-    WORKER_COUNT = 2
-    if WORKER_COUNT < 1: WORKER_COUNT = 1
-except NotImplementedError:
-    WORKER_COUNT = 4
-
-print(f"--- ------------------------------------ ---")
-print(f"--- 正在处理情景: {base_dir.name} (并行加速 + 错误修复 v4) ---")
-print(f"--- 将使用 {WORKER_COUNT} 个 CPU 核心同时处理 ---")
-print(f"--- ------------------------------------ ---")
-
-
-# -----------------------------------------------------------------
-# 3. 定义“单个工人”的任务
-# -----------------------------------------------------------------
-def process_batch(suffix):
-    """
-    此函数处理 *一个* 批次 (例如 'grids_1_160.csv')
-    """
-    print(f"  -- [开始] 正在处理批次: {suffix} --")
-
-    batch_data_list = []
-
-    for mod in models:
-        file_path = base_dir / f"{mod}_{suffix}"
-
-        if file_path.exists():
-            try:
-                # 【!! 此处是唯一的更改 !!】
-                # 我们强行指定了列名，并跳过了损坏的标题行
-                df = pd.read_csv(
-                    file_path,
-                    engine='python',
-                    encoding='latin-1',
-                    on_bad_lines='warn',  # 跳过坏行
-                    header=None,  # <--- 新增：不读取标题行
-                    skiprows=1,  # <--- 新增：跳过(损坏的)第1行
-                    names=CORRECT_COLUMN_NAMES  # <--- 新增：强行使用此列名
-                )
-
-                # 强制将列转换为数字
-                df['SCI'] = pd.to_numeric(df['SCI'], errors='coerce')
-                df['Grid_ID'] = pd.to_numeric(df['Grid_ID'], errors='coerce')
-                df['Lon'] = pd.to_numeric(df['Lon'], errors='coerce')
-                df['Lat'] = pd.to_numeric(df['Lat'], errors='coerce')
-
-                # 我们只保留我们需要（且存在）的列
-                columns_to_keep = ['Grid_ID', 'Lon', 'Lat', 'Date', 'SCI']
-                existing_cols = [col for col in columns_to_keep if col in df.columns]
-                df_subset = df[existing_cols]
-                batch_data_list.append(df_subset)
-
-            except Exception as e:
-                # 捕获其他可能的错误
-                print(f"  !! 警告: 读取文件 {file_path} 失败: {e}")
-        else:
-            print(f"  !! 警告: 模型 {mod} 缺少批次 {suffix}，已跳过。")
-
-    if not batch_data_list:
-        print(f"  !! 警告: 批次 {suffix} 未加载到任何数据，跳过。")
-        return False  # 返回失败
-
-    # 合并、计算均值、保存
-    try:
-        batch_all_models_data = pd.concat(batch_data_list, ignore_index=True)
-        del batch_data_list
-
-        group_keys = ['Grid_ID', 'Lon', 'Lat', 'Date']
-        valid_group_keys = [key for key in group_keys if key in batch_all_models_data.columns]
-
-        mean_batch_data = batch_all_models_data.groupby(
-            valid_group_keys
-        ).agg(
-            Mean_SCI=('SCI', 'mean')
-        ).reset_index()
-
-        temp_dir = base_dir / "TEMP_MEANS"
-        temp_dir.mkdir(exist_ok=True)
-
-        temp_output_file = temp_dir / f"TEMP_MEAN_{suffix}"
-        mean_batch_data.to_csv(temp_output_file, index=False, float_format='%.6f')
-
-        print(f"  -- [完成] 批次 {suffix} 处理完毕。 --")
-        return True  # 返回成功
-
-    except Exception as e:
-        print(f"  !! 严重错误: 处理批次 {suffix} 时失败: {e}")
-        return False  # 返回失败
-
-
-# -----------------------------------------------------------------
-# 4. 【主程序】: 创建“工头”并分配任务
-# -----------------------------------------------------------------
-if __name__ == "__main__":
-
-    all_suffixes = set()
-    for mod in models:
-        files = base_dir.glob(f"{mod}_grids_*.csv")
-        suffixes = [f.name.replace(f"{mod}_", "") for f in files]
-        all_suffixes.update(suffixes)
-
-    if not all_suffixes:
-        print(f"!! 严重错误: 在 {base_dir} 中未找到任何模型的任何批次文件。")
-        exit()
-
-    batch_suffixes = sorted(list(all_suffixes))
-    print(f"找到 {len(batch_suffixes)} 个独特的批次后缀。开始分派任务...")
-
-    with multiprocessing.Pool(processes=WORKER_COUNT) as pool:
-        results = pool.map(process_batch, batch_suffixes)
-
-    print(f"\n====================================================")
-    print(f"--- 所有 {len(batch_suffixes)} 个批次均已处理完毕 ---")
-
-    success_count = sum(results)
-    print(f"--- 成功: {success_count} 个批次 ---")
-    if len(batch_suffixes) - success_count > 0:
-        print(f"--- 失败: {len(batch_suffixes) - success_count} 个批次 ---")
-
-    print(f"--- 您的 {success_count} 个临时均值文件位于: {base_dir / 'TEMP_MEANS'} ---")
-    print("====================================================")
\ No newline at end of file
+import numpy as np
+import pandas as pd
+import glob
+from pathlib import Path
+import os
+import multiprocessing
+from functools import partial
+
+from sci_store import (STORE_DIR_NAME, CUBE_STEM, DATE_DTYPE, SciCube, write_batch, consolidate, natural_key,
+                       batch_stem, batch_files, long_to_cube, allocate_shared_cube, write_shared_rows,
+                       finalize_shared_cube, discard_shared_cube)
+from sci_frequency import DEFAULT_THRESHOLDS, frequency_frame
+from sci_ensemble import SPREAD_FIELDS, ensemble_cubes, model_store_dirs
+from sci_manifest import MANIFEST_NAME, Manifest, file_signature
+from sci_netcdf import (NETCDF_GRID_INDEX_NAME, find_qtot_files, load_grid_index, batch_suffixes as netcdf_suffixes,
+                        suffix_grid_range, read_model_batch, PERIOD)
+from sci_ingest import (RAW_CACHE_DIR_NAME, QUARANTINE_DIR_NAME, read_raw_batch, write_quarantine_report,
+                        grid_line_index, index_slice)
+from sci_index import compute_sci
+from sci_schedule import estimate_rows, plan_tasks
+from sci_pipeline import stage_overrides
+from sci_metrics import (METRICS_FILE_NAME, StageTimer, MetricsLog, file_bytes, profiled, keep_slowest,
+                         run_profile_dir)
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+base_dir = Path("E:/dissertation/countclim-histsoc")
+# 情景名称 (融合模式的输出文件名，与 'calculate_frequency.py' 相同)
+scenario_name = base_dir.name
+models = [
+    "h08", "hydropy", "jules-w2", "lpjml5-7-10-fire",
+    "miroc-integ-land", "watergap2-2e", "web-dhm-sg"
+]
+
+# 我们知道 R 脚本生成的正确列名
+# (来自 R 脚本: data.table(Grid_ID, Lon, Lat, Date, Qtot, SCI))
+CORRECT_COLUMN_NAMES = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+
+# 输入来源: "csv" = R 脚本导出的 {model}_grids_X_Y.csv
+#          "netcdf" = 直接读取 ISIMIP3b qtot NetCDF (SCI 在 Python 中计算)
+INPUT_SOURCE = "csv"
+netcdf_dir = base_dir / "netcdf"
+NETCDF_BATCH_SIZE = 160
+
+# SCI 计算方式 (NetCDF 模式始终在 Python 中计算；
+# CSV 模式下 RECOMPUTE_SCI = True 时忽略 R 导出的 SCI 列，由 Qtot 重新计算)
+RECOMPUTE_SCI = False
+SCI_METHOD = "gringorten"     # "gringorten" (经验分布) 或 "gamma"
+SCI_SCALE = 1                 # 累积尺度 (月): 1 / 3 / 6 / 12
+SCI_REFERENCE = None          # 参考期，例如 ("1981-01-01", "2010-12-31")；None 为整个时段
+
+# 是否将校验后的原始批次缓存为二进制文件 (RAW_CACHE)，
+# 重新运行时源文件未变化就不再解析 CSV
+USE_RAW_CACHE = True
+
+# 是否同时保存模型间离散度 (Std/Min/Max/N_Models/Sign_Agreement)，
+# 保存在 MEANS_STORE/spread/<字段名>/ 中，格式与均值立方体相同 (每次多写 5 个立方体，默认关闭)
+SAVE_ENSEMBLE_SPREAD = False
+SPREAD_DIR_NAME = "spread"
+
+# 是否同时保存对齐后的各模型立方体 (MEANS_STORE/models/<模型名>/)，
+# 供 'calculate_frequency.py' 逐模型计数、'run_final_attribution.py' 计算模型一致性。
+# 各模型数据在计算集合均值时已经读入并对齐，这里只是顺便写出，不会重新读取任何文件。
+SAVE_MODEL_CUBES = False
+
+# 【共享立方体】: 父进程预先分配整个情景的 mean_sci.*.npy (内存映射)，
+# 每个工人把结果直接写到本批次 Grid_ID 范围对应的行，只返回成功与否，
+# 不写批次文件，也不需要再合并 (没有空缺行时最后只是改名)。
+# 代价: 每次都重新计算所有批次 (输入和参数都未变化时整个阶段跳过)，
+# 不能像批次文件那样只重算变化的批次。
+SHARED_CUBE = False
+
+# 【融合模式】: 每个工人在同一进程内完成 均值 -> 频率计数，
+# 不写任何中间文件，结果按网格顺序直接流式写入 *_FREQUENCY_STATS.csv
+# (相当于同时运行了 'calculate_frequency.py')
+FUSED_FREQUENCY = False
+thresholds = list(DEFAULT_THRESHOLDS)
+
+try:
+    WORKER_COUNT = 2
+    if WORKER_COUNT < 1: WORKER_COUNT = 1
+except NotImplementedError:
+    WORKER_COUNT = 4
+
+# 【内存预算】(GB): 设置后由批次文件大小估算每个任务的峰值内存，
+# 自动决定并行数 (最多 MAX_WORKERS 个)，超出预算的批次按网格范围拆成子批次。
+# None = 不限制，使用上面固定的 WORKER_COUNT。
+MEMORY_BUDGET_GB = None
+MAX_WORKERS = multiprocessing.cpu_count()
+
+# 【运行指标】: 每个批次的墙钟/CPU 时间、行数、读写字节数和工人峰值内存
+# 追加写入 base_dir/PIPELINE_METRICS.jsonl (每行一条 JSON)。
+# PROFILE_SLOWEST > 0 时每个批次在 cProfile 下运行，只保留最慢的 N 个批次的剖析结果 (PROFILE/<run_id>/)。
+PROFILE_SLOWEST = 0
+
+# 由 'run_pipeline.py' 启动时，用配置文件中该情景的设置覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    base_dir = Path(overrides['base_dir'])
+    scenario_name = overrides.get('scenario_name', base_dir.name)
+    netcdf_dir = Path(overrides.get('netcdf_dir', base_dir / "netcdf"))
+    models = overrides.get('models', models)
+    thresholds = overrides.get('thresholds', thresholds)
+    MEMORY_BUDGET_GB = overrides.get('memory_budget_gb', MEMORY_BUDGET_GB)
+    SAVE_MODEL_CUBES = overrides.get('model_cubes', SAVE_MODEL_CUBES)
+    SHARED_CUBE = overrides.get('shared_cube', SHARED_CUBE)
+    SAVE_ENSEMBLE_SPREAD = overrides.get('ensemble_spread', SAVE_ENSEMBLE_SPREAD)
+
+print(f"--- ------------------------------------ ---")
+print(f"--- 正在处理情景: {base_dir.name} (并行加速 + 错误修复 v4) ---")
+if MEMORY_BUDGET_GB is None:
+    print(f"--- 将使用 {WORKER_COUNT} 个 CPU 核心同时处理 ---")
+else:
+    print(f"--- 内存预算 {MEMORY_BUDGET_GB} GB，最多 {MAX_WORKERS} 个 CPU 核心 ---")
+print(f"--- ------------------------------------ ---")
+
+
+# -----------------------------------------------------------------
+# 2. 定义“单个工人”的任务
+# -----------------------------------------------------------------
+def netcdf_grid_rows(suffix):
+    """NetCDF 模式下，一个批次后缀对应的格点 (Grid_ID, Lon, Lat)。"""
+    grid_index = pd.read_csv(base_dir / NETCDF_GRID_INDEX_NAME)
+    start, end = suffix_grid_range(suffix)
+    return grid_index[grid_index['Grid_ID'].between(start, end)]
+
+
+def compute_batch_ensemble(task, timer):
+    """
+    读取 *一个* 批次 (例如 'grids_1_160.csv') 的所有模型，
+    task['grid_range'] 不为 None 时只保留该子范围内的网格。
+    返回 {字段名: SciCube} (Mean_SCI 及离散度字段；SAVE_MODEL_CUBES 时还有 'models')；
+    没有任何数据时返回 None。
+    读取的行数、字节数和各步骤耗时记入 timer。
+    """
+    suffix = task['source']
+    batch_data_list = []
+    loaded_models = []
+
+    for mod in models:
+        if INPUT_SOURCE == "netcdf":
+            try:
+                with timer.phase('read'):
+                    df = read_model_batch(netcdf_dir, mod, netcdf_grid_rows(task['suffix']),
+                                          sci_scale=SCI_SCALE, sci_method=SCI_METHOD, sci_reference=SCI_REFERENCE)
+                timer.add(rows=len(df))
+                batch_data_list.append(df[['Grid_ID', 'Lon', 'Lat', 'Date', 'SCI']])
+                loaded_models.append(mod)
+            except Exception as e:
+                print(f"  !! 警告: 读取模型 {mod} 的 NetCDF 失败: {e}")
+            continue
+
+        file_path = base_dir / f"{mod}_{suffix}"
+
+        if file_path.exists():
+            try:
+                # 快速 C 引擎读取；只有失败的文件才逐行抢救
+                cache_dir = base_dir / RAW_CACHE_DIR_NAME if USE_RAW_CACHE else None
+                # 子批次: 只读取本任务网格的字节 (见 attach_line_indexes)
+                line_index = task.get('line_index', {}).get(mod)
+                with timer.phase('read'):
+                    df, dropped, engine = read_raw_batch(file_path, CORRECT_COLUMN_NAMES, cache_dir=cache_dir,
+                                                         grid_range=task['grid_range'], line_index=line_index,
+                                                         source_range=task.get('source_range'))
+                read_bytes = file_path.stat().st_size if line_index is None else \
+                    int((line_index['byte_end'] - line_index['byte_start']).sum())
+                timer.add(rows=len(df), bytes_read=read_bytes)
+
+                if dropped:
+                    # 子批次各自报告自己范围内被丢弃的行
+                    report_path = write_quarantine_report(base_dir / QUARANTINE_DIR_NAME, mod, task['suffix'], dropped)
+                    print(f"  !! 警告: {file_path.name} 丢弃了 {len(dropped)} 行 ({engine})，详见: {report_path}")
+
+                if RECOMPUTE_SCI:
+                    # 整个批次的所有网格一次转换为 [grid, month] 后计算
+                    with timer.phase('sci'):
+                        qtot = long_to_cube(df, value_col='Qtot')
+                        sci = compute_sci(qtot.values, qtot.dates, scale=SCI_SCALE,
+                                          method=SCI_METHOD, reference=SCI_REFERENCE)
+                        df = SciCube(qtot.grid, qtot.dates, sci).to_frame(value_col='SCI')
+
+                # 我们只保留我们需要（且存在）的列
+                columns_to_keep = ['Grid_ID', 'Lon', 'Lat', 'Date', 'SCI']
+                existing_cols = [col for col in columns_to_keep if col in df.columns]
+                df_subset = df[existing_cols]
+                batch_data_list.append(df_subset)
+                loaded_models.append(mod)
+
+            except Exception as e:
+                # 捕获其他可能的错误
+                print(f"  !! 警告: 读取文件 {file_path} 失败: {e}")
+        else:
+            print(f"  !! 警告: 模型 {mod} 缺少批次 {suffix}，已跳过。")
+
+    if not batch_data_list:
+        print(f"  !! 警告: 批次 {suffix} 未加载到任何数据，跳过。")
+        return None
+
+    # 对齐到共同的 [grid, month] 索引，沿模型轴一次性归约
+    with timer.phase('ensemble'):
+        return ensemble_cubes(batch_data_list, value_col='SCI',
+                              model_names=loaded_models if SAVE_MODEL_CUBES else None)
+
+
+def batch_cubes(batch_ensemble):
+    """
+    返回 [(存储目录, SciCube)]，与 store_dirs() 对应，但均值排在最后 (它的存在代表整个批次已完成)。
+    本批次缺失的模型为全 NaN 立方体，保证所有模型的网格索引一致。
+    """
+    store_dir = base_dir / STORE_DIR_NAME
+    mean_cube = batch_ensemble['Mean_SCI']
+    cubes = []
+    if SAVE_ENSEMBLE_SPREAD:
+        cubes += [(store_dir / SPREAD_DIR_NAME / field, batch_ensemble[field]) for field in SPREAD_FIELDS]
+    if SAVE_MODEL_CUBES:
+        for mod, model_dir in model_store_dirs(store_dir, models).items():
+            cube = batch_ensemble['models'].get(mod)
+            if cube is None:
+                cube = SciCube(mean_cube.grid, mean_cube.dates,
+                               np.full(mean_cube.values.shape, np.nan, dtype=np.float32))
+            cubes.append((model_dir, cube))
+    return cubes + [(store_dir, mean_cube)]
+
+
+def process_batch(task):
+    """
+    此函数处理 *一个* 批次 (例如 'grids_1_160.csv') 或其子批次
+    返回 (是否成功, 该批次的指标记录)。
+    """
+    suffix = task['suffix']
+    print(f"  -- [开始] 正在处理批次: {suffix} --")
+
+    with StageTimer("means.batch", batch=suffix) as timer:
+        try:
+            batch_ensemble = compute_batch_ensemble(task, timer)
+            if batch_ensemble is None:
+                ok = False  # 失败
+            else:
+                # 保存为 float32 [grid, month] 立方体 (不再写 TEMP_MEANS 文本文件)
+                with timer.phase('write'):
+                    for store_dir, cube in batch_cubes(batch_ensemble):
+                        write_batch(store_dir, suffix, cube)
+                timer.add(bytes_written=file_bytes(batch_outputs(suffix)))
+
+                print(f"  -- [完成] 批次 {suffix} 处理完毕。 --")
+                ok = True  # 成功
+
+        except Exception as e:
+            print(f"  !! 严重错误: 处理批次 {suffix} 时失败: {e}")
+            ok = False  # 失败
+
+    return ok, timer.record
+
+
+def process_batch_shared(task):
+    """
+    共享立方体模式: 结果直接写入父进程预先分配的内存映射立方体 (本批次的行)。
+    返回 (批次后缀, 是否成功, 指标记录)。
+    """
+    suffix = task['suffix']
+    print(f"  -- [开始] 正在处理批次 (共享立方体): {suffix} --")
+
+    ok = False
+    with StageTimer("means.batch_shared", batch=suffix) as timer:
+        try:
+            batch_ensemble = compute_batch_ensemble(task, timer)
+            if batch_ensemble is not None:
+                with timer.phase('write'):
+                    for store_dir, cube in batch_cubes(batch_ensemble):
+                        write_shared_rows(store_dir, task['row_start'], task['range_start'], cube)
+                        timer.add(bytes_written=cube.values.nbytes)
+                print(f"  -- [完成] 批次 {suffix} 处理完毕。 --")
+                ok = True
+
+        except Exception as e:
+            print(f"  !! 严重错误: 处理批次 {suffix} 时失败: {e}")
+
+    return suffix, ok, timer.record
+
+
+def process_batch_fused(task):
+    """
+    融合模式: 计算均值后直接在本进程内完成频率计数。
+    返回 (批次后缀, 该批次的统计结果 (每个网格一行), 指标记录)，失败时结果为 None。
+    """
+    suffix = task['suffix']
+    print(f"  -- [开始] 正在处理批次 (融合模式): {suffix} --")
+
+    batch_stats = None
+    with StageTimer("means.batch_fused", batch=suffix) as timer:
+        try:
+            batch_ensemble = compute_batch_ensemble(task, timer)
+            if batch_ensemble is not None:
+                with timer.phase('frequency'):
+                    batch_stats = frequency_frame(batch_ensemble['Mean_SCI'], thresholds)
+                print(f"  -- [完成] 批次 {suffix} 处理完毕。 --")
+
+        except Exception as e:
+            print(f"  !! 严重错误: 处理批次 {suffix} 时失败: {e}")
+
+    return suffix, batch_stats, timer.record
+
+
+def run_batch(func, task):
+    """在工人中运行一个批次；剖析模式下在 cProfile 下运行 (结果以批次后缀命名，按 run_id 分目录)。"""
+    if PROFILE_SLOWEST:
+        return profiled(run_profile_dir(base_dir), task['suffix'], func, task)
+    return func(task)
+
+
+def process_batch_tagged(task):
+    """imap_unordered 不保留顺序，因此连同批次后缀一起返回。"""
+    return (task['suffix'],) + run_batch(process_batch, task)
+
+
+# -----------------------------------------------------------------
+# 【增量运行】: 只重新计算输入、参数或输出发生变化的批次
+# -----------------------------------------------------------------
+def means_params():
+    return {'models': models, 'columns': CORRECT_COLUMN_NAMES, 'spread': SAVE_ENSEMBLE_SPREAD,
+            'model_cubes': SAVE_MODEL_CUBES,
+            'source': INPUT_SOURCE, 'recompute_sci': RECOMPUTE_SCI, 'sci_method': SCI_METHOD,
+            'sci_scale': SCI_SCALE, 'sci_reference': SCI_REFERENCE}
+
+
+def batch_inputs(suffix):
+    if INPUT_SOURCE == "netcdf":
+        nc_files = [f for mod in models for f in find_qtot_files(netcdf_dir, mod)]
+        return file_signature(nc_files + [base_dir / NETCDF_GRID_INDEX_NAME])
+    return file_signature([base_dir / f"{mod}_{suffix}" for mod in models])
+
+
+def store_dirs():
+    """均值立方体以及 (可选) 各离散度字段的存储目录。"""
+    store_dir = base_dir / STORE_DIR_NAME
+    dirs = [store_dir]
+    if SAVE_ENSEMBLE_SPREAD:
+        dirs += [store_dir / SPREAD_DIR_NAME / field for field in SPREAD_FIELDS]
+    if SAVE_MODEL_CUBES:
+        dirs += list(model_store_dirs(store_dir, models).values())
+    return dirs
+
+
+def batch_outputs(suffix):
+    return [p for d in store_dirs() for p in batch_files(d, batch_stem(suffix))]
+
+
+def tasks_inputs(tasks):
+    """所有任务 (共享立方体 / 融合模式作为一个整体) 的输入签名。"""
+    inputs = {}
+    for source in sorted({t['source'] for t in tasks}):
+        inputs.update(batch_inputs(source))
+    return inputs
+
+
+def batch_file_rows(suffix):
+    """每个模型文件的行数估计 (只看文件大小和开头样本，用于内存预算)。"""
+    if INPUT_SOURCE == "netcdf":
+        n_months = len(pd.date_range(*PERIOD, freq='MS'))
+        return [len(netcdf_grid_rows(suffix)) * n_months] * len(models)
+    return [estimate_rows(base_dir / f"{mod}_{suffix}") for mod in models]
+
+
+def run_incremental(tasks, pool, metrics):
+    """
+    跳过清单中已是最新的批次，其余批次谁先完成谁先记录到清单，
+    因此中断后重新运行会从中断处继续。
+    返回 (成功 (含跳过) 的批次数, 重新计算的批次的指标记录)。
+    """
+    manifest = Manifest(base_dir / MANIFEST_NAME)
+    params = means_params()
+    sources = {t['suffix']: t['source'] for t in tasks}
+
+    stale = [t for t in tasks
+             if not manifest.is_current('means', t['suffix'], batch_inputs(t['source']), params,
+                                        batch_outputs(t['suffix']))]
+    print(f"--- {len(tasks) - len(stale)} 个批次未变化，已跳过；需要重新计算 {len(stale)} 个批次 ---")
+    attach_line_indexes(stale, pool)
+
+    success_count = len(tasks) - len(stale)
+    records = []
+    for suffix, ok, record in pool.imap_unordered(process_batch_tagged, stale):
+        metrics.write(record)
+        records.append(record)
+        if ok:
+            manifest.record('means', suffix, batch_inputs(sources[suffix]), params, batch_outputs(suffix))
+            success_count += 1
+        else:
+            # 删除该批次上一次的结果，避免合并时把过期的均值当作最新结果发布
+            for path in batch_outputs(suffix):
+                path.unlink(missing_ok=True)
+            manifest.forget('means', suffix)
+        manifest.save()
+
+    return success_count, records
+
+
+def attach_line_indexes(tasks, pool):
+    """
+    被拆分的源文件: 每个模型文件只扫描一次建立行索引 (在进程池中并行)，
+    每个子批次只带上自己网格的行段 (task['line_index'])，读取时不再解析整个文件。
+    每个源文件的第一个子批次还负责 Grid_ID 无法解析或不在源文件范围内的行 (task['source_range'])。
+    无法建立索引的文件 (有坏行) 由子批次按块读取并筛选。
+    """
+    split = [t for t in tasks if t['grid_range'] is not None]
+    if INPUT_SOURCE == "netcdf" or not split:
+        return
+    files = sorted({(mod, t['source']) for t in split for mod in models
+                    if (base_dir / f"{mod}_{t['source']}").is_file()})
+    indexes = dict(zip(files, pool.starmap(grid_line_index, [(base_dir / f"{mod}_{source}", CORRECT_COLUMN_NAMES)
+                                                            for mod, source in files])))
+    for t in split:
+        source_range = suffix_grid_range(t['source'])
+        if t['grid_range'][0] == source_range[0]:
+            t['source_range'] = source_range
+        t['line_index'] = {mod: index_slice(indexes[(mod, source)], t['grid_range'], t.get('source_range'))
+                           for mod, source in files if source == t['source'] and indexes[(mod, source)] is not None}
+
+
+def consolidate_if_needed(batch_suffixes):
+    """
+    任何批次文件变化 (或合并立方体缺失/损坏) 时才重新合并。
+    有批次缺失 (失败) 时不合并，打印缺失的批次并返回 False。
+    """
+    manifest = Manifest(base_dir / MANIFEST_NAME)
+    stems = [batch_stem(s) for s in batch_suffixes]
+    missing = [s for s in stems if not (base_dir / STORE_DIR_NAME / f"{s}.grid.npy").exists()]
+    if missing:
+        for store_dir in store_dirs():
+            manifest.forget('consolidate', str(store_dir))
+        manifest.save()
+        print(f"!! 严重错误: {len(missing)} 个批次缺失，未合并立方体: {', '.join(missing)}")
+        return False
+
+    for store_dir in store_dirs():
+        inputs = file_signature([p for s in stems for p in batch_files(store_dir, s)])
+        outputs = batch_files(store_dir, CUBE_STEM)
+        if manifest.is_current('consolidate', str(store_dir), inputs, {}, outputs):
+            continue
+        consolidate(store_dir, stems)
+        manifest.record('consolidate', str(store_dir), inputs, {}, outputs)
+        manifest.save()
+        print(f"--- 已合并立方体: {store_dir / CUBE_STEM} ---")
+    return True
+
+
+def shared_layout(tasks):
+    """
+    按批次的 Grid_ID 范围为每个任务分配共享立方体中的行 (写入 task 的 row_start / range_start)。
+    返回总行数。各批次的范围必须按顺序且互不重叠。
+    """
+    n_rows = 0
+    previous_end = None
+    for t in tasks:
+        start, end = suffix_grid_range(t['suffix'])
+        if previous_end is not None and start <= previous_end:
+            raise ValueError(f"批次的网格范围重叠或未排序: {t['suffix']}")
+        t['row_start'], t['range_start'] = n_rows, start
+        n_rows += end - start + 1
+        previous_end = end
+    return n_rows
+
+
+def shared_dates(task):
+    """共享立方体的月份索引: 由第一个批次中第一个模型的数据确定 (CSV 会顺便写入 RAW_CACHE)。"""
+    if INPUT_SOURCE == "netcdf":
+        df = read_model_batch(netcdf_dir, models[0], netcdf_grid_rows(task['suffix']).head(1),
+                              sci_scale=SCI_SCALE, sci_method=SCI_METHOD, sci_reference=SCI_REFERENCE)
+    else:
+        mod = next(mod for mod in models if (base_dir / f"{mod}_{task['source']}").exists())
+        cache_dir = base_dir / RAW_CACHE_DIR_NAME if USE_RAW_CACHE else None
+        df, _, _ = read_raw_batch(base_dir / f"{mod}_{task['source']}", CORRECT_COLUMN_NAMES, cache_dir=cache_dir,
+                                  grid_range=task['grid_range'], line_index=task.get('line_index', {}).get(mod),
+                                  source_range=task.get('source_range'))
+    return np.unique(df['Date'].astype(str).to_numpy(dtype=DATE_DTYPE))
+
+
+def run_shared(tasks, pool, metrics):
+    """
+    共享立方体模式: 预先分配所有存储目录的立方体，工人直接写入，父进程只收集状态。
+    返回 (成功的批次数, 各批次的指标记录)。
+    """
+    manifest = Manifest(base_dir / MANIFEST_NAME)
+    params = dict(means_params(), shared_cube=[t['suffix'] for t in tasks])
+    inputs = tasks_inputs(tasks)
+    outputs = [p for d in store_dirs() for p in batch_files(d, CUBE_STEM)]
+    if manifest.is_current('means', 'shared_cube', inputs, params, outputs):
+        print("--- 所有批次的输入和参数都未变化，共享立方体已是最新，跳过 ---")
+        return len(tasks), []
+
+    attach_line_indexes(tasks, pool)
+    n_rows = shared_layout(tasks)
+    dates = shared_dates(tasks[0])
+    for store_dir in store_dirs():
+        allocate_shared_cube(store_dir, n_rows, dates)
+    print(f"--- 已预先分配共享立方体: {n_rows} 行 x {len(dates)} 个月 ({len(store_dirs())} 个字段) ---")
+
+    success_count = 0
+    records = []
+    for suffix, ok, record in pool.imap_unordered(partial(run_batch, process_batch_shared), tasks):
+        metrics.write(record)
+        records.append(record)
+        success_count += ok
+
+    # 只有所有批次都成功时才发布 (与融合模式相同)，否则下游会读到缺少网格的立方体
+    if success_count == len(tasks):
+        for store_dir in store_dirs():
+            n_valid = finalize_shared_cube(store_dir)
+            print(f"--- 共享立方体已完成: {n_valid} 个网格 ({store_dir / CUBE_STEM}) ---")
+        manifest.record('means', 'shared_cube', inputs, params, outputs)
+    else:
+        for store_dir in store_dirs():
+            discard_shared_cube(store_dir)
+        manifest.forget('means', 'shared_cube')
+        print(f"!! 严重错误: {len(tasks) - success_count} 个批次失败，未发布共享立方体: {base_dir / STORE_DIR_NAME}")
+    manifest.save()
+    return success_count, records
+
+
+def run_fused(tasks, pool, metrics):
+    """
+    按网格顺序分派批次，谁先完成谁先返回 (imap_unordered)；
+    父进程只暂存 “排在前面的批次还没完成” 的结果，按网格顺序追加写入最终文件。
+    只有所有批次都成功时才发布最终文件并记录到清单 (与共享立方体模式相同)。
+    返回 (成功的批次数, 各批次的指标记录)。
+    """
+    output_file_path = base_dir / f"{scenario_name}_FREQUENCY_STATS.csv"
+    tmp_output_path = output_file_path.with_name(output_file_path.name + ".tmp")
+
+    manifest = Manifest(base_dir / MANIFEST_NAME)
+    params = dict(means_params(), fused=[t['suffix'] for t in tasks], thresholds=thresholds)
+    inputs = tasks_inputs(tasks)
+    if manifest.is_current('means', 'fused', inputs, params, [output_file_path]):
+        print(f"--- 所有批次的输入和参数都未变化，沿用已有结果: {output_file_path} ---")
+        return len(tasks), []
+
+    attach_line_indexes(tasks, pool)
+    order = {t['suffix']: i for i, t in enumerate(tasks)}
+    pending = {}
+    next_index = 0
+
+    success_count = 0
+    records = []
+    with open(tmp_output_path, 'w', newline='') as out:
+        for suffix, batch_stats, record in pool.imap_unordered(partial(run_batch, process_batch_fused), tasks):
+            metrics.write(record)
+            records.append(record)
+            pending[order[suffix]] = batch_stats
+            while next_index in pending:
+                batch_stats = pending.pop(next_index)
+                next_index += 1
+                if batch_stats is None:
+                    continue
+                batch_stats.to_csv(out, index=False, header=(success_count == 0))
+                success_count += 1
+
+    if success_count == len(tasks):
+        os.replace(tmp_output_path, output_file_path)
+        manifest.record('means', 'fused', inputs, params, [output_file_path])
+        print(f"--- 最终频率文件已保存到: {output_file_path} ---")
+    else:
+        os.remove(tmp_output_path)
+        manifest.forget('means', 'fused')
+        print(f"!! 严重错误: {len(tasks) - success_count} 个批次失败，未写入频率文件: {output_file_path}")
+    manifest.save()
+    return success_count, records
+
+
+# -----------------------------------------------------------------
+# 3. 【主程序】: 创建“工头”并分配任务
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+
+    all_suffixes = set()
+    if INPUT_SOURCE == "netcdf":
+        # 由第一个模型的有效格点生成 (或读取已有的) Grid_ID 表，再按批次大小划分
+        grid_index = load_grid_index(base_dir, netcdf_dir, models[0])
+        all_suffixes.update(netcdf_suffixes(grid_index, NETCDF_BATCH_SIZE))
+    else:
+        for mod in models:
+            files = base_dir.glob(f"{mod}_grids_*.csv")
+            suffixes = [f.name.replace(f"{mod}_", "") for f in files]
+            all_suffixes.update(suffixes)
+
+    if not all_suffixes:
+        print(f"!! 严重错误: 在 {base_dir} 中未找到任何模型的任何批次文件。")
+        exit(1)
+
+    # 按网格编号排序 (融合模式下输出文件即按 Grid_ID 顺序)
+    batch_suffixes = sorted(all_suffixes, key=lambda s: natural_key(batch_stem(s)))
+    print(f"找到 {len(batch_suffixes)} 个独特的批次后缀。")
+
+    # 按内存预算决定并行数，并拆分过大的批次
+    if MEMORY_BUDGET_GB is None:
+        tasks, worker_count = plan_tasks({s: [] for s in batch_suffixes}, CORRECT_COLUMN_NAMES, None, WORKER_COUNT)
+    else:
+        batch_rows = {s: batch_file_rows(s) for s in batch_suffixes}
+        tasks, worker_count = plan_tasks(batch_rows, CORRECT_COLUMN_NAMES, MEMORY_BUDGET_GB * 2 ** 30, MAX_WORKERS)
+        largest_mb = max(t['bytes'] for t in tasks) / 2 ** 20
+        print(f"--- 拆分后共 {len(tasks)} 个任务，单个任务峰值约 {largest_mb:.0f} MB，"
+              f"使用 {worker_count} 个 CPU 核心 ---")
+        over_budget = sorted({t['source'] for t in tasks if t['over_budget']}, key=lambda s: natural_key(batch_stem(s)))
+        if over_budget:
+            print(f"!! 警告: {len(over_budget)} 个批次拆到每个子批次一个网格仍超过内存预算 "
+                  f"({MEMORY_BUDGET_GB} GB / {MAX_WORKERS} 个核心): {', '.join(over_budget)}")
+    print("开始分派任务...")
+
+    metrics = MetricsLog(base_dir / METRICS_FILE_NAME)
+    with metrics.stage("means.total") as total, multiprocessing.Pool(processes=worker_count) as pool:
+        if FUSED_FREQUENCY:
+            success_count, records = run_fused(tasks, pool, metrics)
+        elif SHARED_CUBE:
+            success_count, records = run_shared(tasks, pool, metrics)
+        else:
+            success_count, records = run_incremental(tasks, pool, metrics)
+        for record in records:
+            total.add(rows=record['rows'], bytes_read=record['bytes_read'], bytes_written=record['bytes_written'])
+
+    print(f"\n====================================================")
+    print(f"--- 所有 {len(tasks)} 个批次均已处理完毕 ---")
+
+    print(f"--- 成功: {success_count} 个批次 ---")
+    if len(tasks) - success_count > 0:
+        print(f"--- 失败: {len(tasks) - success_count} 个批次 ---")
+
+    if FUSED_FREQUENCY:
+        print("--- (融合模式: 未写入任何中间均值文件) ---")
+    elif SHARED_CUBE:
+        if success_count == len(tasks):
+            print(f"--- (共享立方体模式: 未写入批次文件，无需合并) 均值位于: {base_dir / STORE_DIR_NAME} ---")
+    else:
+        # 将所有批次合并为整个情景的立方体，供下游内存映射读取 (有批次失败时不合并)
+        with metrics.stage("means.consolidate"):
+            consolidate_if_needed([t['suffix'] for t in tasks])
+
+        print(f"--- 您的 {success_count} 个批次均值位于: {base_dir / STORE_DIR_NAME} ---")
+    print(f"--- 运行指标已追加到: {metrics.path} ---")
+    if PROFILE_SLOWEST and records:
+        slowest = keep_slowest(run_profile_dir(base_dir), records, keep=PROFILE_SLOWEST)
+        print(f"--- 最慢的 {len(slowest)} 个批次的剖析结果位于: {run_profile_dir(base_dir)} ---")
+    print("====================================================")
+
+    # 有批次失败时以非零状态退出，流水线跳过下游阶段 (不读取不完整或过期的均值)
+    if success_count < len(tasks):
+        exit(1)
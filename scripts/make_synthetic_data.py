@@ -0,0 +1,35 @@
+import time
+from pathlib import Path
+
+from sci_synthetic import SYNTHETIC_SCENARIOS, write_tree
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 合成数据的输出目录 (每个情景一个子文件夹)
+OUTPUT_DIR = Path("E:/dissertation/SYNTHETIC")
+
+# 网格数 (真实数据约 8000 个中国网格)
+N_GRIDS = 1000
+
+# 损坏比例 (0 = 全部健康)
+# HEADER_RATE:   标题行被损坏的文件比例
+# BAD_LINE_RATE: 插入坏行的文件比例 (每个文件 1-5 行)
+HEADER_RATE = 0.0
+BAD_LINE_RATE = 0.0
+
+print("--- ------------------------------------------ ---")
+print(f"--- 正在生成合成数据: {N_GRIDS} 个网格 x {len(SYNTHETIC_SCENARIOS)} 个情景 ---")
+print("--- ------------------------------------------ ---")
+
+# -----------------------------------------------------------------
+# 2. 生成
+# -----------------------------------------------------------------
+start_time = time.time()
+config = write_tree(OUTPUT_DIR, N_GRIDS, header_rate=HEADER_RATE, bad_line_rate=BAD_LINE_RATE)
+
+print("\n====================================================")
+print(f"完成！耗时 {time.time() - start_time:.1f} 秒。数据位于: {OUTPUT_DIR}")
+print(f"可直接运行: python run_pipeline.py {OUTPUT_DIR / 'pipeline_config.json'}")
+print("====================================================")
@@ -2,10 +2,14 @@ import pandas as pd
 import plotly.express as px
 from pathlib import Path
 import os
-import geopandas as gpd
-from shapely.geometry import Point
 import numpy as np
 
+from sci_mask import load_mask, apply_mask
+from sci_attribution import load_scenarios, attribution_frame
+from sci_maps import layered_figure, export_png
+from sci_pipeline import stage_overrides
+from sci_metrics import METRICS_FILE_NAME, MetricsLog, file_bytes
+
 # -----------------------------------------------------------------
 # 1. 【设置】(路径大集合)
 # -----------------------------------------------------------------
@@ -22,94 +26,96 @@ file_hist = dir_hist / "countclim-histsoc_RATIO_STATS.csv"
 dir_obs = Path("F:/fyp/obsclim-histsoc")
 file_obs = dir_obs / "obsclim-histsoc_RATIO_STATS.csv"
 
+scenario_paths = {
+    'obs': file_obs,
+    'hist': file_hist,
+    '1901': file_1901,
+}
+coord_scenario = 'obs'
+
+# 归因定义: 驱动因子 -> (情景 A, 情景 B)，Delta = A - B
+attribution_drivers = {
+    'HA': ('hist', '1901'),  # 人类活动 (Delta HA = Hist - 1901)
+    'CC': ('obs', 'hist'),   # 气候变化 (Delta CC = Obs - Hist)
+}
+
 # Shapefile (假设在 E 盘 countclim-histsoc 里有)
 shapefile_path = dir_hist / "1query_shape_copy.shp"
 
 # 输出目录
 output_dir = Path("E:/dissertation/FINAL_ATTRIBUTION_MAPS")
+
+# 地图模式: "layered"  = 所有图层放在一个 HTML 中，用下拉菜单切换
+#          "separate" = 每个图层一个独立的 HTML (旧方式)
+MAP_MODE = "layered"
+# layered 模式的渲染方式: "heatmap" (规则网格，文件最小) 或 "webgl" (Scattergl 散点)
+LAYER_RENDERER = "heatmap"
+# 是否同时导出静态 PNG (matplotlib，无需浏览器)
+EXPORT_PNG = False
+
+# 由 'run_pipeline.py' 启动时，用配置文件中的情景和归因定义覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    scenario_paths = {name: Path(path) for name, path in overrides['scenario_paths'].items()}
+    attribution_drivers = {driver: tuple(pair) for driver, pair in overrides['drivers'].items()}
+    coord_scenario = overrides.get('coord_scenario', coord_scenario)
+    shapefile_path = Path(overrides['shapefile'])
+    output_dir = Path(overrides['output_dir'])
+
 output_dir.mkdir(exist_ok=True, parents=True)
 
+# 运行指标 (各步骤耗时、行数、读写字节数、峰值内存) 追加到 PIPELINE_METRICS.jsonl
+metrics = MetricsLog(output_dir / METRICS_FILE_NAME)
+timer = metrics.start("maps.total")
+
 print("--- 正在生成最终归因地图 (Grand Finale) ---")
 
 # -----------------------------------------------------------------
 # 2. 读取数据 & 统一坐标
+# (Obs 是"坐标主文件"，其他情景按 Grid_ID 对齐，缺失的网格为 NaN)
 # -----------------------------------------------------------------
+# 比率列 -> 输出名称 (Delta_HA_Drought 等)
+ratio_columns = {
+    'Drought_Ratio': 'Drought',
+    'Flood_Ratio': 'Flood',
+}
+
 try:
-    # 1. 读取主坐标文件 (Obs)
-    df_obs = pd.read_csv(file_obs)
-    master_coords = df_obs[['Grid_ID', 'Lon', 'Lat']].drop_duplicates()
-    print("已读取主坐标源 (Obs).")
-
-    # 2. 读取其他文件 (丢弃它们自带的坐标，防止缺口)
-    df_1901 = pd.read_csv(file_1901).drop(columns=['Lon', 'Lat'], errors='ignore')
-    df_hist = pd.read_csv(file_hist).drop(columns=['Lon', 'Lat'], errors='ignore')
-    print("已读取 1901soc 和 histsoc 数据.")
-
-    # 3. 合并数据
-    # 合并 Hist
-    df_merged = pd.merge(master_coords, df_hist, on='Grid_ID', how='left')
-    df_merged = df_merged.rename(columns={
-        'Drought_Ratio': 'DR_hist', 'Flood_Ratio': 'FR_hist'
-    })
-
-    # 合并 1901
-    df_merged = pd.merge(df_merged, df_1901, on='Grid_ID', how='left')
-    df_merged = df_merged.rename(columns={
-        'Drought_Ratio': 'DR_1901', 'Flood_Ratio': 'FR_1901'
-    })
-
-    # 合并 Obs (为了计算 CC)
-    # 注意：这里我们只取 Ratio 列，因为 Lon/Lat 已经在 master_coords 里了
-    df_obs_ratios = df_obs[['Grid_ID', 'Drought_Ratio', 'Flood_Ratio']]
-    df_merged = pd.merge(df_merged, df_obs_ratios, on='Grid_ID', how='left')
-    df_merged = df_merged.rename(columns={
-        'Drought_Ratio': 'DR_obs', 'Flood_Ratio': 'FR_obs'
-    })
-
-    print("数据合并与坐标统一完成。")
+    # 处理无穷大 (Inf)
+    # 如果 Ratio 是 Inf，我们把它设为一个较大的数字(比如5)以便计算差值
+    with timer.phase('read'):
+        scenario_stack = load_scenarios(
+            scenario_paths, ratio_columns, coord_scenario=coord_scenario, how='left', posinf=5.0
+        )
+    timer.add(bytes_read=file_bytes(scenario_paths.values()))
+    print(f"已读取 {' / '.join(scenario_paths)} 数据，坐标统一完成。")
 
 except Exception as e:
     print(f"!! 读取数据失败: {e}")
-    exit()
+    exit(1)
 
 # -----------------------------------------------------------------
 # 3. 计算归因 (Delta)
 # -----------------------------------------------------------------
 print("正在计算归因指标...")
-
-# 处理无穷大 (Inf)
-# 如果 Ratio 是 Inf，我们把它设为一个较大的数字(比如5)以便计算差值
-# 或者，您可以选择将差值设为 NaN。这里我们简单处理：
-cols_to_fix = ['DR_hist', 'FR_hist', 'DR_1901', 'FR_1901', 'DR_obs', 'FR_obs']
-for col in cols_to_fix:
-    df_merged[col] = df_merged[col].replace([np.inf], 5.0)
-
-# 1. 人类活动影响 (Delta HA = Hist - 1901)
-df_merged['Delta_HA_Drought'] = df_merged['DR_hist'] - df_merged['DR_1901']
-df_merged['Delta_HA_Flood'] = df_merged['FR_hist'] - df_merged['FR_1901']
-
-# 2. 气候变化影响 (Delta CC = Obs - Hist)
-df_merged['Delta_CC_Drought'] = df_merged['DR_obs'] - df_merged['DR_hist']
-df_merged['Delta_CC_Flood'] = df_merged['FR_obs'] - df_merged['FR_hist']
+with timer.phase('attribution'):
+    df_merged = attribution_frame(scenario_stack, attribution_drivers)
+timer.add(rows=len(df_merged))
 
 # -----------------------------------------------------------------
-# 4. 空间筛选 (只保留中国)
+# 4. 空间筛选 (只保留中国，使用缓存的掩膜)
 # -----------------------------------------------------------------
 try:
     print("正在筛选中国区域...")
-    china_boundary = gpd.read_file(shapefile_path).to_crs(epsg=4326)
-
-    geometry = [Point(xy) for xy in zip(df_merged['Lon'], df_merged['Lat'])]
-    gdf_points = gpd.GeoDataFrame(df_merged, crs="EPSG:4326", geometry=geometry)
-
-    gdf_china = gpd.sjoin(gdf_points, china_boundary, how="inner", predicate='within')
-    df_plot = pd.DataFrame(gdf_china.drop(columns=['geometry', 'index_right']))
+    with timer.phase('spatial_join'):
+        china_mask = load_mask(df_merged, shapefile_path)
+        df_plot = apply_mask(df_merged, china_mask)
 
     print(f"筛选完成。绘图点数: {len(df_plot)}")
 
 except Exception as e:
     print(f"!! Shapefile 错误: {e}")
-    exit()
+    exit(1)
 
 
 # -----------------------------------------------------------------
@@ -135,43 +141,54 @@ def plot_attribution_map(df, col_name, title, filename):
     fig.update_layout(template='plotly_white')
 
     out_path = output_dir / filename
-    fig.write_html(out_path)
+    with timer.phase('write_html'):
+        fig.write_html(out_path)
+    timer.add(bytes_written=file_bytes([out_path]))
     print(f"  -> 已保存: {filename}")
 
 
 # -----------------------------------------------------------------
-# 6. 生成 4 张最终地图
+# 6. 生成最终地图
 # -----------------------------------------------------------------
-
-# 1. 人类活动 -> 干旱
-plot_attribution_map(
-    df_plot, 'Delta_HA_Drought',
-    '人类活动对干旱频率比率的影响 (Delta HA)<br>(HistSoc - 1901Soc)',
-    'Map_Attribution_HA_Drought.html'
-)
-
-# 2. 人类活动 -> 洪涝
-plot_attribution_map(
-    df_plot, 'Delta_HA_Flood',
-    '人类活动对洪涝频率比率的影响 (Delta HA)<br>(HistSoc - 1901Soc)',
-    'Map_Attribution_HA_Flood.html'
-)
-
-# 3. 气候变化 -> 干旱
-plot_attribution_map(
-    df_plot, 'Delta_CC_Drought',
-    '气候变化对干旱频率比率的影响 (Delta CC)<br>(Obs - CountClim)',
-    'Map_Attribution_CC_Drought.html'
-)
-
-# 4. 气候变化 -> 洪涝
-plot_attribution_map(
-    df_plot, 'Delta_CC_Flood',
-    '气候变化对洪涝频率比率的影响 (Delta CC)<br>(Obs - CountClim)',
-    'Map_Attribution_CC_Flood.html'
-)
+map_titles = {
+    # 1. 人类活动 -> 干旱
+    'Delta_HA_Drought': '人类活动对干旱频率比率的影响 (Delta HA)<br>(HistSoc - 1901Soc)',
+    # 2. 人类活动 -> 洪涝
+    'Delta_HA_Flood': '人类活动对洪涝频率比率的影响 (Delta HA)<br>(HistSoc - 1901Soc)',
+    # 3. 气候变化 -> 干旱
+    'Delta_CC_Drought': '气候变化对干旱频率比率的影响 (Delta CC)<br>(Obs - CountClim)',
+    # 4. 气候变化 -> 洪涝
+    'Delta_CC_Flood': '气候变化对洪涝频率比率的影响 (Delta CC)<br>(Obs - CountClim)',
+}
+# 配置文件中新增的驱动因子 (例如 SSP 情景) 使用通用标题
+for driver, (scen_a, scen_b) in attribution_drivers.items():
+    for ratio_name in ratio_columns.values():
+        col_name = f"Delta_{driver}_{ratio_name}"
+        map_titles.setdefault(col_name, f"{driver} 对{ratio_name}频率比率的影响 (Delta {driver})<br>({scen_a} - {scen_b})")
+map_titles = {col: title for col, title in map_titles.items() if col in df_plot.columns}
+
+if MAP_MODE == "separate":
+    for col_name, title in map_titles.items():
+        plot_attribution_map(df_plot, col_name, title, f"Map_Attribution_{col_name.replace('Delta_', '')}.html")
+else:
+    # 所有图层一个文件，只包含一份 Plotly 库
+    with timer.phase('figure'):
+        fig = layered_figure(df_plot, map_titles, mode=LAYER_RENDERER, colorbar_title='Ratio Change (Diff)')
+    with timer.phase('write_html'):
+        fig.write_html(output_dir / "Map_Attribution_ALL_LAYERS.html")
+    timer.add(bytes_written=file_bytes([output_dir / "Map_Attribution_ALL_LAYERS.html"]))
+    print(f"  -> 已保存: Map_Attribution_ALL_LAYERS.html ({len(map_titles)} 个图层)")
+
+if EXPORT_PNG:
+    with timer.phase('export_png'):
+        export_png(df_plot, map_titles, output_dir / "Map_Attribution_ALL_LAYERS.png",
+                   colorbar_title='Ratio Change (Diff)')
+    timer.add(bytes_written=file_bytes([output_dir / "Map_Attribution_ALL_LAYERS.png"]))
+    print("  -> 已保存: Map_Attribution_ALL_LAYERS.png")
 
 print("\n====================================================")
 print("大功告成！所有归因地图已生成。")
+metrics.finish(timer)
+print(f"运行指标已追加到: {metrics.path}")
 print(f"请查看文件夹: {output_dir}")
 print("====================================================")
\ No newline at end of file
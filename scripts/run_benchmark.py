@@ -0,0 +1,135 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from sci_synthetic import write_tree
+from sci_pipeline import STATUS_OK, load_config, build_stages, run_pipeline
+from sci_metrics import METRICS_FILE_NAME, RUN_ID_ENV, read_metrics
+from sci_mask import MASK_CACHE_DIR_NAME
+from sci_benchmark import stage_times, scaling_exponents, compare_previous, scaling_figure
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 基准测试目录 (每个网格数一个子文件夹: grids_1000/ ...)
+BENCH_DIR = Path("E:/dissertation/BENCHMARK")
+
+# 要测试的网格数 (50000 个网格的合成数据每个情景约 6 GB)
+GRID_SIZES = [1000, 8000, 50000]
+
+# 阶段串行运行，各阶段的计时互不干扰
+MAX_PARALLEL_STAGES = 1
+
+# 耗时超过上一次运行的多少倍时报告为退化
+REGRESSION_TOLERANCE = 1.2
+
+# 历史结果 (每次运行追加)
+results_file = BENCH_DIR / "BENCHMARK_RESULTS.csv"
+
+# 每次运行前删除的派生结果 (保证每个阶段都真正重新计算，掩膜也是冷启动)
+DERIVED_NAMES = ["MEANS_STORE", "RAW_CACHE", "QUARANTINE", "PROFILE", "PIPELINE_MANIFEST.json",
+                 METRICS_FILE_NAME]
+DERIVED_PATTERNS = ["*_FREQUENCY_STATS.csv", "*_EVENT_STATS.csv", "*_EXCEEDANCE_CURVE.csv",
+                    "*_MODEL_FREQUENCY_STATS.csv", "*_PERCENTILE_THRESHOLDS.csv"]
+
+
+def clean_derived(config):
+    """删除上一次运行的所有派生结果，只保留合成的原始数据。"""
+    for scenario in config['scenarios'].values():
+        scenario_dir = Path(scenario['dir'])
+        for name in DERIVED_NAMES:
+            path = scenario_dir / name
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        for pattern in DERIVED_PATTERNS:
+            for path in scenario_dir.glob(pattern):
+                path.unlink()
+    shutil.rmtree(Path(config['shapefile']).parent / MASK_CACHE_DIR_NAME, ignore_errors=True)
+    shutil.rmtree(config['attribution_dir'], ignore_errors=True)
+    shutil.rmtree(config['maps_dir'], ignore_errors=True)
+
+
+def metrics_files(config):
+    paths = [Path(s['dir']) / METRICS_FILE_NAME for s in config['scenarios'].values()]
+    return paths + [Path(config['attribution_dir']) / METRICS_FILE_NAME, Path(config['maps_dir']) / METRICS_FILE_NAME]
+
+
+if __name__ == "__main__":
+    print("--- ------------------------------------------ ---")
+    print(f"--- 端到端基准测试: {', '.join(str(n) for n in GRID_SIZES)} 个网格 ---")
+    print("--- ------------------------------------------ ---")
+
+    bench_id = time.strftime("%Y%m%d-%H%M%S")
+    scripts_dir = Path(__file__).parent
+    all_results = []
+
+    for n_grids in GRID_SIZES:
+        root = BENCH_DIR / f"grids_{n_grids}"
+        config_path = root / "pipeline_config.json"
+
+        # -----------------------------------------------------------------
+        # 2. 合成数据 (已存在时直接复用)
+        # -----------------------------------------------------------------
+        if not config_path.exists():
+            print(f"\n正在生成 {n_grids} 个网格的合成数据...")
+            start = time.time()
+            write_tree(root, n_grids)
+            print(f"生成耗时 {time.time() - start:.1f} 秒。")
+
+        config = load_config(config_path)
+        config['max_parallel_stages'] = MAX_PARALLEL_STAGES
+        clean_derived(config)
+
+        # -----------------------------------------------------------------
+        # 3. 运行整个流水线 (所有阶段共用一个 run_id，便于收集指标)
+        # -----------------------------------------------------------------
+        run = f"bench-{bench_id}-{n_grids}"
+        os.environ[RUN_ID_ENV] = run
+        print(f"\n--- {n_grids} 个网格 (run_id: {run}) ---")
+        status = run_pipeline(build_stages(config), scripts_dir, root / "PIPELINE_LOGS",
+                              max_parallel=MAX_PARALLEL_STAGES)
+        failed = [stage_id for stage_id, r in status.items() if r['status'] != STATUS_OK]
+        if failed:
+            print(f"!! 警告: 以下阶段未成功，{n_grids} 个网格的结果不完整: {', '.join(failed)}")
+
+        times = stage_times(read_metrics(metrics_files(config), run))
+        times.insert(0, 'N_Grids', n_grids)
+        times.insert(0, 'Run_ID', bench_id)
+        times['Grids_per_s'] = n_grids / times['Wall_s'].where(times['Wall_s'] > 0)
+        all_results.append(times)
+        print(times[['Stage', 'Wall_s', 'CPU_s', 'Process_Peak_RSS_MB']].to_string(index=False))
+
+    # -----------------------------------------------------------------
+    # 4. 扩展性曲线与退化检查
+    # -----------------------------------------------------------------
+    results = pd.concat(all_results, ignore_index=True)
+    history = pd.read_csv(results_file) if results_file.exists() else None
+    results = compare_previous(results, history)
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    pd.concat([history, results], ignore_index=True).to_csv(results_file, index=False)
+
+    print("\n====================================================")
+    print("扩展性 (耗时对网格数的 log-log 斜率，1 = 线性):")
+    for stage, slope in scaling_exponents(results).items():
+        print(f"  {stage:<12} {slope:.2f}")
+
+    regressions = results[results['Vs_Previous'] > REGRESSION_TOLERANCE]
+    if regressions.empty:
+        print("与上一次运行相比没有发现性能退化。")
+    else:
+        print(f"!! 以下阶段比上一次运行慢了 {REGRESSION_TOLERANCE} 倍以上:")
+        for _, row in regressions.iterrows():
+            print(f"  {row['N_Grids']} 个网格 / {row['Stage']}: {row['Vs_Previous']:.2f} 倍")
+
+    figure_file = BENCH_DIR / "BENCHMARK_SCALING.html"
+    scaling_figure(results).write_html(figure_file)
+    print(f"\n结果已追加到: {results_file}")
+    print(f"扩展性曲线: {figure_file}")
+    print("====================================================")
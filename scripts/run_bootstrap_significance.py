@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import multiprocessing
+import os
+
+from sci_store import STORE_DIR_NAME, CUBE_STEM, open_cube, batch_files
+from sci_frequency import DEFAULT_THRESHOLDS
+from sci_threshold import percentile_names, percentile_thresholds, grid_cutoffs
+from sci_bootstrap import (SIGNIFICANCE_FILE_NAME, year_segments, block_weights, bootstrap_chunk, make_tasks,
+                           insert_next_to_deltas)
+from sci_pipeline import stage_overrides
+from sci_metrics import METRICS_FILE_NAME, MetricsLog, file_bytes
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 'run_final_attribution.py' 的输出目录: 从归因主文件读取网格和 Delta_* 列，
+# 显著性结果写入单独的 FINAL_ATTRIBUTION_SIGNIFICANCE_CHINA_ONLY.csv
+# (归因主文件每次运行都会被重写，所以不再把结果写回主文件)
+output_dir = Path("E:/dissertation/ATTRIBUTION_RESULTS")
+
+# 各情景目录 (读取 MEANS_STORE 中的均值立方体，由 'calculate_means.py' 生成)
+scenario_dirs = {
+    '1901': Path("E:/dissertation/countclim-1901soc"),
+    'hist': Path("F:/fyp/countclim-histsoc"),
+    'obs': Path("F:/fyp/obsclim-histsoc"),
+}
+
+# 归因定义 (与 'run_final_attribution.py' 相同)
+attribution_drivers = {
+    'HA': ('hist', '1901'),  # 人类活动
+    'CC': ('obs', 'hist'),   # 气候变化
+}
+
+# 要检验的阈值 (必须与归因主文件中的 Delta_* 列对应)
+frequency_columns = list(DEFAULT_THRESHOLDS)
+
+# 百分位阈值 (Drought_Q10 等) 的参考情景和参考期 (与 'calculate_frequency.py' 相同)
+PERCENTILE_REFERENCE_DIR = Path("E:/dissertation/countclim-1901soc")
+PERCENTILE_REFERENCE_PERIOD = None  # 例如 ("1981-01-01", "2010-12-31")；None 为整个时段
+
+N_BOOTSTRAP = 1000   # 重抽样次数
+BLOCK_YEARS = 3      # 块长 (年)，保留年际自相关
+ALPHA = 0.05         # 95% 置信区间
+RANDOM_SEED = 2026
+CHUNK_GRIDS = 500    # 每个任务处理的网格数
+
+WORKER_COUNT = max(1, (os.cpu_count() or 2) - 1)
+
+# 由 'run_pipeline.py' 启动时，用配置文件中的设置覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    output_dir = Path(overrides['output_dir'])
+    scenario_dirs = {name: Path(d) for name, d in overrides['scenario_dirs'].items()}
+    attribution_drivers = {driver: tuple(pair) for driver, pair in overrides['drivers'].items()}
+    frequency_columns = overrides.get('thresholds', frequency_columns)
+    PERCENTILE_REFERENCE_DIR = Path(overrides.get('percentile_reference_dir', PERCENTILE_REFERENCE_DIR))
+    PERCENTILE_REFERENCE_PERIOD = overrides.get('percentile_reference_period', PERCENTILE_REFERENCE_PERIOD)
+    N_BOOTSTRAP = overrides.get('n_bootstrap', N_BOOTSTRAP)
+    BLOCK_YEARS = overrides.get('block_years', BLOCK_YEARS)
+    ALPHA = overrides.get('alpha', ALPHA)
+    RANDOM_SEED = overrides.get('seed', RANDOM_SEED)
+
+master_file = output_dir / "FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+significance_file = output_dir / SIGNIFICANCE_FILE_NAME
+
+
+# -----------------------------------------------------------------
+# 2. 【主程序】
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+
+    print("--- ------------------------------------------ ---")
+    print("--- 正在运行块自助法显著性检验 (Delta_HA / Delta_CC) ---")
+    print(f"--- 重抽样 {N_BOOTSTRAP} 次，块长 {BLOCK_YEARS} 年，使用 {WORKER_COUNT} 个 CPU 核心 ---")
+    print("--- ------------------------------------------ ---")
+
+    if not master_file.exists():
+        print(f"!! 严重错误: 找不到归因主文件: {master_file}")
+        print("!! 请先运行 'run_final_attribution.py' 脚本。")
+        exit(1)
+
+    metrics = MetricsLog(output_dir / METRICS_FILE_NAME)
+    timer = metrics.start("significance.total")
+
+    used = [name for name in scenario_dirs if any(name in pair for pair in attribution_drivers.values())]
+    store_dirs = {name: scenario_dirs[name] / STORE_DIR_NAME for name in used}
+
+    with timer.phase('read'):
+        df_master = pd.read_csv(master_file)
+    grid_ids = df_master['Grid_ID'].to_numpy()
+    timer.add(bytes_read=file_bytes([master_file] + [p for d in store_dirs.values() for p in batch_files(d, CUBE_STEM)]))
+
+    # 百分位阈值: 由参考情景逐网格计算一次，与 'calculate_frequency.py' 的切点相同
+    cutoffs = None
+    if percentile_names(frequency_columns):
+        try:
+            with timer.phase('percentiles'):
+                threshold_table = percentile_thresholds(open_cube(PERCENTILE_REFERENCE_DIR / STORE_DIR_NAME),
+                                                        frequency_columns, reference=PERCENTILE_REFERENCE_PERIOD)
+                cutoffs = grid_cutoffs(threshold_table, frequency_columns, grid_ids)
+        except Exception as e:
+            print(f"!! 严重错误: 无法由参考情景 {PERCENTILE_REFERENCE_DIR} 计算百分位阈值: {e}")
+            exit(1)
+
+    # 所有情景、所有网格共用同一组重抽样年份
+    _, years = year_segments(open_cube(store_dirs[used[0]]).dates)
+    weights = block_weights(len(years), N_BOOTSTRAP, BLOCK_YEARS, seed=RANDOM_SEED)
+    print(f"共 {len(grid_ids)} 个网格，{len(years)} 年 ({years[0]}-{years[-1]})。开始重抽样...")
+
+    tasks = make_tasks({k: str(v) for k, v in store_dirs.items()}, grid_ids, frequency_columns,
+                       attribution_drivers, weights, alpha=ALPHA, chunk_grids=CHUNK_GRIDS, grid_cutoffs=cutoffs)
+
+    try:
+        with timer.phase('bootstrap'), multiprocessing.Pool(processes=WORKER_COUNT) as pool:
+            results = pool.map(bootstrap_chunk, tasks)
+    except Exception as e:
+        print(f"!! 严重错误: 自助检验失败: {e}")
+        exit(1)
+    timer.add(rows=len(grid_ids) * len(years) * len(used))
+
+    significance = pd.DataFrame({
+        col: np.concatenate([r[col] for r in results]) for col in results[0]
+    })
+
+    # 只保留坐标和被检验的 Delta_* 列，CI_Low / CI_High / P 紧跟在对应的 Delta 之后
+    delta_columns = [f"Delta_{driver}_{col}" for driver in attribution_drivers for col in frequency_columns]
+    df_out = insert_next_to_deltas(df_master[['Grid_ID', 'Lon', 'Lat'] + delta_columns], significance,
+                                   attribution_drivers, frequency_columns)
+    with timer.phase('write_csv'):
+        df_out.to_csv(significance_file, index=False)
+    timer.add(bytes_written=file_bytes([significance_file]))
+
+    print("\n====================================================")
+    print(f"--- 成功！置信区间和 p 值已保存到: {significance_file} ---")
+    for driver in attribution_drivers:
+        for col in frequency_columns:
+            n_sig = (df_out[f"P_{driver}_{col}"] < ALPHA).sum()
+            print(f"  Delta_{driver}_{col}: {n_sig} 个网格显著 (p < {ALPHA})")
+
+    metrics.finish(timer)
+    print(f"运行指标已追加到: {metrics.path}")
+    print("====================================================")
@@ -1,72 +1,113 @@
 import pandas as pd
 from pathlib import Path
+import multiprocessing
+import time
+
+from sci_netcdf import suffix_grid_range
+from sci_scan import (STATUS_OK, expected_dates, discover_suffixes, fill_gaps, scan_file, scan_tasks,
+                      rerun_list)
+from sci_metrics import METRICS_FILE_NAME, StageTimer, MetricsLog, file_bytes
 
 # -----------------------------------------------------------------
 # 1. 【设置】
-# (！！请仔细检查这两个文件的路径！！)
+# (！！请仔细检查各情景目录的路径！！)
 # -----------------------------------------------------------------
 
-# “坐标”情景 (完整的)
-coord_file = Path("F:/fyp/obsclim-histsoc/obsclim-histsoc_RATIO_STATS.csv")
+# 要检查的所有情景 (R 脚本导出的 {model}_grids_X_Y.csv 所在目录)
+scenario_dirs = {
+    'countclim-1901soc': Path("E:/dissertation/countclim-1901soc"),
+    'countclim-histsoc': Path("F:/fyp/countclim-histsoc"),
+    'obsclim-histsoc': Path("F:/fyp/obsclim-histsoc"),
+}
 
-# “数据”情景 (有缺口的)
-data_file = Path("F:/fyp/countclim-histsoc/countclim-histsoc_RATIO_STATS.csv")
+models = [
+    "h08", "hydropy", "jules-w2", "lpjml5-7-10-fire",
+    "miroc-integ-land", "watergap2-2e", "web-dhm-sg"
+]
 
-print("--- ---------------------------------- ---")
-print("--- 正在运行数据完整性诊断检查 ---")
-print("--- ---------------------------------- ---")
+# R 脚本生成的正确列名 (与 'calculate_means.py' 一致)
+CORRECT_COLUMN_NAMES = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
 
-try:
-    # 1. 加载文件并获取 Grid_ID
-    if not coord_file.exists():
-        print(f"!! 错误: 找不到“完整”文件: {coord_file}")
-        exit()
-    df_good = pd.read_csv(coord_file)
-    good_grids = set(df_good['Grid_ID'])
-    print(f"“完整”文件 ({coord_file.name}) 包含: {len(good_grids)} 个独特的 Grid_ID。")
+# 诊断报告的输出目录
+output_dir = Path("E:/dissertation/ATTRIBUTION_RESULTS")
+output_dir.mkdir(exist_ok=True, parents=True)
 
-    if not data_file.exists():
-        print(f"!! 错误: 找不到“有缺口”文件: {data_file}")
-        exit()
-    df_bad = pd.read_csv(data_file)
-    bad_grids = set(df_bad['Grid_ID'])
-    print(f"“有缺口”文件 ({data_file.name}) 包含: {len(bad_grids)} 个独特的 Grid_ID。")
+WORKER_COUNT = max(1, multiprocessing.cpu_count() - 1)
 
-    # 2. 比较两个集合
-    print("\n--- 诊断结果 ---")
 
-    missing_grids = good_grids - bad_grids  # 在“完整”中但不在“有缺口”中
+def scan_file_timed(task):
+    """扫描一个文件，同时返回该文件的指标记录 (在工人进程中运行)。"""
+    with StageTimer("diagnostic.file", batch=f"{task['scenario']}/{task['model']}_{task['suffix']}") as timer:
+        row = scan_file(task)
+        timer.add(rows=row['Rows'], bytes_read=row['Size_Bytes'])
+    return row, timer.record
 
-    if not missing_grids:
-        print("!! 诊断失败: 两个文件包含完全相同的 Grid_ID。")
-        print("!! 这非常奇怪。请联系技术支持。")
-    else:
-        print(f"!! 诊断成功：'{data_file.name}' 文件中缺失了 {len(missing_grids)} 个 Grid_ID。")
-        print("缺失的 Grid_ID 列表 (仅显示前 20 个):")
-        print(list(missing_grids)[:20])
 
-        # 3. 找出这些缺失的 Grid_ID 属于哪个批次
-        print("\n--- 解决方案 ---")
-        print("这些缺失的 Grid_ID 位于以下坐标范围 (及对应的批次文件):")
+if __name__ == "__main__":
+    # 工人进程导入本文件时不重复打印
+    print("--- ---------------------------------- ---")
+    print("--- 正在运行数据完整性诊断检查 ---")
+    print(f"--- {len(scenario_dirs)} 个情景 x {len(models)} 个模型，使用 {WORKER_COUNT} 个 CPU 核心 ---")
+    print("--- ---------------------------------- ---")
 
-        # 找出缺失的网格在“完整”文件中的坐标
-        missing_grid_details = df_good[df_good['Grid_ID'].isin(missing_grids)]
+    start_time = time.time()
 
-        # 找出缺失的批次
-        # (假设 160 个网格为一批)
-        missing_grid_details['Batch_Group'] = (missing_grid_details['Grid_ID'] - 1) // 160
+    # 运行指标 (每个文件一行，外加整次扫描一行) 追加到 PIPELINE_METRICS.jsonl
+    metrics = MetricsLog(output_dir / METRICS_FILE_NAME)
+    timer = metrics.start("diagnostic.total")
 
-        batches = missing_grid_details['Batch_Group'].unique()
+    # 1. 期望的批次: 所有情景、所有模型的并集，并补上中间的缺口
+    for name, scenario_dir in scenario_dirs.items():
+        if not scenario_dir.exists():
+            print(f"!! 警告: 找不到情景 {name} 的目录: {scenario_dir}")
+    suffixes = fill_gaps(discover_suffixes(scenario_dirs.values(), models))
+    if not suffixes:
+        print("!! 错误: 在所有情景目录中都没有找到任何批次文件。")
+        exit()
+    print(f"期望的批次数: {len(suffixes)} ({suffixes[0]} ... {suffixes[-1]})")
 
-        for batch_num in sorted(batches):
-            start_grid = (batch_num * 160) + 1
-            end_grid = (batch_num + 1) * 160
-            batch_suffix = f"grids_{start_grid}_{end_grid}.csv"
-            print(f"  - 批次: {batch_suffix}")
+    # 2. 并行扫描每个文件 (只读标题行、大小以及 Grid_ID / Date 两列)
+    tasks = scan_tasks(scenario_dirs, models, suffixes, CORRECT_COLUMN_NAMES, expected_dates())
+    rows = []
+    with multiprocessing.Pool(processes=WORKER_COUNT) as pool, timer.phase('scan'):
+        for row, record in pool.imap_unordered(scan_file_timed, tasks, chunksize=8):
+            rows.append(row)
+            metrics.write(record)
+            timer.add(rows=record['rows'], bytes_read=record['bytes_read'])
 
-        print(f"\n请您去检查 'F:\\fyp\\countclim-histsoc' 文件夹，")
-        print(f"确认该文件夹中**是否缺少**上述批次的**所有 7 个模型**的原始 .csv 文件。")
-        print("您必须重新运行 R 脚本为 'countclim-histsoc' 生成这些缺失的批次文件。")
+    report = pd.DataFrame(rows)
+    report['_order'] = report['Batch'].map(lambda s: suffix_grid_range(s)[0])
+    report = report.sort_values(['Scenario', 'Model', '_order']).drop(columns='_order').reset_index(drop=True)
 
-except Exception as e:
-    print(f"!! 诊断时发生错误: {e}")
\ No newline at end of file
+    report_file = output_dir / "COMPLETENESS_REPORT.csv"
+    report.to_csv(report_file, index=False)
+
+    # 3. 需要重新运行 R 脚本的批次 (按情景、模型列出)
+    print("\n--- 诊断结果 ---")
+    rerun = rerun_list(report)
+    rerun_file = output_dir / "RERUN_LIST.csv"
+    rerun.to_csv(rerun_file, index=False)
+    timer.add(bytes_written=file_bytes([report_file, rerun_file]))
+
+    bad_header = report[(report['Status'] == STATUS_OK) & ~report['Header_OK']]
+    if len(bad_header):
+        print(f"(另有 {len(bad_header)} 个文件标题行损坏但数据完整，'calculate_means.py' 可以直接读取)")
+
+    if rerun.empty:
+        print(f"所有 {len(report)} 个文件均完整。")
+    else:
+        print(f"!! 共有 {len(rerun)} 个文件需要重新生成:")
+        for (scenario, mod), group in rerun.groupby(['Scenario', 'Model'], sort=False):
+            print(f"  [{scenario}] {mod}: {len(group)} 个批次")
+            for _, row in group.head(10).iterrows():
+                print(f"      - {mod}_{row['Batch']} ({row['Status']}: {row['Issue']})")
+            if len(group) > 10:
+                print(f"      ... 其余 {len(group) - 10} 个见 {rerun_file.name}")
+        print("\n请为上述情景和模型重新运行 R 脚本，生成这些批次文件。")
+
+    print(f"\n完整报告: {report_file}")
+    print(f"重跑列表: {rerun_file}")
+    print(f"扫描耗时: {time.time() - start_time:.1f} 秒")
+
+    metrics.finish(timer)
+    print(f"运行指标已追加到: {metrics.path}")
\ No newline at end of file
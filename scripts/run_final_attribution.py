@@ -1,9 +1,17 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
 from pathlib import Path
 import os
-import geopandas as gpd
-from shapely.geometry import Point
+
+from sci_mask import load_mask, apply_mask
+from sci_attribution import load_scenarios, attribution_frame, risk_ratio_frame, model_agreement_frame
+from sci_events import event_columns
+from sci_frequency import model_column, column_models
+from sci_maps import layered_figure
+from sci_profile import zonal_profile, profile_figure
+from sci_region import load_membership, region_aggregate
+from sci_pipeline import stage_overrides
+from sci_metrics import METRICS_FILE_NAME, MetricsLog, file_bytes
 
 # -----------------------------------------------------------------
 # 1. 【设置】
@@ -19,121 +27,204 @@ scen_count_hist_path = Path("F:/fyp/countclim-histsoc/countclim-histsoc_FREQUENC
 # 情景 3 (观测)
 scen_obs_path = Path("F:/fyp/obsclim-histsoc/obsclim-histsoc_FREQUENCY_STATS.csv")
 
-# Shapefile 的名称
+scenario_paths = {
+    '1901': scen_1901_path,
+    'hist': scen_count_hist_path,
+    'obs': scen_obs_path,
+}
+
+# 归因定义: 驱动因子 -> (情景 A, 情景 B)，Delta = A - B
+attribution_drivers = {
+    'HA': ('hist', '1901'),  # 人类活动
+    'CC': ('obs', 'hist'),   # 气候变化
+}
+
+# Shapefile (从情景1的文件夹加载)
 SHAPEFILE_NAME = "1query_shape_copy.shp"
+shapefile_path = scen_1901_path.parent / SHAPEFILE_NAME
 
 # 归因分析的输出目录
 output_dir = Path("E:/dissertation/ATTRIBUTION_RESULTS")
-output_dir.mkdir(exist_ok=True)
 
 # 要分析的列
 frequency_columns = [
     "Drought_1.0", "Drought_1.5", "Flood_1.0", "Flood_1.5"
 ]
 
+# 是否同时计算风险比 RR_* = A / B (基准次数为 0 的网格为 inf / NaN)。
+# 风险比单独保存到 FINAL_RISK_RATIO_STATS_CHINA_ONLY.csv，不改变归因主文件的列。
+RISK_RATIO = False
+
+# 剖面图的分带方式 (按纬度每 1 度一个带；也可以改为 'Lon' 或高程列)
+PROFILE_BAND = 'Lat'
+PROFILE_BIN_WIDTH = 1.0
+
+# 区域汇总的多边形图层 (流域 / 省 / 气候区 ...): 名称 -> shapefile 及区域名称列
+# 例如 {'province': {'shapefile': "E:/dissertation/regions/provinces.shp", 'id_column': "NAME"}}
+# 每个图层的 网格 -> 区域 隶属矩阵只计算一次 (缓存到 MASK_CACHE)
+REGION_LAYERS = {}
+# "area" = 按网格单元落在区域内的面积比例分摊；"point" = 只看网格中心点
+REGION_WEIGHT_MODE = "area"
+
+# 由 'run_pipeline.py' 启动时，用配置文件中的情景和归因定义覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    scenario_paths = {name: Path(path) for name, path in overrides['scenario_paths'].items()}
+    attribution_drivers = {driver: tuple(pair) for driver, pair in overrides['drivers'].items()}
+    shapefile_path = Path(overrides['shapefile'])
+    output_dir = Path(overrides['output_dir'])
+    frequency_columns = overrides.get('frequency_columns', frequency_columns)
+    REGION_LAYERS = overrides.get('region_layers', REGION_LAYERS)
+    RISK_RATIO = overrides.get('risk_ratio', RISK_RATIO)
+
+output_dir.mkdir(exist_ok=True, parents=True)
+
+# 运行指标 (各步骤耗时、行数、读写字节数、峰值内存) 追加到 PIPELINE_METRICS.jsonl
+metrics = MetricsLog(output_dir / METRICS_FILE_NAME)
+timer = metrics.start("attribution.total")
+
 print("--- ------------------------------------------ ---")
 print("--- 正在开始最终归因分析 (已集成 Geopandas 筛选) ---")
 print("--- ------------------------------------------ ---")
 
 # -----------------------------------------------------------------
-# 2. 读取和合并数据
-# (无需更改)
+# 2. 读取并对齐数据
+# (每个情景只读取一次，按 Grid_ID 对齐为数组后直接计算归因)
 # -----------------------------------------------------------------
 try:
-    df_1901 = pd.read_csv(scen_1901_path)
-    df_count_hist = pd.read_csv(scen_count_hist_path)
-    df_obs = pd.read_csv(scen_obs_path)
-    print("已成功读取所有 3 个情景的频率文件。")
-
-    # 按 Grid_ID 合并
-    df_1901_renamed = df_1901.add_suffix('_1901')
-    df_count_hist_renamed = df_count_hist.add_suffix('_hist')
-    df_obs_renamed = df_obs.add_suffix('_obs')
-
-    df_merged = pd.merge(
-        df_1901_renamed, df_count_hist_renamed,
-        left_on='Grid_ID_1901', right_on='Grid_ID_hist'
-    )
-    df_merged = pd.merge(
-        df_merged, df_obs_renamed,
-        left_on='Grid_ID_1901', right_on='Grid_ID_obs'
-    )
+    with timer.phase('read'):
+        scenario_stack = load_scenarios(scenario_paths, frequency_columns, how='inner')
+    timer.add(bytes_read=file_bytes(scenario_paths.values()))
+    print(f"已成功读取所有 {len(scenario_paths)} 个情景的频率文件。")
 
-    # 清理并保留一组 Lon/Lat/Grid_ID
-    df_final = df_merged.rename(columns={
-        'Grid_ID_1901': 'Grid_ID', 'Lon_1901': 'Lon', 'Lat_1901': 'Lat'
-    })
-    cols_to_drop = [col for col in df_final.columns if
-                    col.startswith(('Grid_ID_', 'Lon_', 'Lat_')) and col not in ['Grid_ID', 'Lon', 'Lat']]
-    df_final = df_final.drop(columns=cols_to_drop)
+    # Grid_ID, Lon, Lat, 各情景频率, Delta_*
+    with timer.phase('attribution'):
+        df_final = attribution_frame(scenario_stack, attribution_drivers, count_indicators=frequency_columns)
+    timer.add(rows=len(df_final))
 
-    print(f"数据合并完毕。总共 {len(df_final)} 个网格点。")
+    print(f"数据对齐完毕。总共 {len(df_final)} 个网格点。")
 
 except Exception as e:
-    print(f"!! 严重错误: 读取或合并文件时失败: {e}")
-    exit()
+    print(f"!! 严重错误: 读取或对齐文件时失败: {e}")
+    exit(1)
 
 # -----------------------------------------------------------------
-# 3. 【新】: 使用 Geopandas 筛选中国区域
+# 3. 【新】: 使用缓存的中国掩膜筛选中国区域
+# (第一次运行时做空间判断，之后按 Grid_ID 查表)
 # -----------------------------------------------------------------
 try:
-    # 我们从情景1的文件夹加载 shapefile
-    shapefile_path = scen_1901_path.parent / SHAPEFILE_NAME
     if not shapefile_path.exists():
         print(f"!! 严重错误: 未找到 Shapefile: {shapefile_path}")
-        print(f"!! 请确保 '{SHAPEFILE_NAME}' (及其 .shx, .dbf) 位于 {scen_1901_path.parent} 中。")
-        exit()
+        print(f"!! 请确保 '{shapefile_path.name}' (及其 .shx, .dbf) 位于 {shapefile_path.parent} 中。")
+        exit(1)
 
-    print(f"正在读取中国边界: {shapefile_path} ...")
-    china_boundary = gpd.read_file(shapefile_path)
-    china_boundary = china_boundary.to_crs(epsg=4326)  # 确保坐标系一致
+    print(f"正在读取中国掩膜: {shapefile_path} ...")
+    with timer.phase('spatial_join'):
+        china_mask = load_mask(df_final, shapefile_path)
 
-    # 1. 将合并后的 DataFrame 转换为 GeoDataFrame
-    geometry = [Point(xy) for xy in zip(df_final['Lon'], df_final['Lat'])]
-    gdf_points = gpd.GeoDataFrame(df_final, crs="EPSG:4326", geometry=geometry)
-
-    # 2. 执行空间连接 (Spatial Join)
     print("正在执行空间筛选...")
-
-    # 【!! 此处是唯一的更改 !!】
-    # 'op=' 已更改为 'predicate='
-    gdf_china_only = gpd.sjoin(gdf_points, china_boundary, how="inner", predicate='within')
-
-    # 3. 转换回普通的 DataFrame
-    df_china_final = pd.DataFrame(gdf_china_only.drop(columns=['geometry', 'index_right']))
+    with timer.phase('spatial_join'):
+        df_china_final = apply_mask(df_final, china_mask)
 
     print(f"筛选完毕。总共 {len(df_final)} 个网格点，其中 {len(df_china_final)} 个位于中国境内。")
 
     if df_china_final.empty:
         print("!! 严重错误: 筛选后没有剩余任何数据。请检查您的 shapefile 和网格坐标。")
-        exit()
+        exit(1)
 
 except Exception as e:
-    print(f"!! 严重错误: Geopandas 筛选失败: {e}")
+    print(f"!! 严重错误: 中国掩膜筛选失败: {e}")
     print("!! 请确保您已复制了 .shp, .shx, 和 .dbf 文件。")
-    exit()
+    exit(1)
 
 # -----------------------------------------------------------------
-# 4. 计算差异 (Delta_HA 和 Delta_CC)
-# (无需更改)
+# 4. 保存归因结果
+# (Delta_HA 和 Delta_CC 已在第 2 步中计算)
 # -----------------------------------------------------------------
-print("正在计算人类活动 (HA) 和气候变化 (CC) 的影响...")
-
-for col in frequency_columns:
-    col_1901 = f"{col}_1901"
-    col_hist = f"{col}_hist"
-    col_obs = f"{col}_obs"
-
-    col_delta_HA = f"Delta_HA_{col}"  # 人类活动
-    col_delta_CC = f"Delta_CC_{col}"  # 气候变化
-
-    df_china_final[col_delta_HA] = df_china_final[col_hist] - df_china_final[col_1901]
-    df_china_final[col_delta_CC] = df_china_final[col_obs] - df_china_final[col_hist]
-
 master_file = output_dir / "FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv"
-df_china_final.to_csv(master_file, index=False)
+with timer.phase('write_csv'):
+    df_china_final.to_csv(master_file, index=False)
+timer.add(bytes_written=file_bytes([master_file]))
 print(f"最终归因主文件 (仅中国) 已保存到: {master_file}")
 
+# 风险比 (可选，单独的文件)
+if RISK_RATIO:
+    with timer.phase('attribution'):
+        df_rr_china = apply_mask(risk_ratio_frame(scenario_stack, attribution_drivers), china_mask)
+    rr_file = output_dir / "FINAL_RISK_RATIO_STATS_CHINA_ONLY.csv"
+    with timer.phase('write_csv'):
+        df_rr_china.to_csv(rr_file, index=False)
+    timer.add(bytes_written=file_bytes([rr_file]))
+    print(f"风险比 RR_* (仅中国) 已保存到: {rr_file}")
+
+# 事件指标 (calculate_frequency.py 生成的 *_EVENT_STATS.csv 与频率文件布局相同，直接归因)
+event_paths = {
+    name: path.with_name(path.name.replace("_FREQUENCY_STATS", "_EVENT_STATS"))
+    for name, path in scenario_paths.items()
+}
+if all(path.exists() for path in event_paths.values()):
+    try:
+        with timer.phase('events'):
+            event_stack = load_scenarios(event_paths, event_columns(frequency_columns), how='inner')
+            # 事件次数和最长持续月数是整数，平均持续时间、强度等保持浮点
+            event_counts = [col for col in event_columns(frequency_columns) if col.startswith(("Events_", "MaxDur_"))]
+            df_events_china = apply_mask(attribution_frame(event_stack, attribution_drivers,
+                                                           count_indicators=event_counts), china_mask)
+        timer.add(bytes_read=file_bytes(event_paths.values()))
+
+        event_master_file = output_dir / "FINAL_EVENT_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+        with timer.phase('write_csv'):
+            df_events_china.to_csv(event_master_file, index=False)
+        timer.add(bytes_written=file_bytes([event_master_file]))
+        print(f"事件归因文件 (仅中国) 已保存到: {event_master_file}")
+    except Exception as e:
+        print(f"!! 警告: 事件指标归因失败: {e}")
+else:
+    print("未找到所有情景的 *_EVENT_STATS.csv，跳过事件指标归因。")
+
+# 逐模型归因 (calculate_frequency.py 由各模型立方体生成 *_MODEL_FREQUENCY_STATS.csv)
+# 每个模型的 Delta、多模型平均 (MMM) 以及与 MMM 同号的模型比例 (Agreement)
+model_paths = {
+    name: path.with_name(path.name.replace("_FREQUENCY_STATS", "_MODEL_FREQUENCY_STATS"))
+    for name, path in scenario_paths.items()
+}
+df_models_china = None
+if all(path.exists() for path in model_paths.values()):
+    try:
+        with timer.phase('models'):
+            header = pd.read_csv(next(iter(model_paths.values())), nrows=0).columns
+            model_names = column_models(header, frequency_columns)
+            model_stack = load_scenarios(model_paths, [model_column(col, mod) for col in frequency_columns
+                                                       for mod in model_names], how='inner')
+            df_models_china = apply_mask(model_agreement_frame(model_stack, attribution_drivers,
+                                                               frequency_columns, model_names), china_mask)
+        timer.add(bytes_read=file_bytes(model_paths.values()))
+
+        model_master_file = output_dir / "FINAL_MODEL_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+        with timer.phase('write_csv'):
+            df_models_china.to_csv(model_master_file, index=False)
+        timer.add(bytes_written=file_bytes([model_master_file]))
+        print(f"逐模型归因文件 ({len(model_names)} 个模型，仅中国) 已保存到: {model_master_file}")
+
+        # 模型一致性地图: 同号比例乘以 MMM 的符号 (红 = 多数模型一致增加，蓝 = 一致减少)
+        agreement_titles = {}
+        for col in frequency_columns:
+            for driver in attribution_drivers:
+                layer = f"Signed_Agreement_{driver}_{col}"
+                df_models_china[layer] = (df_models_china[f"Agreement_{driver}_{col}"]
+                                          * np.sign(df_models_china[f"Delta_{driver}_{col}_MMM"]))
+                agreement_titles[layer] = f"{driver} 对 {col} 影响的模型一致性 (同号模型比例 x MMM 符号)"
+        agreement_map = output_dir / "FINAL_MODEL_AGREEMENT_MAP_CHINA_ONLY.html"
+        with timer.phase('write_html'):
+            layered_figure(df_models_china, agreement_titles,
+                           colorbar_title='Model Agreement').write_html(agreement_map)
+        timer.add(bytes_written=file_bytes([agreement_map]))
+        print(f"模型一致性地图 ({len(agreement_titles)} 个图层) 已保存到: {agreement_map}")
+    except Exception as e:
+        print(f"!! 警告: 逐模型归因失败: {e}")
+else:
+    print("未找到所有情景的 *_MODEL_FREQUENCY_STATS.csv，跳过逐模型归因。")
+
 # -----------------------------------------------------------------
 # 5. 【宏观分析】: 区域总和 (仅中国)
 # (无需更改)
@@ -141,20 +232,48 @@ print(f"最终归因主文件 (仅中国) 已保存到: {master_file}")
 print("\n--- 1. 宏观分析 (仅中国区域总和) ---")
 print("气候变化 (CC) 和人类活动 (HA) 对 *中国区域* 事件总次数的 *净影响*:")
 
-for col in frequency_columns:
-    delta_ha_col = f"Delta_HA_{col}"
-    delta_cc_col = f"Delta_CC_{col}"
-
-    total_delta_HA = df_china_final[delta_ha_col].sum()
-    total_delta_CC = df_china_final[delta_cc_col].sum()
+driver_labels = {'HA': '人类活动', 'CC': '气候变化'}
 
+for col in frequency_columns:
     print(f"  --- {col} ---")
-    print(f"     人类活动 (Delta_HA) 影响: {total_delta_HA} 次")
-    print(f"     气候变化 (Delta_CC) 影响: {total_delta_CC} 次")
+    for driver in attribution_drivers:
+        total_delta = df_china_final[f"Delta_{driver}_{col}"].sum()
+        print(f"     {driver_labels.get(driver, driver)} (Delta_{driver}) 影响: {total_delta} 次")
+        if df_models_china is not None:
+            # 各模型的区域总和与 MMM 同号的模型数
+            model_totals = df_models_china[[f"Delta_{driver}_{col}_{mod}" for mod in model_names]].sum()
+            mmm_sign = np.sign(model_totals.mean())
+            agree = int((np.sign(model_totals) == mmm_sign).sum())
+            print(f"        {agree} / {len(model_names)} 个模型的区域总和与多模型平均同号")
+
+# -----------------------------------------------------------------
+# 5b. 【区域汇总】: 所有情景次数和 Delta_* 一次稀疏矩阵乘法汇总到每个区域
+# -----------------------------------------------------------------
+if REGION_LAYERS:
+    region_columns = [col for col in df_china_final.columns if col not in ('Grid_ID', 'Lon', 'Lat')]
+    region_tables = []
+    for layer, spec in REGION_LAYERS.items():
+        try:
+            with timer.phase('regions'):
+                membership = load_membership(df_china_final, spec['shapefile'], spec.get('id_column'),
+                                             mode=REGION_WEIGHT_MODE)
+                table = region_aggregate(membership, df_china_final, region_columns)
+            table.insert(0, 'Layer', layer)
+            region_tables.append(table)
+            print(f"  区域图层 {layer}: {len(membership.regions)} 个区域")
+        except Exception as e:
+            print(f"!! 警告: 区域图层 {layer} 汇总失败: {e}")
+
+    if region_tables:
+        region_file = output_dir / "FINAL_REGION_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+        with timer.phase('write_csv'):
+            pd.concat(region_tables, ignore_index=True).to_csv(region_file, index=False)
+        timer.add(bytes_written=file_bytes([region_file]))
+        print(f"区域汇总 (Total / Mean / N_Grids / Area_km2) 已保存到: {region_file}")
 
 # -----------------------------------------------------------------
 # 6. 【具体分析】: 绘制纬度剖面图 (仅中国)
-# (无需更改)
+# (所有 Delta 列一次分带汇总，剖面图由汇总表绘制)
 # -----------------------------------------------------------------
 print("\n--- 2. 具体分析 (中国区域纬度剖面) ---")
 print("正在生成归因剖面图...")
@@ -162,21 +281,31 @@ print("正在生成归因剖面图...")
 plot_files_created = 0
 delta_columns = [col for col in df_china_final.columns if col.startswith("Delta_")]
 
+with timer.phase('groupby'):
+    profile = zonal_profile(df_china_final, delta_columns, by=PROFILE_BAND, bin_width=PROFILE_BIN_WIDTH)
+profile_file = output_dir / f"FINAL_ATTRIBUTION_{PROFILE_BAND}_PROFILE_CHINA_ONLY.csv"
+with timer.phase('write_csv'):
+    profile.to_csv(profile_file, index=False)
+timer.add(bytes_written=file_bytes([profile_file]))
+print(f"带状统计 (Mean / Median / IQR / N_Grids) 已保存到: {profile_file}")
+
 for delta_col_name in delta_columns:
-    df_sorted = df_china_final.sort_values(by='Lat')
-
-    fig = px.line(
-        df_sorted,
-        x='Lat',
-        y=delta_col_name,
-        title=f'{delta_col_name} 随纬度的变化 (仅中国)',
-        labels={'Lat': 'Latitude', delta_col_name: f'频率变化 (次数)'}
+    fig = profile_figure(
+        profile,
+        delta_col_name,
+        by=PROFILE_BAND,
+        title=f'{delta_col_name} 随 {PROFILE_BAND} 的变化 (仅中国，带宽 {PROFILE_BIN_WIDTH:g})',
+        y_label='频率变化 (次数)'
     )
-    fig.add_hline(y=0, line_dash="dash", line_color="grey")
 
     output_file = output_dir / f"FINAL_ATTRIBUTION_{delta_col_name}_PROFILE_CHINA_ONLY.html"
-    fig.write_html(output_file)
+    with timer.phase('write_html'):
+        fig.write_html(output_file)
+    timer.add(bytes_written=file_bytes([output_file]))
     plot_files_created += 1
 
 print(f"成功！已在 {output_dir} 中生成 {plot_files_created} 张最终归因剖面图。")
+
+metrics.finish(timer)
+print(f"运行指标已追加到: {metrics.path}")
 print("====================================================")
\ No newline at end of file
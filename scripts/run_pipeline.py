@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+from sci_pipeline import STATUS_OK, load_config, build_stages, run_pipeline
+from sci_metrics import run_id
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 流水线配置 (情景目录、归因定义、要运行的阶段等)；
+# 也可以在命令行中指定: python run_pipeline.py my_config.json
+CONFIG_PATH = Path(__file__).parent / "pipeline_config.json"
+if len(sys.argv) > 1:
+    CONFIG_PATH = Path(sys.argv[1])
+
+# 各阶段脚本所在的文件夹
+SCRIPTS_DIR = Path(__file__).parent
+
+if __name__ == "__main__":
+    print("--- ------------------------------------------ ---")
+    print(f"--- 多情景流水线: {CONFIG_PATH.name} ---")
+    print("--- ------------------------------------------ ---")
+
+    config = load_config(CONFIG_PATH)
+    stages = build_stages(config)
+    if not stages:
+        print("!! 配置中没有要运行的阶段。")
+        sys.exit(1)
+
+    # 每个阶段的输出写入单独的日志
+    log_dir = Path(config.get('log_dir', Path(config['attribution_dir']) / "PIPELINE_LOGS"))
+
+    # -----------------------------------------------------------------
+    # 2. 按依赖图运行 (互不依赖的情景同时运行)
+    # -----------------------------------------------------------------
+    # 所有阶段的运行指标 (PIPELINE_METRICS.jsonl) 使用同一个 run_id
+    print(f"运行编号 (run_id): {run_id()}")
+    print(f"共 {len(stages)} 个阶段，最多同时运行 {config['max_parallel_stages']} 个:")
+    for stage_id, stage in stages.items():
+        deps = ', '.join(stage['deps']) or '-'
+        print(f"  {stage_id:<20} 依赖: {deps}")
+    print()
+
+    results = run_pipeline(stages, SCRIPTS_DIR, log_dir, max_parallel=config['max_parallel_stages'])
+
+    # -----------------------------------------------------------------
+    # 3. 汇总
+    # -----------------------------------------------------------------
+    print("\n====================================================")
+    for stage_id in stages:
+        result = results[stage_id]
+        print(f"  {stage_id:<20} {result['status']:<8} {result['seconds']:.1f} 秒")
+    print(f"各阶段日志位于: {log_dir}")
+    print("====================================================")
+
+    if any(result['status'] != STATUS_OK for result in results.values()):
+        sys.exit(1)
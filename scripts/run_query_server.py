@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+from sci_query import QueryEngine, serve, DEFAULT_PORT
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 归因结果 (由 'run_final_attribution.py' 生成)
+attribution_file = Path("E:/dissertation/ATTRIBUTION_RESULTS/FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv")
+
+# 各情景目录 (读取 MEANS_STORE 中的 Mean_SCI 时间序列)
+scenario_dirs = {
+    '1901': Path("E:/dissertation/countclim-1901soc"),
+    'hist': Path("F:/fyp/countclim-histsoc"),
+    'obs': Path("F:/fyp/obsclim-histsoc"),
+}
+
+# 区域查询用的多边形图层 (与 'run_final_attribution.py' 的 REGION_LAYERS 相同)
+REGION_LAYERS = {}
+
+HOST = "127.0.0.1"
+PORT = DEFAULT_PORT
+
+# 也可以在命令行中指定流水线配置: python run_query_server.py pipeline_config.json
+if len(sys.argv) > 1:
+    import json
+    with open(sys.argv[1], encoding='utf-8') as f:
+        config = json.load(f)
+    attribution_file = Path(config['attribution_dir']) / "FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+    scenario_dirs = {name: Path(s['dir']) for name, s in config['scenarios'].items()}
+    REGION_LAYERS = config.get('region_layers', REGION_LAYERS)
+
+# -----------------------------------------------------------------
+# 2. 启动查询服务
+# (在 Python 中也可以直接使用: engine.grid(123) / engine.nearest(104.1, 30.6) ...)
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+    if not attribution_file.exists():
+        print(f"!! 严重错误: 未找到归因结果: {attribution_file}")
+        exit(1)
+
+    engine = QueryEngine(attribution_file, scenario_dirs, REGION_LAYERS)
+    print(f"归因结果: {attribution_file}")
+    print(f"情景: {', '.join(scenario_dirs)}")
+    print("可用查询: /grid?id=  /bbox?lon_min=&lon_max=&lat_min=&lat_max=  /nearest?lon=&lat=&k=  "
+          "/region?layer=&name=  /columns")
+    serve(engine, HOST, PORT)
@@ -0,0 +1,204 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sci_store import STORE_DIR_NAME, GRID_DTYPE, open_cube
+from sci_frequency import DEFAULT_THRESHOLDS
+from sci_threshold import percentile_names, percentile_thresholds, grid_cutoffs
+from sci_windows import DEFAULT_SEASONS, build_windows, window_counts, window_deltas, window_summary
+from sci_mask import load_mask
+from sci_pipeline import stage_overrides
+from sci_metrics import METRICS_FILE_NAME, MetricsLog, file_bytes
+
+# -----------------------------------------------------------------
+# 1. 【设置】
+# -----------------------------------------------------------------
+
+# 各情景目录 (读取 MEANS_STORE 中的均值立方体)
+scenario_dirs = {
+    '1901': Path("E:/dissertation/countclim-1901soc"),
+    'hist': Path("F:/fyp/countclim-histsoc"),
+    'obs': Path("F:/fyp/obsclim-histsoc"),
+}
+
+# 归因定义: 驱动因子 -> (情景 A, 情景 B)，Delta = A - B
+attribution_drivers = {
+    'HA': ('hist', '1901'),  # 人类活动
+    'CC': ('obs', 'hist'),   # 气候变化
+}
+
+# 阈值 (与 'calculate_frequency.py' 相同)
+thresholds = list(DEFAULT_THRESHOLDS)
+
+# 百分位阈值 (Drought_Q10 等) 的参考情景和参考期 (与 'calculate_frequency.py' 相同，
+# 因此时间窗口的计数与频率文件使用同一组逐网格切点)
+PERCENTILE_REFERENCE_DIR = Path("E:/dissertation/countclim-1901soc")
+PERCENTILE_REFERENCE_PERIOD = None  # 例如 ("1981-01-01", "2010-12-31")；None 为整个时段
+
+# 时间窗口:
+# 子时段 (含两端的年份)，例如大坝建设前后
+PERIODS = {
+    'pre_1997': (1980, 1996),
+    'post_1997': (1997, 2014),
+}
+# 季节 (整个时段内)
+SEASONS = dict(DEFAULT_SEASONS)
+# 滑动窗口 (年数，步长)；None 为不使用
+SLIDING_YEARS = 10
+SLIDING_STEP = 1
+
+# Shapefile (中国掩膜) 和输出目录
+shapefile_path = scenario_dirs['1901'] / "1query_shape_copy.shp"
+output_dir = Path("E:/dissertation/ATTRIBUTION_RESULTS")
+
+# 每次从内存映射立方体中读取的网格数
+CHUNK_GRIDS = 1000
+
+# 由 'run_pipeline.py' 启动时，用配置文件中的设置覆盖上面的默认值
+overrides = stage_overrides()
+if overrides:
+    scenario_dirs = {name: Path(d) for name, d in overrides['scenario_dirs'].items()}
+    attribution_drivers = {driver: tuple(pair) for driver, pair in overrides['drivers'].items()}
+    thresholds = overrides.get('thresholds', thresholds)
+    PERCENTILE_REFERENCE_DIR = Path(overrides.get('percentile_reference_dir', PERCENTILE_REFERENCE_DIR))
+    PERCENTILE_REFERENCE_PERIOD = overrides.get('percentile_reference_period', PERCENTILE_REFERENCE_PERIOD)
+    PERIODS = {name: tuple(span) for name, span in overrides.get('periods', PERIODS).items()}
+    SEASONS = {name: tuple(months) for name, months in overrides.get('seasons', SEASONS).items()}
+    SLIDING_YEARS = overrides.get('sliding_years', SLIDING_YEARS)
+    SLIDING_STEP = overrides.get('sliding_step', SLIDING_STEP)
+    shapefile_path = Path(overrides['shapefile'])
+    output_dir = Path(overrides['output_dir'])
+
+# 输出: [grid, window, threshold] 数组 + 窗口表 + 中国区域汇总
+window_dir = output_dir / "WINDOW_ATTRIBUTION"
+window_dir.mkdir(exist_ok=True, parents=True)
+summary_file = output_dir / "FINAL_WINDOW_ATTRIBUTION_CHINA_ONLY.csv"
+
+metrics = MetricsLog(output_dir / METRICS_FILE_NAME)
+timer = metrics.start("windows.total")
+
+print("--- ------------------------------------------ ---")
+print("--- 正在计算时间窗口归因 (子时段 / 季节 / 滑动窗口) ---")
+print("--- ------------------------------------------ ---")
+
+# -----------------------------------------------------------------
+# 2. 打开各情景的立方体，对齐网格和月份
+# -----------------------------------------------------------------
+used = [name for name in scenario_dirs if any(name in pair for pair in attribution_drivers.values())]
+try:
+    cubes = {name: open_cube(scenario_dirs[name] / STORE_DIR_NAME) for name in used}
+except Exception as e:
+    print(f"!! 严重错误: 无法打开均值立方体: {e}")
+    exit(1)
+
+dates = cubes[used[0]].dates
+for name, cube in cubes.items():
+    if not np.array_equal(cube.dates, dates):
+        print(f"!! 严重错误: 情景 {name} 的月份与 {used[0]} 不一致")
+        exit(1)
+
+# 只保留所有情景都有的网格 (与 run_final_attribution.py 的 how='inner' 相同)
+grid_ids = cubes[used[0]].grid_ids
+for cube in cubes.values():
+    grid_ids = np.intersect1d(grid_ids, cube.grid_ids)
+grid = cubes[used[0]].select(grid_ids).grid
+print(f"{len(used)} 个情景，{len(grid_ids)} 个共同网格，{len(dates)} 个月。")
+
+windows = build_windows(dates, PERIODS, SEASONS, SLIDING_YEARS, SLIDING_STEP)
+print(f"共 {len(windows)} 个时间窗口 (整个时段 1 + 子时段 {len(PERIODS)} + 季节 {len(SEASONS)} + "
+      f"滑动 {int((windows['Kind'] == 'sliding').sum())})。")
+
+# 百分位阈值: 由参考情景逐网格计算一次
+threshold_table = None
+if percentile_names(thresholds):
+    try:
+        with timer.phase('percentiles'):
+            threshold_table = percentile_thresholds(open_cube(PERCENTILE_REFERENCE_DIR / STORE_DIR_NAME), thresholds,
+                                                    reference=PERCENTILE_REFERENCE_PERIOD, chunk_grids=CHUNK_GRIDS)
+    except Exception as e:
+        print(f"!! 严重错误: 无法由参考情景 {PERCENTILE_REFERENCE_DIR} 计算百分位阈值: {e}")
+        exit(1)
+
+# -----------------------------------------------------------------
+# 3. 逐块计数: 每个情景 [grid, window, threshold]，直接写入内存映射数组
+# -----------------------------------------------------------------
+shape = (len(grid_ids), len(windows), len(thresholds))
+counts_out = {name: np.lib.format.open_memmap(window_dir / f"counts_{name}.npy", mode='w+', dtype=np.int32,
+                                              shape=shape) for name in used}
+delta_out = {d: np.lib.format.open_memmap(window_dir / f"delta_{d}.npy", mode='w+', dtype=np.int32, shape=shape)
+             for d in attribution_drivers}
+
+for start in range(0, len(grid_ids), CHUNK_GRIDS):
+    ids = grid_ids[start:start + CHUNK_GRIDS]
+    print(f"  -- 正在处理网格: {start + 1} - {start + len(ids)} --")
+    cutoffs = grid_cutoffs(threshold_table, thresholds, ids) if threshold_table is not None else None
+
+    with timer.phase('count'):
+        counts = {name: window_counts(cube.align(ids), dates, thresholds, windows, SEASONS, cutoffs)
+                  for name, cube in cubes.items()}
+    with timer.phase('attribution'):
+        deltas = window_deltas(counts, attribution_drivers)
+    for name in used:
+        counts_out[name][start:start + len(ids)] = counts[name]
+    for d in attribution_drivers:
+        delta_out[d][start:start + len(ids)] = deltas[d]
+    timer.add(rows=len(ids) * len(dates) * len(used))
+
+for arr in list(counts_out.values()) + list(delta_out.values()):
+    arr.flush()
+
+np.save(window_dir / "grid.npy", np.asarray(grid, dtype=GRID_DTYPE))
+windows.drop(columns=['start', 'end']).to_csv(window_dir / "windows.csv", index=False)
+(window_dir / "meta.json").write_text(json.dumps({
+    'axes': ['grid', 'window', 'threshold'], 'thresholds': thresholds, 'scenarios': used,
+    'drivers': {d: list(pair) for d, pair in attribution_drivers.items()},
+}, ensure_ascii=False, indent=2), encoding='utf-8')
+print(f"[grid, window, threshold] 数组已保存到: {window_dir}")
+
+# -----------------------------------------------------------------
+# 4. 中国区域汇总 (使用缓存的中国掩膜)
+# -----------------------------------------------------------------
+try:
+    with timer.phase('spatial_join'):
+        grid_frame = pd.DataFrame({'Grid_ID': grid['Grid_ID'], 'Lon': grid['Lon'], 'Lat': grid['Lat']})
+        china_mask = load_mask(grid_frame, shapefile_path)
+        inside = np.isin(grid_ids, china_mask.loc[china_mask['Inside'], 'Grid_ID'].to_numpy())
+except Exception as e:
+    print(f"!! 严重错误: 中国掩膜筛选失败: {e}")
+    exit(1)
+
+with timer.phase('summary'):
+    summary = window_summary(delta_out, windows, thresholds, inside)
+with timer.phase('write_csv'):
+    summary.to_csv(summary_file, index=False)
+timer.add(bytes_written=file_bytes([summary_file] + [window_dir / f"delta_{d}.npy" for d in attribution_drivers]
+                                   + [window_dir / f"counts_{name}.npy" for name in used]))
+print(f"中国区域 ({int(inside.sum())} 个网格) 的时间窗口归因已保存到: {summary_file}")
+
+# 子时段和季节的对比 (控制台)
+print("\n--- 子时段 / 季节的中国区域总和 ---")
+for d in attribution_drivers:
+    for name in thresholds:
+        rows = summary[(summary['Driver'] == d) & (summary['Indicator'] == name) & (summary['Kind'] != 'sliding')]
+        text = ", ".join(f"{r.Window}: {r.Total_Delta}" for r in rows.itertuples())
+        print(f"  Delta_{d}_{name}  {text}")
+
+# 滑动窗口曲线 (每个驱动因子一条线，每个阈值一个图层)
+sliding = summary[summary['Kind'] == 'sliding']
+if len(sliding):
+    import plotly.express as px  # 只有绘图时才需要
+    fig = px.line(sliding, x='Start_Year', y='Total_Delta', color='Driver', facet_col='Indicator', facet_col_wrap=2,
+                  markers=True, title=f"中国区域 {SLIDING_YEARS} 年滑动窗口的归因 (窗口起始年)",
+                  labels={'Total_Delta': '频率变化 (次数)'})
+    fig.add_hline(y=0, line_dash="dash", line_color="grey")
+    fig.update_layout(template='plotly_white')
+    sliding_file = output_dir / "FINAL_WINDOW_ATTRIBUTION_SLIDING_CHINA_ONLY.html"
+    with timer.phase('write_html'):
+        fig.write_html(sliding_file)
+    timer.add(bytes_written=file_bytes([sliding_file]))
+    print(f"滑动窗口曲线已保存到: {sliding_file}")
+
+metrics.finish(timer)
+print(f"运行指标已追加到: {metrics.path}")
+print("====================================================")
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------
+# 【归因引擎】: 多情景按 Grid_ID 对齐为数组，再做向量化差值
+#
+# 每个情景文件 (FREQUENCY_STATS 或 RATIO_STATS) 只读取一次，
+# 对齐到共同的 Grid_ID 索引，得到 [scenario, grid, indicator] 数组。
+# 归因 (Delta) 由 “驱动因子 -> (情景 A, 情景 B)” 定义:
+#   Delta_HA = hist - 1901   (人类活动)
+#   Delta_CC = obs  - hist   (气候变化)
+#   RR_*     = A / B         (风险比)
+# 增加情景 (例如 ISIMIP3b SSP) 只需要在字典中增加一项。
+#
+# 逐模型归因: 指标轴展开为 [indicator, model]，一次差值得到每个模型的 Delta，
+# 再沿模型轴求多模型平均 (MMM) 和与其同号的模型比例 (Agreement)。
+# -----------------------------------------------------------------
+
+DEFAULT_DRIVERS = {
+    'HA': ('hist', '1901'),  # 人类活动
+    'CC': ('obs', 'hist'),   # 气候变化
+}
+
+
+class ScenarioStack:
+    """
+    grid:      Grid_ID / Lon / Lat (按 Grid_ID 排序)
+    values:    [scenario, grid, indicator] float64，缺失为 NaN
+    scenarios: 情景名称 (顺序与 values 第 0 维一致)
+    indicators: 指标输出名称 (顺序与 values 第 2 维一致)
+    """
+
+    def __init__(self, grid, values, scenarios, indicators):
+        self.grid = grid
+        self.values = values
+        self.scenarios = list(scenarios)
+        self.indicators = list(indicators)
+
+    def get(self, scenario):
+        return self.values[self.scenarios.index(scenario)]
+
+    def frame(self):
+        """Grid_ID, Lon, Lat, <指标>_<情景>, ... (与旧的 add_suffix 合并结果列名一致)"""
+        columns = {}
+        for s, name in enumerate(self.scenarios):
+            for k, ind in enumerate(self.indicators):
+                columns[f"{ind}_{name}"] = self.values[s, :, k]
+        return pd.concat([self.grid.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+
+def _normalize_indicators(indicators):
+    """列表 -> {源列名: 输出名} (列表时两者相同)。"""
+    if isinstance(indicators, dict):
+        return dict(indicators)
+    return {col: col for col in indicators}
+
+
+def load_scenarios(paths, indicators, coord_scenario=None, how='inner', posinf=None):
+    """
+    paths:      {情景名: CSV 路径}
+    indicators: 要读取的列 (列表)，或 {源列名: 输出名}
+    coord_scenario: 提供 Lon/Lat 的情景 (默认为第一个)
+    how:        'inner' = 只保留所有情景都有的网格；
+                'left'  = 保留 coord_scenario 的全部网格，其他情景缺失为 NaN
+    posinf:     不为 None 时，将 +inf 替换为该值 (例如比率中的 Inf)
+    """
+    indicators = _normalize_indicators(indicators)
+    names = list(paths)
+    coord_scenario = coord_scenario or names[0]
+
+    usecols = ['Grid_ID', 'Lon', 'Lat'] + list(indicators)
+    frames = {}
+    for name in names:
+        df = pd.read_csv(paths[name], usecols=lambda c: c in usecols)
+        frames[name] = df.drop_duplicates('Grid_ID').sort_values('Grid_ID')
+
+    if how == 'inner':
+        grid_ids = frames[names[0]]['Grid_ID'].to_numpy()
+        for name in names[1:]:
+            grid_ids = np.intersect1d(grid_ids, frames[name]['Grid_ID'].to_numpy())
+    elif how == 'left':
+        grid_ids = frames[coord_scenario]['Grid_ID'].to_numpy()
+    else:
+        raise ValueError(f"不支持的对齐方式: {how}")
+
+    coords = frames[coord_scenario].set_index('Grid_ID').reindex(grid_ids)
+    grid = pd.DataFrame({
+        'Grid_ID': grid_ids,
+        'Lon': coords['Lon'].to_numpy(),
+        'Lat': coords['Lat'].to_numpy(),
+    })
+
+    values = np.full((len(names), len(grid_ids), len(indicators)), np.nan)
+    for s, name in enumerate(names):
+        df = frames[name]
+        ids = df['Grid_ID'].to_numpy()
+        pos = np.searchsorted(ids, grid_ids).clip(0, max(len(ids) - 1, 0))
+        found = ids[pos] == grid_ids if len(ids) else np.zeros(len(grid_ids), dtype=bool)
+        for k, col in enumerate(indicators):
+            if col in df.columns:
+                values[s, found, k] = df[col].to_numpy(dtype=np.float64)[pos[found]]
+
+    if posinf is not None:
+        values[np.isposinf(values)] = posinf
+
+    return ScenarioStack(grid, values, names, indicators.values())
+
+
+def attribute(stack, drivers=DEFAULT_DRIVERS, risk_ratio=False):
+    """
+    返回 {列名: [grid] 数组}，列顺序为:
+    每个指标依次 Delta_<驱动>_<指标> (所有驱动)，然后 (可选) RR_<驱动>_<指标>。
+    """
+    out = {}
+    deltas = {d: stack.get(a) - stack.get(b) for d, (a, b) in drivers.items()}
+    for k, ind in enumerate(stack.indicators):
+        for d in drivers:
+            out[f"Delta_{d}_{ind}"] = deltas[d][:, k]
+
+    if risk_ratio:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratios = {d: stack.get(a) / stack.get(b) for d, (a, b) in drivers.items()}
+        for k, ind in enumerate(stack.indicators):
+            for d in drivers:
+                out[f"RR_{d}_{ind}"] = ratios[d][:, k]
+    return out
+
+
+def _restore_counts(df, columns):
+    """
+    指定的次数列 (频率次数及其差值) 全部为整数时恢复为整数类型，输出 CSV 与原来一致。
+    只处理已知的次数列: 比率、均值等列即使碰巧全为整数也保持浮点。
+    """
+    for col in columns:
+        v = df[col].to_numpy()
+        if v.dtype.kind == 'f' and np.isfinite(v).all() and np.array_equal(v, np.round(v)):
+            df[col] = v.astype(np.int64)
+    return df
+
+
+def count_columns(stack, drivers, count_indicators):
+    """count_indicators 中的指标在各情景中的列及其 Delta_* 列。"""
+    count_indicators = [ind for ind in stack.indicators if ind in set(count_indicators)]
+    return ([f"{ind}_{name}" for name in stack.scenarios for ind in count_indicators]
+            + [f"Delta_{d}_{ind}" for ind in count_indicators for d in drivers])
+
+
+def attribution_frame(stack, drivers=DEFAULT_DRIVERS, risk_ratio=False, count_indicators=()):
+    """
+    Grid_ID / Lon / Lat + 各情景指标 + Delta_* (+ RR_*) 的完整表。
+    count_indicators: 属于次数的指标 (例如频率阈值列)，这些列及其 Delta_* 恢复为整数。
+    """
+    df = pd.concat([stack.frame(), pd.DataFrame(attribute(stack, drivers, risk_ratio))], axis=1)
+    return _restore_counts(df, count_columns(stack, drivers, count_indicators))
+
+
+def risk_ratio_frame(stack, drivers=DEFAULT_DRIVERS):
+    """Grid_ID / Lon / Lat + RR_* (基准情景次数为 0 时为 inf / NaN，所以与归因主表分开保存)。"""
+    ratios = {col: v for col, v in attribute(stack, drivers, risk_ratio=True).items() if col.startswith("RR_")}
+    return pd.concat([stack.grid.reset_index(drop=True), pd.DataFrame(ratios)], axis=1)
+
+
+def model_agreement(stack, drivers, indicators, models):
+    """
+    stack: load_scenarios 读取的逐模型频率，指标顺序为 [指标1_模型1, 指标1_模型2, ..., 指标2_模型1, ...]。
+    返回 {列名: [grid] 数组}，每个驱动因子和指标依次为:
+      Delta_<驱动>_<指标>_<模型>  (每个模型)
+      Delta_<驱动>_<指标>_MMM     (多模型平均的 Delta)
+      Agreement_<驱动>_<指标>     (Delta 与 MMM 同号的模型比例，只计有数据的模型)
+    """
+    n_ind, n_model = len(indicators), len(models)
+    out = {}
+    for d, (a, b) in drivers.items():
+        delta = (stack.get(a) - stack.get(b)).reshape(-1, n_ind, n_model)
+        valid = ~np.isnan(delta)
+        n_valid = valid.sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mmm = np.where(valid, delta, 0).sum(axis=2) / n_valid
+            agree = (valid & (np.sign(delta) == np.sign(mmm)[..., None])).sum(axis=2) / n_valid
+        for k, ind in enumerate(indicators):
+            for m, model in enumerate(models):
+                out[f"Delta_{d}_{ind}_{model}"] = delta[:, k, m]
+            out[f"Delta_{d}_{ind}_MMM"] = mmm[:, k]
+            out[f"Agreement_{d}_{ind}"] = agree[:, k]
+    return out
+
+
+def model_agreement_frame(stack, drivers, indicators, models):
+    """Grid_ID / Lon / Lat + 逐模型 Delta、MMM 和 Agreement 的完整表。"""
+    agreement = model_agreement(stack, drivers, indicators, models)
+    df = pd.concat([stack.grid.reset_index(drop=True), pd.DataFrame(agreement)], axis=1)
+    # 只有逐模型的 Delta 是次数之差；MMM 和 Agreement 保持浮点
+    return _restore_counts(df, [f"Delta_{d}_{ind}_{model}" for d in drivers for ind in indicators for model in models])
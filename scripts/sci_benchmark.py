@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------
+# 【基准测试汇总】: 由 PIPELINE_METRICS.jsonl 的记录得到各阶段耗时
+#
+# 阶段 (与流水线对应，但把掩膜和绘图单独列出):
+#   means        calculate_means.py (所有情景合计，含合并立方体)
+#   frequency    calculate_frequency.py (所有情景合计)
+#   attribution  run_final_attribution.py，不含掩膜和写 HTML
+#   mask         归因中的空间筛选 (第一次运行，无掩膜缓存)
+#   plotting     地图脚本 + 归因中写剖面图 HTML
+# 墙钟时间和 CPU 时间都按步骤 (phases / phases_cpu) 从归因中拆出掩膜和写 HTML。
+# 峰值内存是进程的最高水位，不能按步骤拆分，所以报告的是运行该行各步骤的进程的峰值
+# (Process_Peak_RSS_MB)，例如 mask 行就是归因进程的峰值。
+# 扩展性: 各阶段耗时对网格数的 log-log 斜率 (1 = 线性)。
+# 退化: 与历史结果中同一网格数、同一阶段的上一次运行相比的耗时比值。
+# -----------------------------------------------------------------
+
+BENCH_STAGES = ["means", "frequency", "attribution", "mask", "plotting"]
+
+
+def _phase(record, name, key='phases'):
+    """一个步骤的墙钟时间 (key='phases') 或 CPU 时间 (key='phases_cpu')；旧记录没有 CPU 时间时为 NaN。"""
+    if key not in record:
+        return np.nan
+    return record[key].get(name, 0.0)
+
+
+def stage_times(records):
+    """
+    records: 同一次运行 (同一 run_id) 的指标记录。
+    返回 DataFrame: Stage, Wall_s, CPU_s, Process_Peak_RSS_MB
+    (attribution 的墙钟和 CPU 时间都不含掩膜和写 HTML 两个步骤，二者分别计入 mask / plotting；
+     峰值内存不能按步骤拆分，为运行这些步骤的进程的峰值)
+    """
+    by_stage = {}
+    for r in records:
+        by_stage.setdefault(r['stage'], []).append(r)
+
+    def total(stage, key='wall_s'):
+        return sum(r[key] or 0.0 for r in by_stage.get(stage, []))
+
+    def peak(*stages):
+        values = [r['peak_rss_mb'] for s in stages for r in by_stage.get(s, []) if r['peak_rss_mb'] is not None]
+        return max(values) if values else np.nan
+
+    attribution = by_stage.get('attribution.total', [])
+    mask = sum(_phase(r, 'spatial_join') for r in attribution)
+    profile_html = sum(_phase(r, 'write_html') for r in attribution)
+    mask_cpu = sum(_phase(r, 'spatial_join', 'phases_cpu') for r in attribution)
+    profile_html_cpu = sum(_phase(r, 'write_html', 'phases_cpu') for r in attribution)
+
+    rows = [
+        ("means", total('means.total') + total('means.consolidate'),
+         total('means.batch', 'cpu_s') + total('means.batch_shared', 'cpu_s') + total('means.batch_fused', 'cpu_s')
+         + total('means.total', 'cpu_s') + total('means.consolidate', 'cpu_s'),
+         peak('means.batch', 'means.batch_shared', 'means.batch_fused', 'means.total')),
+        ("frequency", total('frequency.total'), total('frequency.total', 'cpu_s'), peak('frequency.total')),
+        ("attribution", total('attribution.total') - mask - profile_html,
+         total('attribution.total', 'cpu_s') - mask_cpu - profile_html_cpu, peak('attribution.total')),
+        ("mask", mask, mask_cpu, peak('attribution.total')),
+        ("plotting", total('maps.total') + profile_html, total('maps.total', 'cpu_s') + profile_html_cpu,
+         peak('maps.total', 'attribution.total') if profile_html else peak('maps.total')),
+    ]
+    return pd.DataFrame(rows, columns=['Stage', 'Wall_s', 'CPU_s', 'Process_Peak_RSS_MB']).round(4)
+
+
+def scaling_exponents(results):
+    """
+    results: 含 N_Grids, Stage, Wall_s 的表 (同一次基准测试的多个网格数)。
+    返回 {阶段: log-log 斜率}；网格数少于 2 个时为 NaN。
+    """
+    exponents = {}
+    for stage, group in results.groupby('Stage', sort=False):
+        group = group[group['Wall_s'] > 0]
+        if group['N_Grids'].nunique() < 2:
+            exponents[stage] = np.nan
+            continue
+        slope, _ = np.polyfit(np.log(group['N_Grids']), np.log(group['Wall_s']), 1)
+        exponents[stage] = float(slope)
+    return exponents
+
+
+def compare_previous(results, history):
+    """
+    在 results 中加入 Vs_Previous: 本次耗时 / 历史中同一网格数、同一阶段最近一次的耗时。
+    history 为空时全部为 NaN。
+    """
+    results = results.copy()
+    results['Vs_Previous'] = np.nan
+    if history is None or history.empty:
+        return results
+    previous = history.drop_duplicates(['N_Grids', 'Stage'], keep='last').set_index(['N_Grids', 'Stage'])['Wall_s']
+    keys = pd.MultiIndex.from_frame(results[['N_Grids', 'Stage']])
+    results['Vs_Previous'] = results['Wall_s'].to_numpy() / previous.reindex(keys).to_numpy()
+    return results
+
+
+def scaling_figure(results, title="各阶段耗时随网格数的变化"):
+    """log-log 扩展性曲线: 每个阶段一条线。"""
+    import plotly.express as px  # 只有绘图时才需要
+
+    fig = px.line(results, x='N_Grids', y='Wall_s', color='Stage', markers=True, log_x=True, log_y=True,
+                  title=title, labels={'N_Grids': '网格数', 'Wall_s': '墙钟时间 (秒)'})
+    fig.update_layout(template='plotly_white')
+    return fig
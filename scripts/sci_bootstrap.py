@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from sci_frequency import exceedance_mask
+from sci_store import open_cube
+
+# -----------------------------------------------------------------
+# 【块自助法 (block bootstrap) 显著性检验】: Delta_HA / Delta_CC
+#
+# 1. 每个网格、每个阈值先按年份求和，得到 [grid, year, threshold] 年计数。
+# 2. 所有网格、所有情景共用同一组重抽样年份 (移动块自助法，
+#    块长 block_years 年)，每次重抽样表示为一列 “年份被抽中的次数”，
+#    于是 B 次重抽样的总次数就是一次矩阵乘法: [grid, year] @ [year, B]。
+# 3. 情景之间共用重抽样年份 (配对)，直接得到 Delta 的自助分布，
+#    再取百分位置信区间和双侧 p 值。
+# 百分位阈值 (Drought_Q10 等) 使用与频率计数相同的逐网格切点。
+# -----------------------------------------------------------------
+
+SIGNIFICANCE_FILE_NAME = "FINAL_ATTRIBUTION_SIGNIFICANCE_CHINA_ONLY.csv"
+
+
+def year_segments(dates):
+    """返回 (每段的起始列号, 年份)。dates 必须按时间排序。"""
+    years = np.array([int(str(d)[:4]) for d in dates])
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    return starts, years[starts]
+
+
+def yearly_counts(values, dates, threshold_names, grid_cutoffs=None):
+    """[grid, month] -> [grid, year, threshold] 的年超过次数 (按年分段求和)。"""
+    starts, _ = year_segments(dates)
+    mask = exceedance_mask(values, threshold_names, grid_cutoffs)
+    return np.add.reduceat(mask.astype(np.int32), starts, axis=1)
+
+
+def block_weights(n_years, n_boot, block_years, seed=None):
+    """
+    移动块自助法: 每次重抽样随机选取若干个长度为 block_years 的连续年份块，
+    直到凑满 n_years 年。返回 [year, B] 的抽中次数矩阵 (所有网格共用)。
+    """
+    rng = np.random.default_rng(seed)
+    block_years = max(1, min(block_years, n_years))
+    n_blocks = -(-n_years // block_years)  # 向上取整
+
+    starts = rng.integers(0, n_years - block_years + 1, size=(n_boot, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_years)).reshape(n_boot, -1)[:, :n_years]
+
+    weights = np.zeros((n_years, n_boot), dtype=np.float32)
+    np.add.at(weights, (idx, np.arange(n_boot)[:, None]), 1)
+    return weights
+
+
+def bootstrap_chunk(task):
+    """
+    一个网格块的自助检验 (可在工人进程中运行)。
+    task: dict(store_dirs, grid_ids, thresholds, drivers, weights, alpha, grid_cutoffs)
+    返回 {列名: [grid] 数组}。
+    """
+    grid_ids = task['grid_ids']
+    thresholds = task['thresholds']
+    weights = task['weights']
+    alpha = task['alpha']
+
+    boot = {}
+    for scen, store_dir in task['store_dirs'].items():
+        cube = open_cube(store_dir)
+        values = cube.align(grid_ids)
+        yearly = yearly_counts(values, cube.dates, thresholds, task.get('grid_cutoffs'))
+        if yearly.shape[1] != weights.shape[0]:
+            raise ValueError(f"情景 {scen} 的年数 ({yearly.shape[1]}) 与重抽样矩阵不一致")
+        # [grid, year, k] x [year, B] -> [grid, k, B]
+        boot[scen] = np.einsum('gyk,yb->gkb', yearly.astype(np.float32), weights)
+        # 没有数据的网格
+        missing = np.isnan(values).all(axis=1)
+        boot[scen][missing] = np.nan
+
+    out = {}
+    for driver, (a, b) in task['drivers'].items():
+        delta = boot[a] - boot[b]  # [grid, k, B]
+        low, high = np.percentile(delta, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=2)
+        p = np.minimum(1.0, 2 * np.minimum((delta <= 0).mean(axis=2), (delta >= 0).mean(axis=2)))
+        p[np.isnan(delta).any(axis=2)] = np.nan
+        for k, thresh in enumerate(thresholds):
+            out[f"CI_Low_{driver}_{thresh}"] = low[:, k]
+            out[f"CI_High_{driver}_{thresh}"] = high[:, k]
+            out[f"P_{driver}_{thresh}"] = p[:, k]
+    return out
+
+
+def make_tasks(store_dirs, grid_ids, thresholds, drivers, weights, alpha=0.05, chunk_grids=500, grid_cutoffs=None):
+    """grid_cutoffs: 与 grid_ids 对齐的 [grid, threshold] 切点 (只有百分位阈值时需要)。"""
+    grid_ids = np.asarray(grid_ids)
+    return [
+        dict(store_dirs=store_dirs, grid_ids=grid_ids[i:i + chunk_grids], thresholds=thresholds,
+             drivers=drivers, weights=weights, alpha=alpha,
+             grid_cutoffs=None if grid_cutoffs is None else grid_cutoffs[i:i + chunk_grids])
+        for i in range(0, len(grid_ids), chunk_grids)
+    ]
+
+
+def insert_next_to_deltas(df, significance, drivers, thresholds):
+    """把 CI_Low / CI_High / P 列插入到对应的 Delta_<驱动>_<阈值> 列之后。"""
+    df = df.drop(columns=[c for c in significance.columns if c in df.columns])
+    columns = []
+    for col in df.columns:
+        columns.append(col)
+        for driver in drivers:
+            for thresh in thresholds:
+                if col == f"Delta_{driver}_{thresh}":
+                    columns += [f"CI_Low_{driver}_{thresh}", f"CI_High_{driver}_{thresh}", f"P_{driver}_{thresh}"]
+    merged = pd.concat([df.reset_index(drop=True), significance.reset_index(drop=True)], axis=1)
+    return merged[columns]
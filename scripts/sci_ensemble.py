@@ -0,0 +1,104 @@
+import numpy as np
+from pathlib import Path
+
+from sci_store import SciCube, GRID_DTYPE, VALUE_DTYPE, long_to_cube
+
+# -----------------------------------------------------------------
+# 【多模型集合 (MME) 归约】
+#
+# 每个模型先转换为 [grid, month] 立方体，再对齐到共同的
+# Grid_ID / 月份索引，堆叠成 [model, grid, month] 数组，
+# 沿模型轴一次性计算均值以及离散度指标:
+#   Mean_SCI        集合均值 (忽略 NaN，与原来的 groupby mean 一致)
+#   Std_SCI         模型间标准差 (ddof=1)
+#   Min_SCI/Max_SCI 模型最小值 / 最大值
+#   N_Models        有数据的模型数
+#   Sign_Agreement  与集合均值同号的模型比例 (用于稳健性掩膜)
+# 需要时，对齐后的各模型立方体也一并返回 (逐模型计数和归因用)，
+# 保存在 MEANS_STORE/models/<模型名>/ 中，格式与均值立方体相同。
+# -----------------------------------------------------------------
+
+SPREAD_FIELDS = ['Std_SCI', 'Min_SCI', 'Max_SCI', 'N_Models', 'Sign_Agreement']
+MODEL_DIR_NAME = "models"
+
+
+def model_store_dirs(store_dir, model_names):
+    """{模型名: 该模型立方体的存储目录}"""
+    return {name: Path(store_dir) / MODEL_DIR_NAME / name for name in model_names}
+
+
+def stack_models(model_frames, value_col='SCI'):
+    """
+    model_frames: 每个模型一个长格式 DataFrame (Grid_ID, Lon, Lat, Date, SCI)。
+    返回 (grid, dates, stack)，stack 为 [model, grid, month] float32，缺失填 NaN。
+    """
+    cubes = [long_to_cube(df, value_col=value_col) for df in model_frames]
+
+    grid_ids = np.unique(np.concatenate([c.grid_ids for c in cubes]))
+    dates = np.unique(np.concatenate([c.dates for c in cubes]))
+
+    grid = np.zeros(len(grid_ids), dtype=GRID_DTYPE)
+    grid['Grid_ID'] = grid_ids
+    has_coords = np.zeros(len(grid_ids), dtype=bool)
+
+    stack = np.full((len(cubes), len(grid_ids), len(dates)), np.nan, dtype=VALUE_DTYPE)
+    for k, c in enumerate(cubes):
+        gi = np.searchsorted(grid_ids, c.grid_ids)
+        di = np.searchsorted(dates, c.dates)
+        stack[k][np.ix_(gi, di)] = c.values
+
+        # 坐标取第一个包含该网格的模型
+        new = ~has_coords[gi]
+        grid['Lon'][gi[new]] = c.lon[new]
+        grid['Lat'][gi[new]] = c.lat[new]
+        has_coords[gi] = True
+
+    return grid, dates, stack
+
+
+def reduce_ensemble(stack):
+    """
+    沿模型轴 (axis 0) 归约，返回 {字段名: [grid, month] 数组}。
+    某个 (grid, month) 没有任何模型数据时，所有统计量为 NaN (N_Models 为 0)。
+    """
+    valid = ~np.isnan(stack)
+    count = valid.sum(axis=0)
+    x = np.where(valid, stack, 0).astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = x.sum(axis=0) / count
+        sq_dev = np.where(valid, (x - mean) ** 2, 0).sum(axis=0)
+        std = np.sqrt(sq_dev / (count - 1))
+        std[count < 2] = np.nan
+
+        agree = (valid & (np.sign(x) == np.sign(mean))).sum(axis=0)
+        sign_agreement = agree / count
+
+    empty = count == 0
+    vmin = np.where(valid, stack, np.inf).min(axis=0)
+    vmax = np.where(valid, stack, -np.inf).max(axis=0)
+    vmin[empty] = np.nan
+    vmax[empty] = np.nan
+
+    return {
+        'Mean_SCI': mean.astype(VALUE_DTYPE),
+        'Std_SCI': std.astype(VALUE_DTYPE),
+        'Min_SCI': vmin.astype(VALUE_DTYPE),
+        'Max_SCI': vmax.astype(VALUE_DTYPE),
+        'N_Models': count.astype(VALUE_DTYPE),
+        'Sign_Agreement': sign_agreement.astype(VALUE_DTYPE),
+    }
+
+
+def ensemble_cubes(model_frames, value_col='SCI', model_names=None):
+    """
+    对齐 + 归约，返回 {字段名: SciCube}，所有立方体共用同一 Grid_ID / 月份索引。
+    model_names (与 model_frames 一一对应) 不为 None 时，
+    结果中还有 'models': {模型名: SciCube} (对齐后的各模型立方体，不再重新读取)。
+    """
+    grid, dates, stack = stack_models(model_frames, value_col=value_col)
+    fields = reduce_ensemble(stack)
+    cubes = {name: SciCube(grid, dates, values) for name, values in fields.items()}
+    if model_names is not None:
+        cubes['models'] = {name: SciCube(grid, dates, stack[k]) for k, name in enumerate(model_names)}
+    return cubes
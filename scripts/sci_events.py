@@ -0,0 +1,97 @@
+import numpy as np
+
+from sci_frequency import threshold_arrays
+
+# -----------------------------------------------------------------
+# 【事件识别 (游程理论)】: 连续超过阈值的月份算作一次事件
+#
+# 对 [grid, threshold, month] 的超过掩膜在时间轴两端补 0 后做 diff，
+# +1 为事件开始，-1 为事件结束；np.nonzero 按 (网格, 阈值, 月份)
+# 的顺序返回，因此开始和结束一一对应，所有网格一次完成，不需要逐网格循环。
+#
+# 每个网格、每个阈值输出:
+#   Events_<阈值>    事件次数
+#   MeanDur_<阈值>   平均持续时间 (月)
+#   MaxDur_<阈值>    最长持续时间 (月)
+#   Severity_<阈值>  累计亏缺/盈余: 事件期间超出阈值部分之和 (|SCI - 阈值|)
+#   Peak_<阈值>      峰值强度: 事件期间 |SCI| 的最大值
+# 没有事件的网格，除 Events 外的指标均为 0 (便于直接做 Delta)。
+# -----------------------------------------------------------------
+
+EVENT_METRICS = ["Events", "MeanDur", "MaxDur", "Severity", "Peak"]
+
+
+def event_columns(threshold_names):
+    """输出列名 (先按指标，再按阈值)。"""
+    return [f"{metric}_{name}" for metric in EVENT_METRICS for name in threshold_names]
+
+
+def event_stats(values, threshold_names, grid_cutoffs=None):
+    """
+    values: [grid, month] SCI 数组 (NaN 不算超过阈值，会打断事件)。
+    grid_cutoffs: 百分位阈值的逐网格切点 [grid, threshold] (见 threshold_arrays)。
+    返回 {指标名: [grid, threshold] 数组}。
+    """
+    values = np.asarray(values, dtype=np.float32)
+    n_grid, n_month = values.shape
+    n_thresh = len(threshold_names)
+    n_rows = n_grid * n_thresh
+
+    cutoffs, is_flood = threshold_arrays(threshold_names, grid_cutoffs)
+    # [grid, threshold, month] -> [行 = grid * threshold, month]
+    v = values[:, None, :]
+    c = cutoffs[None, :, None] if cutoffs.ndim == 1 else cutoffs[:, :, None]
+    exceed = np.where(is_flood[None, :, None], v >= c, v <= c).reshape(n_rows, n_month)
+    v = np.broadcast_to(v, (n_grid, n_thresh, n_month)).reshape(n_rows, n_month)
+    c = np.broadcast_to(c, (n_grid, n_thresh, 1)).reshape(n_rows, 1)
+
+    # 事件边界: 两端补 0 后的差分
+    edges = np.diff(exceed.astype(np.int8), axis=1, prepend=0, append=0)
+    row, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)  # 与 start 一一对应 (end 不含)
+    duration = end - start
+
+    # 累计亏缺/盈余: 用前缀和一次取出每个事件的区间和
+    depart = np.where(exceed, np.abs(v - c), 0).astype(np.float64)
+    csum = np.zeros((n_rows, n_month + 1))
+    np.cumsum(depart, axis=1, out=csum[:, 1:])
+    severity = csum[row, end] - csum[row, start]
+
+    # 峰值强度: 展平后用 reduceat 取每个事件区间 [start, end) 的最大值
+    if len(row):
+        magnitude = np.append(np.where(exceed, np.abs(v), 0).reshape(-1), 0)
+        bounds = np.column_stack((row * n_month + start, row * n_month + end)).reshape(-1)
+        peak = np.maximum.reduceat(magnitude, bounds)[::2]
+    else:
+        peak = np.zeros(0)
+
+    # 按行汇总
+    events = np.bincount(row, minlength=n_rows)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_dur = np.where(events > 0, np.bincount(row, duration, n_rows) / events, 0.0)
+    max_dur = np.zeros(n_rows, dtype=np.int64)
+    np.maximum.at(max_dur, row, duration)
+    max_peak = np.zeros(n_rows)
+    np.maximum.at(max_peak, row, peak)
+
+    shape = (n_grid, n_thresh)
+    return {
+        "Events": events.reshape(shape),
+        "MeanDur": mean_dur.reshape(shape),
+        "MaxDur": max_dur.reshape(shape),
+        "Severity": np.bincount(row, severity, n_rows).reshape(shape),
+        "Peak": max_peak.reshape(shape),
+    }
+
+
+def event_frame(cube, threshold_names, grid_cutoffs=None):
+    """
+    对一个 SciCube 识别事件，返回与 *_FREQUENCY_STATS.csv 布局相同的 DataFrame:
+    Grid_ID, Lon, Lat, Events_<阈值>, ..., Peak_<阈值>
+    """
+    stats = event_stats(cube.values, threshold_names, grid_cutoffs)
+    frame = cube.grid_frame()
+    for metric in EVENT_METRICS:
+        for j, name in enumerate(threshold_names):
+            frame[f"{metric}_{name}"] = stats[metric][:, j]
+    return frame
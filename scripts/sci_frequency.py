@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------
+# 【频率计数内核】
+#
+# 阈值用名称描述，例如:
+#   "Drought_1.0" -> SCI <= -1.0
+#   "Flood_1.5"   -> SCI >=  1.5
+#   "Drought_Q10" -> SCI <= 该网格在参考情景中的第 10 百分位 (见 sci_threshold.py)
+#   "Flood_Q95"   -> SCI >= 该网格在参考情景中的第 95 百分位
+# 任意数量的阈值在一次向量化比较中同时计数，
+# 增加 "Drought_2.0" / "Flood_2.0" 只是多一列比较。
+# 百分位阈值是逐网格的 ([grid, threshold] 数组)，由调用方通过 grid_cutoffs 传入。
+# -----------------------------------------------------------------
+
+DROUGHT = "Drought"
+FLOOD = "Flood"
+
+DEFAULT_THRESHOLDS = ["Drought_1.0", "Drought_1.5", "Flood_1.0", "Flood_1.5"]
+
+
+def percentile_level(name):
+    """'Flood_Q95' -> 95.0；固定阈值 ('Flood_1.5') 返回 None。"""
+    _, _, level = name.partition('_')
+    if level[:1] in ('Q', 'q'):
+        return float(level[1:])
+    return None
+
+
+def threshold_name(kind, level):
+    """('Drought', 1.0) -> 'Drought_1.0'；与 DEFAULT_THRESHOLDS 写法相同，parse_threshold 可解析回来。"""
+    return f"{kind}_{round(abs(float(level)), 6)}"
+
+
+def parse_threshold(name):
+    """
+    'Drought_1.5' -> ('Drought', -1.5); 'Flood_1.0' -> ('Flood', 1.0)
+    百分位阈值 ('Flood_Q95') 没有固定的切点，返回 ('Flood', nan)。
+    """
+    kind, _, level = name.partition('_')
+    if kind not in (DROUGHT, FLOOD) or not level:
+        raise ValueError(f"无法识别的阈值名称: {name} (应为 Drought_X / Flood_X 或 Drought_QX / Flood_QX)")
+    q = percentile_level(name)
+    if q is not None:
+        if not 0 <= q <= 100:
+            raise ValueError(f"百分位必须在 0-100 之间: {name}")
+        return kind, np.nan
+    level = abs(float(level))
+    return kind, (-level if kind == DROUGHT else level)
+
+
+def threshold_arrays(threshold_names, grid_cutoffs=None):
+    """
+    返回 (cutoffs, is_flood)。
+    没有百分位阈值时 cutoffs 长度为阈值个数；
+    有百分位阈值时需要 grid_cutoffs ([grid, threshold]，百分位列为各网格的切点)，
+    返回的 cutoffs 为 [grid, threshold]。
+    """
+    parsed = [parse_threshold(name) for name in threshold_names]
+    cutoffs = np.array([cut for _, cut in parsed], dtype=np.float32)
+    is_flood = np.array([kind == FLOOD for kind, _ in parsed])
+
+    is_percentile = np.array([percentile_level(name) is not None for name in threshold_names])
+    if is_percentile.any():
+        if grid_cutoffs is None:
+            raise ValueError("百分位阈值 (Drought_QX / Flood_QX) 需要参考情景的逐网格阈值 (grid_cutoffs)")
+        cutoffs = np.where(is_percentile, np.asarray(grid_cutoffs, dtype=np.float32), cutoffs)
+    return cutoffs, is_flood
+
+
+def exceedance_mask(values, threshold_names, grid_cutoffs=None):
+    """
+    values: [grid, month] 数组。
+    返回 [grid, month, threshold] 布尔数组 (NaN 永远不算超过阈值)。
+    """
+    cutoffs, is_flood = threshold_arrays(threshold_names, grid_cutoffs)
+    if cutoffs.ndim == 2:
+        cutoffs = cutoffs[:, None, :]
+    v = np.asarray(values, dtype=np.float32)[..., None]
+    return np.where(is_flood, v >= cutoffs, v <= cutoffs)
+
+
+def count_exceedances(values, threshold_names, grid_cutoffs=None):
+    """一次遍历计算所有网格、所有阈值的超过次数，返回 [grid, threshold] 整数数组。"""
+    return exceedance_mask(values, threshold_names, grid_cutoffs).sum(axis=1)
+
+
+def frequency_frame(cube, threshold_names, grid_cutoffs=None):
+    """
+    对一个 SciCube 计数，返回与 *_FREQUENCY_STATS.csv 列兼容的 DataFrame:
+    Grid_ID, Lon, Lat, <阈值1>, <阈值2>, ...
+    grid_cutoffs: 百分位阈值的逐网格切点 [grid, threshold] (与 cube 的网格对齐)。
+    """
+    counts = count_exceedances(cube.values, threshold_names, grid_cutoffs)
+    stats = cube.grid_frame()
+    for j, name in enumerate(threshold_names):
+        stats[name] = counts[:, j]
+    return stats
+
+
+# -----------------------------------------------------------------
+# 逐模型计数: [model, grid, month] 一次计数，输出列为 <阈值>_<模型名>
+# -----------------------------------------------------------------
+def model_column(threshold_name, model):
+    """'Drought_1.0', 'h08' -> 'Drought_1.0_h08'"""
+    return f"{threshold_name}_{model}"
+
+
+def column_models(columns, threshold_names):
+    """从逐模型文件的列名中找出模型名 (保持顺序)。"""
+    models = []
+    for name in threshold_names:
+        for col in columns:
+            if col.startswith(f"{name}_"):
+                model = col[len(name) + 1:]
+                if model not in models:
+                    models.append(model)
+    return models
+
+
+def model_frequency_frame(cube, model_values, model_names, threshold_names, grid_cutoffs=None):
+    """
+    cube:         提供 Grid_ID / Lon / Lat 的 SciCube (例如集合均值的一块)。
+    model_values: [model, grid, month]，网格与 cube 对齐。
+    返回 Grid_ID, Lon, Lat, <阈值>_<模型>... ；某个模型没有数据的网格为 NaN。
+    所有模型合并为 [model * grid, month] 一次计数 (百分位切点对所有模型相同)。
+    """
+    model_values = np.asarray(model_values, dtype=np.float32)
+    n_model, n_grid, n_month = model_values.shape
+    if grid_cutoffs is not None:
+        grid_cutoffs = np.tile(grid_cutoffs, (n_model, 1))
+    counts = count_exceedances(model_values.reshape(n_model * n_grid, n_month), threshold_names, grid_cutoffs)
+    counts = counts.reshape(n_model, n_grid, len(threshold_names)).astype(np.float64)
+    counts[np.isnan(model_values).all(axis=2)] = np.nan
+
+    stats = cube.grid_frame()
+    columns = {model_column(name, model): counts[m, :, j]
+               for j, name in enumerate(threshold_names) for m, model in enumerate(model_names)}
+    return pd.concat([stats, pd.DataFrame(columns, index=stats.index)], axis=1)
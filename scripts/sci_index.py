@@ -0,0 +1,159 @@
+import numpy as np
+from scipy.special import ndtri, gammainc
+from scipy.stats import rankdata
+
+# -----------------------------------------------------------------
+# 【标准化径流指数 (SCI)】: 由 Qtot 直接计算
+#
+# 1. 累积尺度: SCI-k 先对 Qtot 做 k 个月的滑动求和 (前缀和一次完成)，
+#    前 k-1 个月为 NaN。
+# 2. 对每个网格、每个日历月分别拟合分布，只用参考期内的年份:
+#    "gringorten": 经验分布，p = (i - 0.44) / (n + 0.12)，相同的值取平均名次
+#                  (干旱网格常有多年为 0 的径流，相同径流必须得到相同的 SCI)
+#    "gamma":      零值 + 伽马混合分布，参数用 Thom (1958) 的
+#                  最大似然近似，所有网格一次数组运算求出
+# 3. SCI = Φ^-1(p)。所有网格在一次数组运算中完成，不需要逐网格循环。
+# -----------------------------------------------------------------
+
+SCI_METHODS = ("gringorten", "gamma")
+SCI_SCALES = (1, 3, 6, 12)
+
+# 伽马分布的概率裁剪到 (P_CLIP, 1 - P_CLIP)，避免出现 ±inf
+P_CLIP = 1e-6
+
+
+def calendar_months(dates):
+    """'1980-01-01' 形式的日期 -> 1..12 的月份数组。"""
+    return np.array([int(str(d)[5:7]) for d in dates])
+
+
+def reference_columns(dates, reference=None):
+    """reference = (起始日期, 结束日期) (含两端)；None 表示整个时段。返回布尔数组。"""
+    dates = np.asarray([str(d)[:10] for d in dates])
+    if reference is None:
+        return np.ones(len(dates), dtype=bool)
+    start, end = reference
+    return (dates >= str(start)[:10]) & (dates <= str(end)[:10])
+
+
+def accumulate(qtot, scale):
+    """[grid, month] 的 scale 个月滑动求和；窗口内有 NaN 或不满 scale 个月时为 NaN。"""
+    qtot = np.asarray(qtot, dtype=np.float64)
+    if scale == 1:
+        return qtot.copy()
+    n_grid, n_month = qtot.shape
+    missing = np.isnan(qtot)
+
+    csum = np.zeros((n_grid, n_month + 1))
+    np.cumsum(np.where(missing, 0.0, qtot), axis=1, out=csum[:, 1:])
+    cmiss = np.zeros((n_grid, n_month + 1), dtype=np.int64)
+    np.cumsum(missing, axis=1, out=cmiss[:, 1:])
+
+    out = np.full(qtot.shape, np.nan)
+    window_sum = csum[:, scale:] - csum[:, :-scale]
+    window_miss = cmiss[:, scale:] - cmiss[:, :-scale]
+    out[:, scale - 1:] = np.where(window_miss == 0, window_sum, np.nan)
+    return out
+
+
+def _gringorten(values):
+    """
+    values: [grid, n] (同一日历月的 n 年)。NaN 不参与排名，结果仍为 NaN。
+    返回 [grid, n] 的非超越概率。
+    """
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=1, keepdims=True)
+    # 有效值的名次为 1..n，相同的值取平均名次 (NaN 的名次为 NaN)
+    ranks = rankdata(values, method='average', axis=1, nan_policy='omit')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = (ranks - 0.44) / (n + 0.12)
+    return np.where(valid, p, np.nan)
+
+
+def _gringorten_reference(values, is_ref):
+    """
+    只用参考期 (is_ref 列) 排名。参考期内的值与 _gringorten 相同；
+    参考期外的值按 “插入参考样本后的名次” 计算，与参考值相同时取平均名次:
+    i = (#参考值 < x) + (#参考值 == x) / 2 + 1，n + 1 个样本。
+    """
+    p = np.full(values.shape, np.nan)
+    ref = values[:, is_ref]
+    p[:, is_ref] = _gringorten(ref)
+
+    other = values[:, ~is_ref]
+    if other.shape[1]:
+        n = (~np.isnan(ref)).sum(axis=1)[:, None]
+        below = (ref[:, None, :] < other[:, :, None]).sum(axis=2)  # NaN 比较为 False
+        equal = (ref[:, None, :] == other[:, :, None]).sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p_other = (below + 0.5 * equal + 1 - 0.44) / (n + 1 + 0.12)
+        p[:, ~is_ref] = np.where(np.isnan(other) | (n == 0), np.nan, p_other)
+    return p
+
+
+def fit_gamma(ref):
+    """
+    ref: [grid, n] 参考期样本。返回 (q0, alpha, beta)，每个都是 [grid]。
+    q0 为零值比例；正值部分用 Thom (1958) 近似估计伽马参数。
+    正值少于 2 个或全部相同的网格参数为 NaN。
+    """
+    valid = ~np.isnan(ref)
+    positive = valid & (ref > 0)
+    n = valid.sum(axis=1)
+    n_pos = positive.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        q0 = (n - n_pos) / n
+        mean = np.where(positive, ref, 0).sum(axis=1) / n_pos
+        mean_log = np.where(positive, np.log(np.where(positive, ref, 1)), 0).sum(axis=1) / n_pos
+        a = np.log(mean) - mean_log
+        alpha = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        beta = mean / alpha
+
+    bad = (n_pos < 2) | ~(a > 0) | ~np.isfinite(alpha)
+    alpha[bad] = np.nan
+    beta[bad] = np.nan
+    return q0, alpha, beta
+
+
+def _gamma_probability(values, is_ref):
+    """用参考期拟合零值 + 伽马混合分布，返回所有列的非超越概率。"""
+    q0, alpha, beta = fit_gamma(values[:, is_ref])
+    x = np.clip(values, 0, None) / beta[:, None]
+    with np.errstate(invalid='ignore'):
+        p = q0[:, None] + (1 - q0[:, None]) * gammainc(alpha[:, None], x)
+    p = np.clip(p, P_CLIP, 1 - P_CLIP)
+    return np.where(np.isnan(values), np.nan, p)
+
+
+def compute_sci(qtot, dates, scale=1, method="gringorten", reference=None):
+    """
+    qtot:      [grid, month] 径流数组；dates: 与列对应的日期 (按时间排序)。
+    scale:     累积尺度 (月)，例如 1 / 3 / 6 / 12。
+    method:    "gringorten" (经验分布) 或 "gamma"。
+    reference: 拟合分布用的参考期 (起始日期, 结束日期)，None 表示整个时段。
+    返回同形状的 float32 SCI 数组。
+    """
+    if method not in SCI_METHODS:
+        raise ValueError(f"不支持的 SCI 方法: {method} (应为 {' / '.join(SCI_METHODS)})")
+    if int(scale) < 1:
+        raise ValueError(f"累积尺度必须 >= 1: {scale}")
+
+    values = accumulate(qtot, int(scale))
+    months = calendar_months(dates)
+    is_ref = reference_columns(dates, reference)
+
+    sci = np.full(values.shape, np.nan, dtype=np.float32)
+    for m in range(1, 13):
+        cols = np.flatnonzero(months == m)
+        if not len(cols):
+            continue
+        block = values[:, cols]
+        if method == "gamma":
+            p = _gamma_probability(block, is_ref[cols])
+        elif is_ref[cols].all():
+            p = _gringorten(block)
+        else:
+            p = _gringorten_reference(block, is_ref[cols])
+        sci[:, cols] = ndtri(p)
+    return sci
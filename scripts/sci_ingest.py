@@ -0,0 +1,398 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import io
+import os
+
+# -----------------------------------------------------------------
+# 【原始批次读取】: R 脚本导出的 {model}_grids_X_Y.csv
+#
+# 1. 快速路径: pandas C 引擎 + 固定列类型，健康文件只走这条路。
+#    C 引擎会把字段不足的行用 NaN 补齐而不报错，所以读完后再数一遍逗号
+#    (分块扫描字节)，总数不等于 (列数 - 1) x 行数时同样转入抢救路径，
+#    两条路径对损坏行的处理完全相同。
+# 2. 抢救路径: 只有快速路径失败时，才逐行解析该文件。
+#    只丢弃字段数不对或关键列 (Grid_ID/Lon/Lat/Date) 无法解析的行，
+#    数值列 (Qtot/SCI) 无法解析时记为 NaN 并保留该行 (与原来的 to_numeric(errors='coerce') 相同)，
+#    被丢弃的行记录到隔离报告 (QUARANTINE)。
+# 3. 可选缓存: 校验通过的数据保存为 .npz 二进制文件 (RAW_CACHE)，
+#    被丢弃的行也一起保存，之后重新运行时源文件未变化就不再解析 CSV，
+#    隔离报告仍然完整。
+# 4. 网格范围读取 (grid_range，供内存预算拆分出的子批次使用):
+#    grid_line_index() 对每个源文件只扫描一次 (换行位置 + Grid_ID 一列)，
+#    得到每段连续 Grid_ID 的行号和字节范围；子批次只 seek 读取自己网格的字节并解析，
+#    每个文件总共只完整解析一次，峰值内存只有本子范围的数据。
+#    无法建立索引的文件 (有坏行) 退回按块 (READ_CHUNK_ROWS 行) 解析并筛选。
+#    子批次的 dropped 只包含本范围内被丢弃的行；Grid_ID 无法解析或不在源文件范围内的行
+#    只交给一个子批次 (source_range，通常是第一个)，所有子批次合起来与整文件读取相同。
+#    缓存按范围分别保存。
+# -----------------------------------------------------------------
+
+RAW_CACHE_DIR_NAME = "RAW_CACHE"
+QUARANTINE_DIR_NAME = "QUARANTINE"
+
+# 这些列必须可解析，否则整行无法使用
+KEY_COLUMNS = ['Grid_ID', 'Lon', 'Lat', 'Date']
+
+# 隔离报告中每行原文最多保留的字符数 (损坏的行可能非常长)
+MAX_QUARANTINE_TEXT = 200
+
+# 网格范围读取时每块解析的行数
+READ_CHUNK_ROWS = 1_000_000
+
+# 检查字段数时每次读取的字节数
+SCAN_BLOCK_BYTES = 1 << 24
+
+# 缓存格式版本: 读取规则变化时递增，旧缓存自动作废 (2: 快速路径也隔离字段不足的行)
+CACHE_VERSION = 2
+
+
+def _column_dtypes(column_names):
+    dtypes = {col: 'float64' for col in column_names}
+    dtypes['Date'] = 'str'
+    return dtypes
+
+
+# -----------------------------------------------------------------
+# 1. 快速路径
+# -----------------------------------------------------------------
+def _read_fast(file_path, column_names, **kwargs):
+    return pd.read_csv(
+        file_path,
+        engine='c',
+        encoding='latin-1',
+        header=None,
+        skiprows=1,  # 跳过(可能损坏的)标题行
+        names=column_names,
+        dtype=_column_dtypes(column_names),
+        on_bad_lines='error',  # 有坏行就整体转入抢救路径
+        **kwargs,
+    )
+
+
+def _check_field_counts(file_path, n_cols, n_rows):
+    """
+    快速路径读到 n_rows 行后，检查数据部分的逗号总数是否为 (n_cols - 1) x n_rows
+    (空行没有逗号，C 引擎也跳过)；字段多的行已由 on_bad_lines='error' 报错，
+    所以总数不等就说明有字段不足的行，抛出 ParserError 转入抢救路径。
+    """
+    commas = 0
+    with open(file_path, 'rb') as f:
+        f.readline()  # 标题行
+        for block in iter(lambda: f.read(SCAN_BLOCK_BYTES), b''):
+            commas += block.count(b',')
+    if commas != (n_cols - 1) * n_rows:
+        raise pd.errors.ParserError(f"{file_path} 中有字段不足的行")
+
+
+def _empty_frame(column_names):
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in _column_dtypes(column_names).items()})
+
+
+def _outside(grid, source_range):
+    """Grid_ID 无法解析或不在源文件的网格范围内 (不属于任何子批次的行)。"""
+    grid = np.asarray(grid, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return ~((grid >= source_range[0]) & (grid <= source_range[1]))
+
+
+def _read_fast_range(file_path, column_names, grid_range, source_range):
+    """
+    按块解析，只保留 Grid_ID 在 grid_range 内的行
+    (给出 source_range 时，关键列为空或 Grid_ID 不在源文件范围内的行也保留，之后照常隔离)。
+    返回 (df, positions, n_rows)，positions 为保留的行在整个文件数据行中的序号，n_rows 为文件的数据行数。
+    """
+    parts, positions = [], []
+    offset = 0
+    with _read_fast(file_path, column_names, chunksize=READ_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            keep = chunk['Grid_ID'].between(*grid_range).to_numpy()
+            if source_range is not None:
+                keep = keep | chunk[KEY_COLUMNS].isna().any(axis=1).to_numpy() | _outside(chunk['Grid_ID'], source_range)
+            parts.append(chunk[keep])
+            positions.append(np.flatnonzero(keep) + offset)
+            offset += len(chunk)
+    if not parts:
+        return _empty_frame(column_names), np.array([], dtype=int), 0
+    return pd.concat(parts, ignore_index=True), np.concatenate(positions), offset
+
+
+def grid_line_index(file_path, column_names):
+    """
+    扫描一次源文件，返回按 Grid_ID 连续的行段 (dict of numpy 数组):
+      grid                 该段的 Grid_ID (无法解析为 NaN，每行单独成段)
+      row_start, row_end   数据行序号 [start, end)
+      byte_start, byte_end 字节范围 [start, end)
+    只解析 Grid_ID 一列，换行位置按块扫描字节。文件无法用快速路径读取时返回 None。
+    """
+    newlines, returns = [], []
+    size = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(SCAN_BLOCK_BYTES), b''):
+            arr = np.frombuffer(block, dtype=np.uint8)
+            newlines.append(np.flatnonzero(arr == ord('\n')) + size)
+            returns.append(np.flatnonzero(arr == ord('\r')) + size)
+            size += len(block)
+    newlines = np.concatenate(newlines) if newlines else np.array([], dtype=np.int64)
+    returns = np.concatenate(returns) if returns else np.array([], dtype=np.int64)
+
+    line_start = np.concatenate([[0], newlines + 1])
+    line_end = np.concatenate([newlines + 1, [size]])
+    has_newline = np.concatenate([np.ones(len(newlines), dtype=bool), [False]])
+    # 去掉文件末尾换行之后的空“行”和标题行，再跳过空行 (与 C 引擎相同)
+    keep = line_end > line_start
+    line_start, line_end, has_newline = line_start[keep][1:], line_end[keep][1:], has_newline[keep][1:]
+    content = line_end - line_start - has_newline - (has_newline & np.isin(line_end - 2, returns))
+    data = content > 0
+    line_start, line_end = line_start[data], line_end[data]
+
+    try:
+        grid = _read_fast(file_path, column_names, usecols=['Grid_ID'])['Grid_ID'].to_numpy()
+    except (ValueError, pd.errors.ParserError, UnicodeDecodeError):
+        return None
+    if len(grid) != len(line_start):
+        return None
+
+    # 每段的第一行: Grid_ID 与上一行不同 (NaN 与任何值都不同)
+    first = np.ones(len(grid), dtype=bool)
+    first[1:] = ~(grid[1:] == grid[:-1])
+    row_start = np.flatnonzero(first)
+    row_end = np.append(row_start[1:], len(grid))
+    return dict(grid=grid[row_start], row_start=row_start, row_end=row_end,
+                byte_start=line_start[row_start], byte_end=line_end[row_end - 1])
+
+
+def index_slice(index, grid_range, source_range=None):
+    """
+    grid_line_index 结果中属于 grid_range 的行段
+    (给出 source_range 时包括 Grid_ID 无法解析或不在源文件范围内的行)。
+    """
+    grid = index['grid']
+    sel = (grid >= grid_range[0]) & (grid <= grid_range[1])
+    if source_range is not None:
+        sel |= _outside(grid, source_range)
+    return {key: values[sel] for key, values in index.items()}
+
+
+def _read_spans(file_path, column_names, spans):
+    """
+    只读取 spans (index_slice 的结果) 中的字节并解析，返回 (df, positions)。
+    字段不足的行与整文件读取一样由逗号总数检查出来。
+    """
+    buffer = io.BytesIO()
+    with open(file_path, 'rb') as f:
+        buffer.write(f.readline())  # 标题行 (_read_fast 跳过)
+        header_bytes = buffer.tell()
+        for start, end in zip(spans['byte_start'], spans['byte_end']):
+            f.seek(start)
+            block = f.read(end - start)
+            buffer.write(block)
+            if not block.endswith(b'\n'):
+                buffer.write(b'\n')
+    data = buffer.getbuffer()
+    n_rows = int((spans['row_end'] - spans['row_start']).sum())
+    if n_rows == 0:
+        return _empty_frame(column_names), np.array([], dtype=int)
+
+    buffer.seek(0)
+    df = _read_fast(buffer, column_names)
+    commas = bytes(data[header_bytes:]).count(b',')
+    if len(df) != n_rows or commas != (len(column_names) - 1) * n_rows:
+        raise pd.errors.ParserError(f"{file_path} 中有字段不足的行")
+    positions = np.concatenate([np.arange(a, b) for a, b in zip(spans['row_start'], spans['row_end'])])
+    return df, positions
+
+
+# -----------------------------------------------------------------
+# 2. 抢救路径 (逐行)
+# -----------------------------------------------------------------
+def _to_float(text):
+    """无法解析的数值记为 NaN。"""
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def _read_salvage(file_path, column_names):
+    """逐行解析，返回 (DataFrame, 被丢弃的行列表)。"""
+    n_cols = len(column_names)
+    date_idx = column_names.index('Date')
+    key_idx = [column_names.index(c) for c in KEY_COLUMNS if c != 'Date']
+    value_idx = [i for i in range(n_cols) if i != date_idx and i not in key_idx]
+    columns = [[] for _ in column_names]
+    dropped = []
+
+    with open(file_path, 'r', encoding='latin-1', newline='') as f:
+        next(f, None)  # 跳过标题行
+        for line_no, line in enumerate(f, start=2):
+            text = line.rstrip('\r\n')
+            if not text:
+                continue
+            fields = [tok.strip().strip('"') for tok in text.split(',')]
+            if len(fields) != n_cols:
+                dropped.append((line_no, f"字段数为 {len(fields)} (应为 {n_cols})", text))
+                continue
+            if not fields[date_idx]:
+                dropped.append((line_no, "Date 为空", text))
+                continue
+            row = list(fields)
+            for i in key_idx + value_idx:
+                row[i] = _to_float(fields[i])
+            if any(row[i] != row[i] for i in key_idx):  # NaN
+                dropped.append((line_no, "关键列无法解析", text))
+                continue
+            for col, val in zip(columns, row):
+                col.append(val)
+
+    df = pd.DataFrame({name: col for name, col in zip(column_names, columns)})
+    df = df.astype(_column_dtypes(column_names))
+    return df, dropped
+
+
+def _dropped_in_range(dropped, grid_range, source_range):
+    """被丢弃的行中属于 grid_range 的 (按原文第一个字段)，以及 (给出 source_range 时) 不属于任何子批次的行。"""
+    kept = []
+    for line_no, reason, text in dropped:
+        grid_id = _to_float(text.split(',')[0].strip().strip('"'))
+        if grid_range[0] <= grid_id <= grid_range[1] or (source_range is not None and _outside(grid_id, source_range)):
+            kept.append((line_no, reason, text))
+    return kept
+
+
+def _data_line_numbers(file_path):
+    """
+    原文件中每个数据行的行号 (C 引擎跳过空行，所以不能用 DataFrame 的行号推算)。
+    只有快速路径读到关键列为空的行时才调用。
+    """
+    with open(file_path, 'r', encoding='latin-1', newline='') as f:
+        next(f, None)  # 标题行
+        return [line_no for line_no, line in enumerate(f, start=2) if line.strip()]
+
+
+def _drop_invalid_keys(df, dropped, file_path, positions=None):
+    """
+    快速路径也可能读到字段缺失的行 (NaN)，同样隔离 (行号取自原文件)。
+    positions: df 的各行在整个文件数据行中的序号 (网格范围读取时)；None 表示 df 就是整个文件。
+    """
+    bad = df[KEY_COLUMNS].isna().any(axis=1).to_numpy()
+    if bad.any():
+        line_numbers = _data_line_numbers(file_path)
+        for idx in np.flatnonzero(bad):
+            pos = idx if positions is None else positions[idx]
+            line_no = line_numbers[pos] if pos < len(line_numbers) else None
+            dropped.append((line_no, "关键列为空", ",".join(map(str, df.iloc[idx].tolist()))))
+        df = df[~bad].reset_index(drop=True)
+    return df
+
+
+# -----------------------------------------------------------------
+# 3. 二进制缓存
+# -----------------------------------------------------------------
+def _cache_path(cache_dir, file_path, grid_range=None):
+    if grid_range is None:
+        return Path(cache_dir) / f"{Path(file_path).stem}.npz"
+    return Path(cache_dir) / f"{Path(file_path).stem}.grids_{grid_range[0]}_{grid_range[1]}.npz"
+
+
+def _source_signature(file_path):
+    st = os.stat(file_path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype='<i8')
+
+
+def _load_cache(cache_path, file_path, column_names):
+    """返回 (df, dropped)；缓存不存在、已过期或是旧格式 (CACHE_VERSION 不同) 时返回 None。"""
+    if not cache_path.exists():
+        return None
+    with np.load(cache_path, allow_pickle=False) as z:
+        if '_version' not in z.files or int(z['_version']) != CACHE_VERSION:
+            return None  # 旧格式的缓存
+        if not np.array_equal(z['_source'], _source_signature(file_path)):
+            return None  # 源文件已变化，缓存作废
+        dropped = [(None if line < 0 else int(line), str(reason), str(text))
+                   for line, reason, text in zip(z['_dropped_line'], z['_dropped_reason'], z['_dropped_text'])]
+        return pd.DataFrame({col: z[col] for col in column_names}), dropped
+
+
+def _save_cache(cache_path, file_path, df, dropped):
+    cache_path.parent.mkdir(exist_ok=True, parents=True)
+    arrays = {col: df[col].to_numpy() for col in df.columns}
+    arrays['Date'] = df['Date'].to_numpy().astype('U')
+    # 被丢弃的行 (行号未知时记为 -1)，缓存命中时隔离报告仍然完整
+    arrays['_dropped_line'] = np.array([-1 if d[0] is None else d[0] for d in dropped], dtype='<i8')
+    arrays['_dropped_reason'] = np.array([d[1] for d in dropped], dtype='U')
+    arrays['_dropped_text'] = np.array([d[2][:MAX_QUARANTINE_TEXT] for d in dropped], dtype='U')
+    # 子批次可能由多个工人同时读取同一个文件，临时文件名按进程区分
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, _source=_source_signature(file_path), _version=np.int64(CACHE_VERSION), **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+# -----------------------------------------------------------------
+# 4. 对外接口
+# -----------------------------------------------------------------
+def read_raw_batch(file_path, column_names, cache_dir=None, grid_range=None, line_index=None, source_range=None):
+    """
+    读取一个模型的一个批次文件。
+    grid_range 为 (起始 Grid_ID, 结束 Grid_ID) 时只返回该范围内的网格: 有 line_index
+    (grid_line_index 的结果，可以是 index_slice 之后的) 时只读取这些字节，否则按块读取并筛选。
+    此时 dropped 只包含范围内被丢弃的行；给出 source_range (源文件的网格范围) 时，
+    Grid_ID 无法解析或不在源文件范围内的行也归入本次读取 (每个源文件只应交给一个子批次)。
+    返回 (df, dropped, engine)，其中 dropped 是 [(行号, 原因, 原文), ...]，
+    engine 为 'cache' / 'c' / 'salvage'。
+    """
+    file_path = Path(file_path)
+
+    if cache_dir is not None:
+        cached = _load_cache(_cache_path(cache_dir, file_path, grid_range), file_path, column_names)
+        if cached is not None:
+            df, dropped = cached
+            return df, dropped, 'cache'
+
+    dropped = []
+    try:
+        if grid_range is None:
+            df = _read_fast(file_path, column_names)
+            _check_field_counts(file_path, len(column_names), len(df))
+            df = _drop_invalid_keys(df, dropped, file_path)
+        elif line_index is not None:
+            df, positions = _read_spans(file_path, column_names, index_slice(line_index, grid_range, source_range))
+            df = _drop_invalid_keys(df, dropped, file_path, positions)
+        else:
+            df, positions, n_rows = _read_fast_range(file_path, column_names, grid_range, source_range)
+            _check_field_counts(file_path, len(column_names), n_rows)
+            df = _drop_invalid_keys(df, dropped, file_path, positions)
+        engine = 'c'
+    except (ValueError, pd.errors.ParserError, UnicodeDecodeError):
+        df, dropped = _read_salvage(file_path, column_names)
+        if grid_range is not None:
+            keep = df['Grid_ID'].between(*grid_range).to_numpy()
+            if source_range is not None:
+                keep = keep | _outside(df['Grid_ID'], source_range)
+            df = df[keep].reset_index(drop=True)
+            dropped = _dropped_in_range(dropped, grid_range, source_range)
+        engine = 'salvage'
+
+    if cache_dir is not None:
+        _save_cache(_cache_path(cache_dir, file_path, grid_range), file_path, df, dropped)
+
+    return df, dropped, engine
+
+
+def write_quarantine_report(quarantine_dir, model, suffix, dropped):
+    """将一个模型/批次被丢弃的行写入隔离报告，返回报告路径。"""
+    quarantine_dir = Path(quarantine_dir)
+    quarantine_dir.mkdir(exist_ok=True, parents=True)
+    report = pd.DataFrame({
+        'Model': model,
+        'Batch': suffix,
+        'Line': [d[0] for d in dropped],
+        'Reason': [d[1] for d in dropped],
+        'Text': [d[2][:MAX_QUARANTINE_TEXT] for d in dropped],
+    })
+    report_path = quarantine_dir / f"{model}_{suffix}"
+    tmp_path = report_path.with_name(f"{report_path.name}.{os.getpid()}.tmp")
+    report.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, report_path)
+    return report_path
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# -----------------------------------------------------------------
+# 【运行清单 (manifest)】: 增量 / 可续跑
+#
+# 每个批次或阶段记录:
+#   inputs   输入文件的 (大小, 修改时间)
+#   params   参数 (模型列表、阈值等) 的摘要
+#   outputs  输出文件的 SHA-256 及记录时的 (大小, 修改时间)
+# 重新运行时，三者都未变化 (且输出文件仍然完好) 的条目直接跳过。
+# 输出文件的大小和修改时间与记录相同时不再计算校验和 (不用读取整个立方体)，
+# 只有二者变化时才重新计算 SHA-256 判断内容是否真的变了。
+# 每完成一个批次就保存一次，中断后再次运行会从中断处继续。
+# -----------------------------------------------------------------
+
+MANIFEST_NAME = "PIPELINE_MANIFEST.json"
+
+
+def file_signature(paths):
+    """{路径: [大小, 修改时间 ns]}，不存在的文件记为 None。"""
+    sig = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig[str(p)] = [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            sig[str(p)] = None
+    return sig
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _output_record(path):
+    st = os.stat(path)
+    return {'sha256': file_checksum(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _output_unchanged(path, recorded):
+    """大小和修改时间都与记录相同时直接认为未变化，否则比较校验和。"""
+    if isinstance(recorded, str):
+        recorded = {'sha256': recorded}  # 旧格式: 只有校验和
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if st.st_size == recorded.get('size') and st.st_mtime_ns == recorded.get('mtime_ns'):
+        return True
+    return file_checksum(path) == recorded['sha256']
+
+
+def params_digest(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """一个 JSON 文件: {section: {key: {inputs, params, outputs}}}"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def is_current(self, section, key, inputs, params, outputs):
+        """inputs/params 与上次一致，且所有输出文件存在并且内容不变。"""
+        entry = self.entries.get(section, {}).get(key)
+        if entry is None:
+            return False
+        if entry['inputs'] != inputs or entry['params'] != params_digest(params):
+            return False
+        if sorted(entry['outputs']) != sorted(str(p) for p in outputs):
+            return False
+        return all(_output_unchanged(p, recorded) for p, recorded in entry['outputs'].items())
+
+    def record(self, section, key, inputs, params, outputs):
+        self.entries.setdefault(section, {})[key] = {
+            'inputs': inputs,
+            'params': params_digest(params),
+            'outputs': {str(p): _output_record(p) for p in outputs},
+        }
+
+    def forget(self, section, key):
+        self.entries.get(section, {}).pop(key, None)
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
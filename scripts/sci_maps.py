@@ -0,0 +1,130 @@
+import numpy as np
+
+# -----------------------------------------------------------------
+# 【多图层地图】: 所有 Delta_* 图层放在同一个图中
+#
+# 网格点先按 Lon/Lat 放回规则网格 ([lat, lon] 数组)，每个图层是一个
+# Heatmap (只有 z 矩阵，坐标轴是两个一维数组)，或者 WebGL 散点 (Scattergl)。
+# 一个 HTML 只包含一份 Plotly 库，用下拉菜单切换图层，
+# 因此指标越多，只是多几个小矩阵，而不是多几个完整的 HTML。
+# 可选用 matplotlib (无界面 Agg 后端) 导出静态 PNG，用于报告。
+# -----------------------------------------------------------------
+
+MAP_MODES = ("heatmap", "webgl")
+COLOR_SCALE = "RdBu_r"  # 红=增加, 蓝=减少
+
+
+def grid_step(coords):
+    """坐标的网格间距 (相邻不同坐标的最小差值)。"""
+    unique = np.unique(np.round(np.asarray(coords, dtype=np.float64), 6))
+    diffs = np.diff(unique)
+    return float(diffs.min()) if len(diffs) else 1.0
+
+
+def grid_layers(df, columns):
+    """
+    把 Lon/Lat 点放回规则网格。
+    返回 (lon_axis, lat_axis, {列名: [lat, lon] float32 数组})，没有网格的位置为 NaN。
+    """
+    lon = df['Lon'].to_numpy(dtype=np.float64)
+    lat = df['Lat'].to_numpy(dtype=np.float64)
+    dx, dy = grid_step(lon), grid_step(lat)
+    ix = np.rint((lon - lon.min()) / dx).astype(np.int64)
+    iy = np.rint((lat - lat.min()) / dy).astype(np.int64)
+
+    lon_axis = lon.min() + dx * np.arange(ix.max() + 1)
+    lat_axis = lat.min() + dy * np.arange(iy.max() + 1)
+
+    layers = {}
+    for col in columns:
+        z = np.full((len(lat_axis), len(lon_axis)), np.nan, dtype=np.float32)
+        z[iy, ix] = df[col].to_numpy(dtype=np.float32)
+        layers[col] = z
+    return lon_axis, lat_axis, layers
+
+
+def layered_figure(df, layer_titles, mode="heatmap", range_color=(-1, 1), colorbar_title="",
+                   width=1000, height=800):
+    """
+    df:           至少包含 Lon / Lat 以及 layer_titles 中的列。
+    layer_titles: {列名: 标题}，按顺序成为下拉菜单中的图层。
+    mode:         "heatmap" (规则网格) 或 "webgl" (Scattergl 散点)。
+    """
+    import plotly.graph_objects as go  # 只有绘图时才需要
+
+    if mode not in MAP_MODES:
+        raise ValueError(f"不支持的地图模式: {mode} (应为 {' / '.join(MAP_MODES)})")
+
+    columns = list(layer_titles)
+    zmin, zmax = range_color
+    colorbar = dict(title=colorbar_title)
+
+    traces = []
+    if mode == "heatmap":
+        lon_axis, lat_axis, layers = grid_layers(df, columns)
+        for i, col in enumerate(columns):
+            traces.append(go.Heatmap(
+                x=lon_axis, y=lat_axis, z=layers[col], name=col, visible=(i == 0),
+                colorscale=COLOR_SCALE, zmid=0, zmin=zmin, zmax=zmax, colorbar=colorbar,
+                hovertemplate="Lon %{x}<br>Lat %{y}<br>%{z:.3f}<extra>" + col + "</extra>",
+            ))
+    else:
+        lon = df['Lon'].to_numpy()
+        lat = df['Lat'].to_numpy()
+        for i, col in enumerate(columns):
+            traces.append(go.Scattergl(
+                x=lon, y=lat, mode='markers', name=col, visible=(i == 0),
+                marker=dict(color=df[col].to_numpy(), colorscale=COLOR_SCALE, cmid=0, cmin=zmin, cmax=zmax,
+                            size=4, showscale=True, colorbar=colorbar),
+                hovertemplate="Lon %{x}<br>Lat %{y}<br>%{marker.color:.3f}<extra>" + col + "</extra>",
+            ))
+
+    buttons = [
+        dict(label=col, method='update',
+             args=[{'visible': [j == i for j in range(len(columns))]}, {'title.text': layer_titles[col]}])
+        for i, col in enumerate(columns)
+    ]
+
+    fig = go.Figure(traces)
+    fig.update_layout(
+        title=dict(text=layer_titles[columns[0]]),
+        template='plotly_white', width=width, height=height,
+        updatemenus=[dict(buttons=buttons, direction='down', x=0, xanchor='left', y=1.12, yanchor='top')],
+        xaxis_title='Lon', yaxis_title='Lat',
+    )
+    fig.update_yaxes(scaleanchor="x", scaleratio=1)
+    return fig
+
+
+def export_png(df, layer_titles, out_path, range_color=(-1, 1), colorbar_title="", ncols=2, dpi=150):
+    """无界面导出静态 PNG: 每个图层一个子图，共用一个色标。"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # 中文标题 (Windows 上通常有 SimHei / Microsoft YaHei)
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Noto Sans CJK SC', 'DejaVu Sans']
+    plt.rcParams['axes.unicode_minus'] = False
+
+    columns = list(layer_titles)
+    lon_axis, lat_axis, layers = grid_layers(df, columns)
+    dx = lon_axis[1] - lon_axis[0] if len(lon_axis) > 1 else 1.0
+    dy = lat_axis[1] - lat_axis[0] if len(lat_axis) > 1 else 1.0
+    extent = (lon_axis[0] - dx / 2, lon_axis[-1] + dx / 2, lat_axis[0] - dy / 2, lat_axis[-1] + dy / 2)
+
+    ncols = min(ncols, len(columns))
+    nrows = -(-len(columns) // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(6 * ncols, 4.5 * nrows),
+                             squeeze=False, layout='constrained')
+    for ax, col in zip(axes.flat, columns):
+        image = ax.imshow(layers[col], origin='lower', extent=extent, cmap=COLOR_SCALE,
+                          vmin=range_color[0], vmax=range_color[1], interpolation='nearest')
+        ax.set_title(layer_titles[col].replace('<br>', '\n'), fontsize=9)
+        ax.set_xlabel('Lon')
+        ax.set_ylabel('Lat')
+    for ax in list(axes.flat)[len(columns):]:
+        ax.axis('off')
+
+    fig.colorbar(image, ax=axes.ravel().tolist(), shrink=0.8, label=colorbar_title)
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
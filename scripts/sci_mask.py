@@ -0,0 +1,94 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# -----------------------------------------------------------------
+# 【中国陆地掩膜】: Grid_ID -> 是否在中国境内 (及所在多边形编号)
+#
+# 第一次运行时用 geopandas 做一次向量化的点-多边形判断 (空间索引)，
+# 结果以 “shapefile 内容哈希 + 网格定义哈希” 为键缓存到 MASK_CACHE。
+# 之后各阶段只需按 Grid_ID 查表，不再读取 shapefile 或做空间连接。
+# -----------------------------------------------------------------
+
+MASK_CACHE_DIR_NAME = "MASK_CACHE"
+
+# shapefile 的各个组成文件 (存在的都会计入哈希)
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def shapefile_digest(shapefile_path):
+    h = hashlib.sha256()
+    shapefile_path = Path(shapefile_path)
+    for ext in SHAPEFILE_PARTS:
+        part = shapefile_path.with_suffix(ext)
+        if part.exists():
+            h.update(ext.encode('ascii'))
+            h.update(part.read_bytes())
+    return h.hexdigest()
+
+
+def grid_digest(grid_ids, lon, lat):
+    h = hashlib.sha256()
+    for arr, dtype in ((grid_ids, '<i8'), (lon, '<f8'), (lat, '<f8')):
+        h.update(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+    return h.hexdigest()
+
+
+def _compute_mask(grid_ids, lon, lat, shapefile_path):
+    import geopandas as gpd  # 只有缓存未命中时才需要
+
+    boundary = gpd.read_file(shapefile_path).to_crs(epsg=4326)
+    points = gpd.GeoDataFrame(
+        {'Grid_ID': grid_ids},
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+    # sjoin 内部使用 STRtree 空间索引
+    joined = gpd.sjoin(points, boundary[['geometry']], how='inner', predicate='within')
+    # 同一个点落在多个多边形中时只取第一个
+    joined = joined[~joined.index.duplicated(keep='first')]
+
+    region = np.full(len(grid_ids), -1, dtype=np.int64)
+    region[joined.index.to_numpy()] = joined['index_right'].to_numpy()
+    return pd.DataFrame({
+        'Grid_ID': np.asarray(grid_ids, dtype=np.int64),
+        'Inside': region >= 0,
+        'Region_ID': region,
+    })
+
+
+def load_mask(df, shapefile_path, cache_dir=None):
+    """
+    返回 df 中每个网格的掩膜表 (Grid_ID, Inside, Region_ID)。
+    df 需要包含 Grid_ID / Lon / Lat 三列。
+    cache_dir 默认为 shapefile 所在目录下的 MASK_CACHE。
+    """
+    shapefile_path = Path(shapefile_path)
+    if not shapefile_path.exists():
+        raise FileNotFoundError(f"未找到 Shapefile: {shapefile_path}")
+
+    grid = df[['Grid_ID', 'Lon', 'Lat']].drop_duplicates('Grid_ID').sort_values('Grid_ID')
+    grid_ids, lon, lat = (grid[c].to_numpy() for c in ('Grid_ID', 'Lon', 'Lat'))
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else shapefile_path.parent / MASK_CACHE_DIR_NAME
+    key = f"{shapefile_digest(shapefile_path)[:16]}_{grid_digest(grid_ids, lon, lat)[:16]}"
+    cache_path = cache_dir / f"CHINA_MASK_{key}.csv"
+
+    if cache_path.exists():
+        return pd.read_csv(cache_path)
+
+    mask = _compute_mask(grid_ids, lon, lat, shapefile_path)
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    # 临时文件名带进程号: 同时运行的阶段 (例如归因和地图) 可能同时建立同一个缓存
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    mask.to_csv(tmp_path, index=False)
+    tmp_path.replace(cache_path)
+    return mask
+
+
+def apply_mask(df, mask):
+    """只保留掩膜中 Inside 为真的网格 (按 Grid_ID 查表，保持 df 原有顺序)。"""
+    inside_ids = mask.loc[mask['Inside'], 'Grid_ID'].to_numpy()
+    return df[df['Grid_ID'].isin(inside_ids)].reset_index(drop=True)
@@ -0,0 +1,221 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from pathlib import Path
+
+# -----------------------------------------------------------------
+# 【运行指标】: 每个阶段 / 每个批次一行 JSON (JSON Lines)
+#
+# 每条记录: run_id, script, stage, batch, pid, start,
+#           wall_s, cpu_s, rows, rows_per_s, bytes_read, bytes_written,
+#           peak_rss_mb (该进程到目前为止的峰值内存), phases (各步骤墙钟时间),
+#           phases_cpu (各步骤 CPU 时间)
+# 工人进程只测量并返回记录，由父进程统一追加到 PIPELINE_METRICS.jsonl，
+# 因此多个工人不会同时写同一个文件。
+# 同一次 'run_pipeline.py' 启动的所有脚本共用一个 run_id (环境变量 SCI_RUN_ID)，
+# 便于比较不同运行、发现数据或代码变化后的性能退化。
+#
+# 【剖析模式】(可选): 每个批次在 cProfile 下运行，结果写入 PROFILE/<run_id>/，
+# 只保留本次运行最慢的若干个批次的 .pstats 文件及其文本摘要 (按累计时间排序)。
+# 以前运行的结果不会被删除。
+# -----------------------------------------------------------------
+
+METRICS_FILE_NAME = "PIPELINE_METRICS.jsonl"
+PROFILE_DIR_NAME = "PROFILE"
+RUN_ID_ENV = "SCI_RUN_ID"
+
+
+def run_id():
+    """本次运行的编号: 由流水线传入，单独运行脚本时按启动时间生成。"""
+    if RUN_ID_ENV not in os.environ:
+        os.environ[RUN_ID_ENV] = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    return os.environ[RUN_ID_ENV]
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存 (MB)；无法获取时为 None。"""
+    # Linux: VmHWM 是本进程的峰值 (ru_maxrss 会继承启动它的父进程的峰值)
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 2 ** 10, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows: 工作集峰值
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def file_bytes(paths):
+    """存在的文件的总字节数。"""
+    return sum(Path(p).stat().st_size for p in paths if Path(p).exists())
+
+
+class StageTimer:
+    """
+    测量一个阶段 (或批次) 的墙钟时间、CPU 时间和峰值内存:
+        with StageTimer("means.batch", batch=suffix) as timer:
+            with timer.phase("read"):
+                ...
+            timer.add(rows=len(df), bytes_read=size)
+        timer.record  # -> dict
+    """
+
+    def __init__(self, stage, script=None, batch=None):
+        self.record = {
+            'run_id': run_id(), 'script': script or Path(sys.argv[0]).name, 'stage': stage, 'batch': batch,
+            'pid': os.getpid(), 'start': None, 'wall_s': None, 'cpu_s': None,
+            'rows': 0, 'rows_per_s': None, 'bytes_read': 0, 'bytes_written': 0,
+            'peak_rss_mb': None, 'phases': {}, 'phases_cpu': {},
+        }
+
+    def __enter__(self):
+        self.record['start'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        self.record['wall_s'] = round(wall, 4)
+        self.record['cpu_s'] = round(time.process_time() - self._cpu, 4)
+        if self.record['rows'] and wall > 0:
+            self.record['rows_per_s'] = round(self.record['rows'] / wall, 1)
+        self.record['peak_rss_mb'] = peak_rss_mb()
+        return False
+
+    def add(self, **counts):
+        """累加 rows / bytes_read / bytes_written。"""
+        for key, value in counts.items():
+            self.record[key] = self.record.get(key, 0) + int(value)
+
+    def phase(self, name):
+        """累计一个步骤 (例如 'parse'、'groupby'、'spatial_join'、'write_html') 的墙钟时间和 CPU 时间。"""
+        return _Phase(self.record, name)
+
+
+class _Phase:
+    def __init__(self, record, name):
+        self.phases = record['phases']
+        self.phases_cpu = record['phases_cpu']
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def __exit__(self, *exc):
+        self.phases[self.name] = round(self.phases.get(self.name, 0.0) + time.perf_counter() - self._start, 4)
+        self.phases_cpu[self.name] = round(self.phases_cpu.get(self.name, 0.0) + time.process_time() - self._cpu, 4)
+        return False
+
+
+class MetricsLog:
+    """追加写入 JSON Lines 指标文件 (只在父进程中使用)。"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record):
+        if record is None:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stage(self, stage, batch=None):
+        """with log.stage("attribution.total") as timer: ... (结束时自动写入)"""
+        return _LoggedStage(self, StageTimer(stage, batch=batch))
+
+    def start(self, stage, batch=None):
+        """顶层脚本中不便使用 with 时: timer = log.start(...) ... log.finish(timer)"""
+        return StageTimer(stage, batch=batch).__enter__()
+
+    def finish(self, timer):
+        timer.__exit__(None, None, None)
+        self.write(timer.record)
+
+
+class _LoggedStage:
+    def __init__(self, log, timer):
+        self.log = log
+        self.timer = timer
+
+    def __enter__(self):
+        return self.timer.__enter__()
+
+    def __exit__(self, *exc):
+        self.timer.__exit__(*exc)
+        self.log.write(self.timer.record)
+        return False
+
+
+def read_metrics(paths, run=None):
+    """读取若干 PIPELINE_METRICS.jsonl 中的记录；指定 run 时只返回该 run_id 的记录。"""
+    records = []
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if run is None or record.get('run_id') == run:
+                        records.append(record)
+    return records
+
+
+# -----------------------------------------------------------------
+# 剖析模式
+# -----------------------------------------------------------------
+def run_profile_dir(base_dir):
+    """本次运行的剖析结果目录: <base_dir>/PROFILE/<run_id>。"""
+    return Path(base_dir) / PROFILE_DIR_NAME / run_id()
+
+
+def profiled(profile_dir, name, func, *args):
+    """在 cProfile 下运行 func(*args)，统计结果保存为 <profile_dir>/<name>.pstats。"""
+    profile_dir = Path(profile_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(str(profile_dir / f"{name}.pstats"))
+
+
+def keep_slowest(profile_dir, records, keep=5, top=30):
+    """
+    只保留最慢的 keep 个批次的 .pstats，并为它们写出文本摘要 (.txt，累计时间前 top 个函数)。
+    records: 本次运行的批次指标记录 (batch 为 .pstats 的文件名)。返回保留的批次名。
+    只处理 records 中的批次写出的文件，目录中其他 .pstats 保持不变。
+    """
+    profile_dir = Path(profile_dir)
+    timed = sorted((r for r in records if r and r.get('wall_s') is not None),
+                   key=lambda r: r['wall_s'], reverse=True)
+    slowest = [r['batch'] for r in timed[:keep]]
+
+    for batch in {r['batch'] for r in records if r}:
+        path = profile_dir / f"{batch}.pstats"
+        if not path.exists():
+            continue
+        if batch not in slowest:
+            path.unlink()
+            continue
+        text = io.StringIO()
+        pstats.Stats(str(path), stream=text).sort_stats('cumulative').print_stats(top)
+        path.with_suffix(".txt").write_text(text.getvalue(), encoding='utf-8')
+    return slowest
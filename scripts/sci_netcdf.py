@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sci_index import compute_sci
+
+# -----------------------------------------------------------------
+# 【ISIMIP3b NetCDF 直接读取】: 跳过 R 脚本的 CSV 导出
+#
+# 文件名形如:
+#   h08_gswp3-w5e5_obsclim_histsoc_default_qtot_global_monthly_1971_1980.nc
+# 每个模型用 xarray 惰性打开 (按时间分块)，只切出中国范围和 1980-2014，
+# 再按 Grid_ID 取出一个批次的格点，输出与 R 导出的 CSV 相同的长格式:
+#   Grid_ID, Lon, Lat, Date, Qtot, SCI
+# -----------------------------------------------------------------
+
+# 中国范围 (格点中心 72.25E-135.75E, 17.75N-54.25N，与 R 导出的 Grid_ID 1 = (72.25, 54.25) 一致)
+CHINA_LON = (72.0, 136.0)
+CHINA_LAT = (17.5, 54.5)
+PERIOD = ("1980-01-01", "2014-12-31")
+
+QTOT_VARIABLE = "qtot"
+NETCDF_GRID_INDEX_NAME = "NETCDF_GRID_INDEX.csv"
+
+# 每个时间块包含的月数 (xarray/dask 惰性读取)
+TIME_CHUNK = 120
+
+
+def find_qtot_files(nc_dir, model):
+    return sorted(Path(nc_dir).glob(f"{model}_*_{QTOT_VARIABLE}_*monthly*.nc"))
+
+
+def open_model_qtot(nc_dir, model):
+    """
+    惰性打开一个模型的所有 qtot 文件 (此时尚未读取任何数据)。
+    调用方应使用 with 语句，确保文件句柄在多进程分叉前关闭。
+    """
+    import xarray as xr  # 只有 NetCDF 路径需要
+
+    files = find_qtot_files(nc_dir, model)
+    if not files:
+        raise FileNotFoundError(f"在 {nc_dir} 中未找到模型 {model} 的 qtot 文件")
+    return xr.open_mfdataset(files, combine='by_coords', chunks={'time': TIME_CHUNK})
+
+
+def china_qtot(ds, lon_range=CHINA_LON, lat_range=CHINA_LAT, period=PERIOD):
+    """切出中国范围和 1980-2014 (仍是惰性的)，维度为 (time, lat, lon)。"""
+    da = ds[QTOT_VARIABLE]
+
+    # ISIMIP 的纬度通常是从北到南递减的
+    lat = da['lat'].values
+    lat_slice = slice(lat_range[1], lat_range[0]) if lat[0] > lat[-1] else slice(*lat_range)
+    return da.sel(lon=slice(*lon_range), lat=lat_slice, time=slice(*period))
+
+
+def build_grid_index(da):
+    """
+    由一个模型的有效格点生成 Grid_ID 表 (Grid_ID, Lon, Lat)。
+    编号顺序与 R 导出一致: 经度从西到东，同一经度内纬度从北到南，只计有数据的格点。
+    如果已有 R 导出的网格表，应直接使用它以保证 Grid_ID 完全一致。
+    """
+    # 单线程计算: 工人进程由 multiprocessing 分叉，不能继承 dask 线程池
+    has_data = da.notnull().any(dim='time').transpose('lon', 'lat').compute(scheduler='synchronous').values
+    lon = da['lon'].values
+    lat = da['lat'].values
+
+    ix, iy = np.nonzero(has_data)
+    # 同一经度内按纬度从北到南
+    order = np.lexsort((-lat[iy], ix))
+    ix, iy = ix[order], iy[order]
+    return pd.DataFrame({
+        'Grid_ID': np.arange(1, len(ix) + 1),
+        'Lon': lon[ix],
+        'Lat': lat[iy],
+    })
+
+
+def load_grid_index(base_dir, nc_dir, reference_model):
+    """读取 (不存在时生成并保存) 情景目录下的 NETCDF_GRID_INDEX.csv。"""
+    path = Path(base_dir) / NETCDF_GRID_INDEX_NAME
+    if not path.exists():
+        with open_model_qtot(nc_dir, reference_model) as ds:
+            grid_index = build_grid_index(china_qtot(ds))
+        grid_index.to_csv(path, index=False)
+    return pd.read_csv(path)
+
+
+def batch_suffixes(grid_index, batch_size):
+    """按 Grid_ID 划分批次，返回与 R 导出相同的后缀 'grids_1_160.csv' 等。"""
+    ids = np.sort(grid_index['Grid_ID'].to_numpy())
+    suffixes = []
+    for start in range(0, len(ids), batch_size):
+        block = ids[start:start + batch_size]
+        suffixes.append(f"grids_{block[0]}_{block[-1]}.csv")
+    return suffixes
+
+
+def suffix_grid_range(suffix):
+    """'grids_1_160.csv' -> (1, 160)"""
+    _, start, end = Path(suffix).stem.split('_')
+    return int(start), int(end)
+
+
+def read_model_batch(nc_dir, model, grid_rows, sci_scale=1, sci_method="gringorten", sci_reference=None):
+    """
+    读取一个模型在 grid_rows (Grid_ID, Lon, Lat) 上的 qtot，并计算 SCI
+    (累积尺度、分布和参考期见 sci_index.compute_sci)。
+    只有覆盖这些格点的数据块会被真正读取。
+    返回长格式 DataFrame: Grid_ID, Lon, Lat, Date, Qtot, SCI。
+    """
+    import xarray as xr
+
+    with open_model_qtot(nc_dir, model) as ds:
+        points = china_qtot(ds).sel(
+            lon=xr.DataArray(grid_rows['Lon'].to_numpy(), dims='grid'),
+            lat=xr.DataArray(grid_rows['Lat'].to_numpy(), dims='grid'),
+            method='nearest',
+        ).transpose('grid', 'time').compute(scheduler='synchronous')
+
+    qtot = points.values.astype(np.float64)  # [grid, month]
+    # DatetimeIndex 和 CFTimeIndex (非标准日历) 都支持 strftime
+    dates = np.asarray(points.indexes['time'].strftime('%Y-%m-%d'))
+    sci = compute_sci(qtot, dates, scale=sci_scale, method=sci_method, reference=sci_reference)
+
+    n_grid, n_month = qtot.shape
+    return pd.DataFrame({
+        'Grid_ID': np.repeat(grid_rows['Grid_ID'].to_numpy(), n_month),
+        'Lon': np.repeat(grid_rows['Lon'].to_numpy(), n_month),
+        'Lat': np.repeat(grid_rows['Lat'].to_numpy(), n_month),
+        'Date': np.tile(dates, n_grid),
+        'Qtot': qtot.reshape(-1),
+        'SCI': sci.reshape(-1),
+    })
@@ -0,0 +1,294 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+# -----------------------------------------------------------------
+# 【多情景流水线】: 配置文件 -> 阶段依赖图 -> 并行调度
+#
+# 每个情景:   means:<情景> -> frequency:<情景>
+# 所有情景:   frequency:* (归因用到的情景) -> attribution
+#             maps 读取 R 脚本导出的 *_RATIO_STATS.csv (没有阶段生成它)，不依赖其他阶段；
+#             load_config 时检查这些文件是否存在
+#             means:* (归因用到的情景) -> windows (时间窗口归因)
+#             means:* + attribution -> significance (块自助法显著性检验)
+# 各脚本仍可单独运行 (使用脚本中写死的默认设置)；由流水线启动时，
+# 该阶段的设置通过环境变量 SCI_STAGE_CONFIG (JSON) 传入，脚本用
+# stage_overrides() 读取并覆盖默认值。
+# 互不依赖的阶段 (例如不同情景的 means) 同时运行，某个阶段的输入
+# 全部完成后立即启动；失败阶段的下游阶段被跳过。
+# -----------------------------------------------------------------
+
+STAGE_CONFIG_ENV = "SCI_STAGE_CONFIG"
+
+STAGE_ORDER = ("means", "frequency", "attribution", "maps", "windows", "significance")
+STAGE_SCRIPTS = {
+    "means": "calculate_means.py",
+    "frequency": "calculate_frequency.py",
+    "attribution": "run_final_attribution.py",
+    "maps": "python plot_FINAL_attribution_maps.py",
+    "windows": "run_window_attribution.py",
+    "significance": "run_bootstrap_significance.py",
+}
+
+# 时间窗口阶段可在配置中设置的项 (原样传给 'run_window_attribution.py')
+WINDOW_KEYS = ("periods", "seasons", "sliding_years", "sliding_step")
+
+# 显著性检验阶段可在配置中设置的项 (原样传给 'run_bootstrap_significance.py')
+SIGNIFICANCE_KEYS = ("n_bootstrap", "block_years", "alpha", "seed")
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+def stage_overrides():
+    """由流水线启动时返回该阶段的设置 (dict)；单独运行脚本时返回 {}。"""
+    text = os.environ.get(STAGE_CONFIG_ENV)
+    return json.loads(text) if text else {}
+
+
+def load_config(path):
+    """读取并检查流水线配置 (JSON)。"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    scenarios = config.get('scenarios') or {}
+    if not scenarios:
+        raise ValueError("配置中没有任何情景 ('scenarios')")
+    for name, scenario in scenarios.items():
+        if 'dir' not in scenario or 'name' not in scenario:
+            raise ValueError(f"情景 '{name}' 缺少 'dir' 或 'name'")
+
+    for driver, (a, b) in config.get('drivers', {}).items():
+        for name in (a, b):
+            if name not in scenarios:
+                raise ValueError(f"驱动因子 '{driver}' 引用了未定义的情景 '{name}'")
+
+    reference = config.get('percentile_reference')
+    if reference is not None and reference not in scenarios:
+        raise ValueError(f"百分位阈值的参考情景 '{reference}' 未定义")
+
+    config.setdefault('stages', list(STAGE_ORDER))
+    unknown = [stage for stage in config['stages'] if stage not in STAGE_ORDER]
+    if unknown:
+        raise ValueError(f"未知的阶段: {unknown} (可选 {' / '.join(STAGE_ORDER)})")
+    config.setdefault('max_parallel_stages', 2)
+
+    # 地图的输入来自 R 脚本导出，不是流水线的输出: 缺少时在启动前报错，而不是运行到 maps 才失败
+    if "maps" in config['stages']:
+        missing = [path for path in ratio_paths(config).values() if not Path(path).exists()]
+        if missing:
+            raise ValueError(f"'maps' 阶段需要 R 脚本导出的 *_RATIO_STATS.csv (流水线中没有阶段生成它)，"
+                             f"以下文件不存在: {', '.join(missing)}；请提供这些文件 (或 'ratio_file')，"
+                             f"或从 'stages' 中去掉 'maps'")
+    return config
+
+
+def scenario_file(scenario, key, suffix):
+    """情景的输出文件: 配置中指定 key 时用指定路径，否则为 '<dir>/<name><suffix>'。"""
+    if key in scenario:
+        return str(scenario[key])
+    return str(Path(scenario['dir']) / f"{scenario['name']}{suffix}")
+
+
+def attribution_scenarios(config):
+    """归因用到的情景 (按配置中的顺序)。"""
+    used = {name for pair in config.get('drivers', {}).values() for name in pair}
+    return [name for name in config['scenarios'] if name in used]
+
+
+def ratio_paths(config):
+    """地图阶段读取的 {情景: *_RATIO_STATS.csv 路径}。"""
+    scenarios = config['scenarios']
+    return {name: scenario_file(scenarios[name], 'ratio_file', "_RATIO_STATS.csv")
+            for name in attribution_scenarios(config)}
+
+
+def build_stages(config):
+    """
+    返回 {阶段 ID: dict(stage, script, overrides, deps)}。
+    没有选中的阶段不会出现 (认为其输出已经存在)，依赖也只指向选中的阶段。
+    """
+    selected = set(config['stages'])
+    scenarios = config['scenarios']
+    thresholds = config.get('thresholds')
+    stages = {}
+
+    # 多个 means 同时运行时平分内存预算
+    budget = config.get('memory_budget_gb')
+    if budget is not None:
+        budget = budget / config['max_parallel_stages']
+
+    for name, scenario in scenarios.items():
+        if "means" in selected:
+            overrides = dict(base_dir=scenario['dir'], scenario_name=scenario['name'], memory_budget_gb=budget)
+            if config.get('models'):
+                overrides['models'] = config['models']
+            if thresholds:
+                overrides['thresholds'] = thresholds
+            if config.get('model_cubes'):
+                overrides['model_cubes'] = True
+            if config.get('shared_cube'):
+                overrides['shared_cube'] = True
+            if config.get('ensemble_spread'):
+                overrides['ensemble_spread'] = True
+            stages[f"means:{name}"] = dict(stage="means", overrides=overrides, deps=[])
+
+        if "frequency" in selected:
+            overrides = dict(base_dir=scenario['dir'], scenario_name=scenario['name'])
+            if thresholds:
+                overrides['thresholds'] = thresholds
+            deps = [f"means:{name}"] if "means" in selected else []
+            # 百分位阈值由参考情景的均值立方体计算，所以还要等参考情景的 means
+            reference = config.get('percentile_reference')
+            if reference is not None:
+                overrides['percentile_reference_dir'] = scenarios[reference]['dir']
+                if "means" in selected and reference != name:
+                    deps.append(f"means:{reference}")
+            if config.get('percentile_reference_period'):
+                overrides['percentile_reference_period'] = config['percentile_reference_period']
+            # 可选输出: 事件指标、超过频率曲线；有各模型立方体时逐模型计数
+            if config.get('event_stats'):
+                overrides['event_stats'] = True
+            if config.get('exceedance_curve'):
+                overrides['exceedance_curve'] = True
+            if config.get('model_cubes'):
+                overrides['model_frequency'] = True
+            stages[f"frequency:{name}"] = dict(stage="frequency", overrides=overrides, deps=deps)
+
+    used = attribution_scenarios(config)
+    if "attribution" in selected:
+        overrides = dict(
+            scenario_paths={name: scenario_file(scenarios[name], 'frequency_file', "_FREQUENCY_STATS.csv")
+                            for name in used},
+            drivers=config['drivers'],
+            shapefile=config['shapefile'],
+            output_dir=config['attribution_dir'],
+        )
+        if thresholds:
+            overrides['frequency_columns'] = thresholds
+        if config.get('region_layers'):
+            overrides['region_layers'] = config['region_layers']
+        if config.get('risk_ratio'):
+            overrides['risk_ratio'] = True
+        deps = [f"frequency:{name}" for name in used] if "frequency" in selected else []
+        stages["attribution"] = dict(stage="attribution", overrides=overrides, deps=deps)
+
+    if "maps" in selected:
+        overrides = dict(
+            scenario_paths=ratio_paths(config),
+            drivers=config['drivers'],
+            shapefile=config['shapefile'],
+            output_dir=config['maps_dir'],
+            coord_scenario=config.get('coord_scenario', used[0]),
+        )
+        # 输入 (RATIO_STATS) 不由任何阶段生成，可以立即启动
+        stages["maps"] = dict(stage="maps", overrides=overrides, deps=[])
+
+    if "windows" in selected:
+        # 百分位阈值的参考情景不一定参与归因，但也需要它的均值立方体 (与 frequency 使用同一组切点)
+        reference = config.get('percentile_reference')
+        needed = [name for name in scenarios if name in used or name == reference]
+        overrides = dict(
+            scenario_dirs={name: scenarios[name]['dir'] for name in used},
+            drivers=config['drivers'],
+            shapefile=config['shapefile'],
+            output_dir=config['attribution_dir'],
+        )
+        if thresholds:
+            overrides['thresholds'] = thresholds
+        if reference is not None:
+            overrides['percentile_reference_dir'] = scenarios[reference]['dir']
+        if config.get('percentile_reference_period'):
+            overrides['percentile_reference_period'] = config['percentile_reference_period']
+        overrides.update({key: config['windows'][key] for key in WINDOW_KEYS if key in config.get('windows', {})})
+        deps = [f"means:{name}" for name in needed] if "means" in selected else []
+        stages["windows"] = dict(stage="windows", overrides=overrides, deps=deps)
+
+    if "significance" in selected:
+        # 网格和 Delta_* 列来自归因主文件，重抽样读取各情景的均值立方体
+        reference = config.get('percentile_reference')
+        overrides = dict(
+            scenario_dirs={name: scenarios[name]['dir'] for name in used},
+            drivers=config['drivers'],
+            output_dir=config['attribution_dir'],
+        )
+        if thresholds:
+            overrides['thresholds'] = thresholds
+        if reference is not None:
+            overrides['percentile_reference_dir'] = scenarios[reference]['dir']
+        if config.get('percentile_reference_period'):
+            overrides['percentile_reference_period'] = config['percentile_reference_period']
+        overrides.update({key: config['significance'][key] for key in SIGNIFICANCE_KEYS
+                          if key in config.get('significance', {})})
+        needed = used + ([reference] if reference is not None and reference not in used else [])
+        deps = ([f"means:{name}" for name in needed] if "means" in selected else []) \
+            + (["attribution"] if "attribution" in selected else [])
+        stages["significance"] = dict(stage="significance", overrides=overrides, deps=deps)
+
+    for stage_id, stage in stages.items():
+        stage['script'] = STAGE_SCRIPTS[stage['stage']]
+    return stages
+
+
+def run_stage(stage_id, stage, scripts_dir, log_dir):
+    """在子进程中运行一个阶段，输出写入日志。返回 (阶段 ID, 退出码, 耗时秒)。"""
+    env = dict(os.environ)
+    env[STAGE_CONFIG_ENV] = json.dumps(stage['overrides'], ensure_ascii=False)
+    env['PYTHONIOENCODING'] = 'utf-8'
+
+    log_path = Path(log_dir) / f"{stage_id.replace(':', '_')}.log"
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, str(Path(scripts_dir) / stage['script'])],
+                                cwd=scripts_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return stage_id, result.returncode, time.perf_counter() - start
+
+
+def run_pipeline(stages, scripts_dir, log_dir, max_parallel=2, on_event=print):
+    """
+    按依赖图调度所有阶段，同时最多运行 max_parallel 个。
+    返回 {阶段 ID: dict(status, seconds)}。
+    """
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+    results = {}
+    pending = dict(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        while pending or running:
+            # 上游失败 (或被跳过) 的阶段直接跳过
+            for stage_id, stage in list(pending.items()):
+                if any(results.get(dep, {}).get('status') in (STATUS_FAILED, STATUS_SKIPPED) for dep in stage['deps']):
+                    results[stage_id] = dict(status=STATUS_SKIPPED, seconds=0.0)
+                    del pending[stage_id]
+                    on_event(f"  -- 跳过 {stage_id} (上游阶段失败)")
+
+            # 依赖全部完成的阶段立即启动
+            for stage_id, stage in list(pending.items()):
+                if len(running) >= max_parallel:
+                    break
+                if all(results.get(dep, {}).get('status') == STATUS_OK for dep in stage['deps']):
+                    running[pool.submit(run_stage, stage_id, stage, scripts_dir, log_dir)] = stage_id
+                    del pending[stage_id]
+                    on_event(f"  >> 启动 {stage_id} ({stage['script']})")
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage_id = running.pop(future)
+                try:
+                    _, code, seconds = future.result()
+                except Exception as e:
+                    code, seconds = -1, 0.0
+                    on_event(f"  !! {stage_id} 无法启动: {e}")
+                status = STATUS_OK if code == 0 else STATUS_FAILED
+                results[stage_id] = dict(status=status, seconds=seconds)
+                on_event(f"  << {stage_id}: {status} ({seconds:.1f} 秒)")
+
+    return results
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------
+# 【纬度 (或经度/高程) 带状统计】
+#
+# 所有 Delta_* 列按同一组分带一次 groupby 汇总:
+#   每个带、每个指标的 Mean / Median / Q25 / Q75 / IQR / N_Grids
+# 剖面图直接用这张小表绘制 (均值线 + 中位数线 + IQR 阴影)，
+# 不再对每一列重新排序并画出所有原始网格点。
+# -----------------------------------------------------------------
+
+PROFILE_STATS = ["Mean", "Median", "Q25", "Q75", "IQR", "N_Grids"]
+
+
+def band_edges(values, bin_width):
+    """分带的下边界 (按 bin_width 对齐，例如 1 度带: 18, 19, 20, ...)。"""
+    return np.floor(np.asarray(values, dtype=np.float64) / bin_width) * bin_width
+
+
+def zonal_profile(df, columns, by='Lat', bin_width=1.0):
+    """
+    df:        每个网格一行，包含 by 列和 columns。
+    by:        分带依据的列 ('Lat'、'Lon' 或高程等)。
+    bin_width: 带宽 (与 by 列同单位)。
+    返回长格式表: Band_Start, Band_Center, Indicator, Mean, Median, Q25, Q75, IQR, N_Grids
+    """
+    columns = list(columns)
+    band = pd.Series(band_edges(df[by], bin_width), index=df.index, name='Band_Start')
+    grouped = df[columns].groupby(band)
+
+    mean = grouped.mean()
+    count = grouped.count()
+    quantiles = grouped.quantile([0.25, 0.5, 0.75])  # 索引为 (Band_Start, 分位数)
+    q25 = quantiles.xs(0.25, level=1)
+    q50 = quantiles.xs(0.5, level=1)
+    q75 = quantiles.xs(0.75, level=1)
+
+    stats = {
+        "Mean": mean, "Median": q50, "Q25": q25, "Q75": q75, "IQR": q75 - q25, "N_Grids": count,
+    }
+    # [band, indicator] -> 按指标、再按带展开为长表
+    bands = mean.index.to_numpy()
+    profile = pd.DataFrame({
+        'Band_Start': np.tile(bands, len(columns)),
+        'Band_Center': np.tile(bands + bin_width / 2, len(columns)),
+        'Indicator': np.repeat(columns, len(bands)),
+    })
+    for name, frame in stats.items():
+        profile[name] = frame.reindex(index=bands, columns=columns).to_numpy().T.reshape(-1)
+    profile['N_Grids'] = profile['N_Grids'].astype(np.int64)
+    return profile
+
+
+def profile_figure(profile, indicator, by='Lat', title=None, y_label=None):
+    """由带状统计表绘制一个指标的剖面图: IQR 阴影 + 中位数 + 均值。"""
+    import plotly.graph_objects as go  # 只有绘图时才需要
+
+    rows = profile[profile['Indicator'] == indicator]
+    x = rows['Band_Center'].to_numpy()
+
+    fig = go.Figure([
+        go.Scatter(x=x, y=rows['Q75'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=x, y=rows['Q25'], mode='lines', line=dict(width=0), fill='tonexty',
+                   fillcolor='rgba(99, 110, 250, 0.2)', name='IQR (Q25-Q75)'),
+        go.Scatter(x=x, y=rows['Median'], mode='lines', line=dict(dash='dot'), name='Median'),
+        go.Scatter(x=x, y=rows['Mean'], mode='lines+markers', name='Mean',
+                   customdata=rows['N_Grids'], hovertemplate='%{x}: %{y:.3f} (N=%{customdata})'),
+    ])
+    fig.add_hline(y=0, line_dash="dash", line_color="grey")
+    fig.update_layout(title=title or indicator, xaxis_title=by, yaxis_title=y_label or indicator,
+                      template='plotly_white')
+    return fig
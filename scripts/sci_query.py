@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from sci_store import STORE_DIR_NAME, open_cube
+from sci_manifest import file_signature
+
+# -----------------------------------------------------------------
+# 【本地查询接口】: 归因结果 + Mean_SCI 时间序列，按网格 / 范围 / 最近点 / 区域查询
+#
+# 第一次使用时把 FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv 转换为
+# QUERY_CACHE/ 中的 .npy (float64 [grid, 指标] + Grid_ID/Lon/Lat 索引)，
+# 之后只做内存映射，不再解析 CSV；CSV 的大小或修改时间变化时自动重建。
+# 各情景的 Mean_SCI 直接内存映射 MEANS_STORE/mean_sci.*.npy，只读取被查询的网格行。
+# 所有数组都在第一次查询时才打开；区域查询使用 sci_region 缓存的隶属矩阵，
+# 不导入 geopandas / plotly。
+# 可选的 HTTP 接口 (serve) 只用标准库 http.server，返回 JSON；
+# 多线程同时发起第一次查询时只加载一次 (加锁)，缓存先写临时文件再改名，不会读到写了一半的文件。
+# -----------------------------------------------------------------
+
+QUERY_CACHE_DIR_NAME = "QUERY_CACHE"
+DEFAULT_PORT = 8765
+
+
+def _clean(value):
+    """NaN / ±inf -> None，numpy 标量 -> Python 标量 (可直接 json.dumps，输出合法 JSON)。"""
+    if isinstance(value, (np.floating, float)):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class AttributionTable:
+    """内存映射的归因结果: grid (Grid_ID/Lon/Lat，按 Grid_ID 排序)、columns、values [grid, 指标]。"""
+
+    def __init__(self, csv_path, cache_dir=None):
+        self.csv_path = Path(csv_path)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else self.csv_path.parent / QUERY_CACHE_DIR_NAME
+        self.stem = self.csv_path.stem
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _paths(self):
+        return {part: self.cache_dir / f"{self.stem}.{part}.npy" for part in ('values', 'columns', 'grid')}
+
+    def _build_cache(self):
+        df = pd.read_csv(self.csv_path).sort_values('Grid_ID')
+        columns = [c for c in df.columns if c not in ('Grid_ID', 'Lon', 'Lat')]
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        paths = self._paths()
+        arrays = {
+            'values': df[columns].to_numpy(dtype=np.float64),
+            'columns': np.array(columns, dtype=str),
+            'grid': df[['Grid_ID', 'Lon', 'Lat']].to_numpy(dtype=np.float64),
+        }
+        # 先写临时文件再改名: 其他进程不会内存映射到写了一半的文件
+        for part, array in arrays.items():
+            tmp_path = paths[part].with_name(f"{paths[part].stem}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, paths[part])
+        # 签名最后写入: 签名存在且一致时，三个数组一定已经完整
+        signature_path = self.cache_dir / f"{self.stem}.signature.json"
+        tmp_path = signature_path.with_name(f"{signature_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(file_signature([self.csv_path])), encoding='utf-8')
+        os.replace(tmp_path, signature_path)
+
+    def load(self):
+        if self._loaded:
+            return self
+        with self._lock:  # HTTP 服务的多个线程同时第一次查询时只加载一次
+            if not self._loaded:
+                self._load()
+        return self
+
+    def _load(self):
+        paths = self._paths()
+        signature_path = self.cache_dir / f"{self.stem}.signature.json"
+        current = json.loads(json.dumps(file_signature([self.csv_path])))
+        stale = (not all(p.exists() for p in paths.values()) or not signature_path.exists()
+                 or json.loads(signature_path.read_text(encoding='utf-8')) != current)
+        if stale:
+            self._build_cache()
+
+        grid = np.load(paths['grid'])
+        self.grid_ids = grid[:, 0].astype(np.int64)
+        self.lon = grid[:, 1]
+        self.lat = grid[:, 2]
+        self.columns = np.load(paths['columns']).tolist()
+        self.values = np.load(paths['values'], mmap_mode='r')
+        self._loaded = True
+
+    def rows_of(self, grid_ids):
+        """Grid_ID -> 行号 (不存在的 Grid_ID 被丢弃)。"""
+        grid_ids = np.atleast_1d(np.asarray(grid_ids, dtype=np.int64))
+        pos = np.searchsorted(self.grid_ids, grid_ids).clip(0, max(len(self.grid_ids) - 1, 0))
+        return pos[self.grid_ids[pos] == grid_ids]
+
+
+class QueryEngine:
+    """
+    attribution_csv: FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv (或任何 Grid_ID/Lon/Lat + 指标 的表)
+    scenario_dirs:   {情景名: 情景目录}，用于读取 MEANS_STORE 中的 Mean_SCI 时间序列
+    region_layers:   {图层名: {'shapefile': 路径, 'id_column': 列名}} (与 run_final_attribution.py 相同)
+    每个查询返回可直接 json.dumps 的 dict: 网格的指标 (Delta_* / 各情景频率 / RR_*)，
+    以及 (series=True 时) 各情景的 Mean_SCI 时间序列。
+    """
+
+    def __init__(self, attribution_csv, scenario_dirs=None, region_layers=None, region_mode="area"):
+        self.table = AttributionTable(attribution_csv)
+        self.scenario_dirs = {name: Path(d) for name, d in (scenario_dirs or {}).items()}
+        self.region_layers = dict(region_layers or {})
+        self.region_mode = region_mode
+        self._cubes = {}
+        self._memberships = {}
+        self._lock = threading.Lock()
+
+    # ---- 延迟打开 ----
+    def cube(self, scenario):
+        if scenario not in self._cubes:
+            self._cubes[scenario] = open_cube(self.scenario_dirs[scenario] / STORE_DIR_NAME)
+        return self._cubes[scenario]
+
+    def membership(self, layer):
+        with self._lock:  # 第一次区域查询可能要建立隶属矩阵缓存，只建立一次
+            if layer not in self._memberships:
+                self._memberships[layer] = self._load_membership(layer)
+        return self._memberships[layer]
+
+    def _load_membership(self, layer):
+        from sci_region import load_membership  # 只有区域查询才需要
+        spec = self.region_layers[layer]
+        t = self.table.load()
+        grid = pd.DataFrame({'Grid_ID': t.grid_ids, 'Lon': t.lon, 'Lat': t.lat})
+        return load_membership(grid, spec['shapefile'], spec.get('id_column'), mode=self.region_mode)
+
+    # ---- 结果组装 ----
+    def _records(self, rows, columns=None, series=False):
+        t = self.table.load()
+        columns = list(columns) if columns else t.columns
+        col_idx = [t.columns.index(c) for c in columns]
+        values = np.asarray(t.values[rows][:, col_idx]) if len(rows) else np.empty((0, len(col_idx)))
+        records = [
+            {'Grid_ID': int(t.grid_ids[r]), 'Lon': float(t.lon[r]), 'Lat': float(t.lat[r]),
+             'values': {c: _clean(v) for c, v in zip(columns, values[i])}}
+            for i, r in enumerate(rows)
+        ]
+        if series and records:
+            ids = t.grid_ids[rows]
+            for scenario in self.scenario_dirs:
+                cube = self.cube(scenario)
+                block = cube.align(ids)  # 只读取这些网格行
+                for i, record in enumerate(records):
+                    record.setdefault('series', {})[scenario] = [_clean(v) for v in block[i]]
+        return records
+
+    def _with_dates(self, result, series):
+        """返回时间序列时附上月份索引 (所有情景的立方体月份相同)。"""
+        if series and self.scenario_dirs:
+            result['dates'] = self.cube(next(iter(self.scenario_dirs))).dates.tolist()
+        return result
+
+    # ---- 查询 ----
+    def grid(self, grid_id, columns=None, series=True):
+        """单个网格 (不存在时返回 None)。"""
+        rows = self.table.load().rows_of([grid_id])
+        records = self._records(rows, columns, series)
+        return self._with_dates(records[0], series) if records else None
+
+    def bbox(self, lon_min, lon_max, lat_min, lat_max, columns=None, series=False):
+        """经纬度范围内的所有网格。"""
+        t = self.table.load()
+        rows = np.flatnonzero((t.lon >= lon_min) & (t.lon <= lon_max) & (t.lat >= lat_min) & (t.lat <= lat_max))
+        return self._with_dates({'n_grids': len(rows), 'grids': self._records(rows, columns, series)}, series)
+
+    def nearest(self, lon, lat, k=1, columns=None, series=True):
+        """离 (lon, lat) 最近的 k 个网格 (等距圆柱近似，附距离 km)。k 必须为正整数。"""
+        if int(k) < 1:
+            raise ValueError(f"k 必须为正整数: {k}")
+        t = self.table.load()
+        dx = (t.lon - lon) * np.cos(np.radians(lat))
+        dy = t.lat - lat
+        dist = np.hypot(dx, dy) * 111.195
+        k = min(int(k), len(dist))
+        rows = np.argpartition(dist, k - 1)[:k] if k else np.array([], dtype=np.intp)
+        rows = rows[np.argsort(dist[rows])]
+        records = self._records(rows, columns, series)
+        for record, r in zip(records, rows):
+            record['distance_km'] = float(dist[r])
+        return self._with_dates({'n_grids': len(rows), 'grids': records}, series)
+
+    def region(self, layer, name, columns=None, series=False):
+        """一个区域: 区域汇总 (Total / Mean，与 sci_region.region_aggregate 相同) 及区域内的网格。"""
+        from sci_region import region_aggregate
+        m = self.membership(layer)
+        if name not in m.regions:
+            return None
+        t = self.table.load()
+        columns = list(columns) if columns else t.columns
+        j = m.regions.index(name)
+        member_ids = m.grid_ids[m.weights[:, j].nonzero()[0]]
+        rows = t.rows_of(member_ids)
+
+        frame = pd.DataFrame(np.asarray(t.values[rows][:, [t.columns.index(c) for c in columns]]), columns=columns)
+        frame.insert(0, 'Grid_ID', t.grid_ids[rows])
+        summary = region_aggregate(m, frame, columns)
+        summary = summary[summary['Region'] == name]
+        return self._with_dates({
+            'layer': layer, 'region': name, 'n_grids': len(rows),
+            'summary': {row.Indicator: {'Total': _clean(row.Total), 'Mean': _clean(row.Mean), 'N_Grids': int(row.N_Grids)}
+                        for row in summary.itertuples()},
+            'grids': self._records(rows, columns, series),
+        }, series)
+
+
+# -----------------------------------------------------------------
+# 可选的本地 HTTP 接口 (只用标准库)
+#   /grid?id=123&series=1
+#   /bbox?lon_min=100&lon_max=110&lat_min=25&lat_max=35
+#   /nearest?lon=104.1&lat=30.6&k=3
+#   /region?layer=province&name=四川省
+#   columns=Delta_HA_Drought_1.0,Delta_CC_Drought_1.0 只返回指定列
+# -----------------------------------------------------------------
+def _flag(q, key, default):
+    value = q.get(key)
+    return default if value is None else value.lower() not in ('0', 'false', '')
+
+
+def handle_query(engine, path):
+    """
+    解析一个 URL (路径 + 查询参数)，返回 (HTTP 状态码, 结果)。
+    参数错误返回 400；查询本身出错 (缓存损坏、情景目录缺失等) 返回 500，服务继续运行。
+    """
+    url = urlparse(path)
+    q = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    columns = q['columns'].split(',') if q.get('columns') else None
+
+    try:
+        if url.path == '/grid':
+            result = engine.grid(int(q['id']), columns, series=_flag(q, 'series', True))
+        elif url.path == '/bbox':
+            result = engine.bbox(float(q['lon_min']), float(q['lon_max']), float(q['lat_min']), float(q['lat_max']),
+                                 columns, series=_flag(q, 'series', False))
+        elif url.path == '/nearest':
+            result = engine.nearest(float(q['lon']), float(q['lat']), int(q.get('k', 1)), columns,
+                                    series=_flag(q, 'series', True))
+        elif url.path == '/region':
+            result = engine.region(q['layer'], q['name'], columns, series=_flag(q, 'series', False))
+        elif url.path == '/columns':
+            result = engine.table.load().columns
+        else:
+            return 404, {'error': f"未知的查询: {url.path} (可用 /grid /bbox /nearest /region /columns)"}
+    except (KeyError, ValueError) as e:
+        return 400, {'error': f"参数错误: {e}"}
+    except Exception as e:
+        print(f"!! 严重错误: 查询 {path} 失败: {type(e).__name__}: {e}")
+        return 500, {'error': f"查询失败: {type(e).__name__}: {e}"}
+
+    if result is None:
+        return 404, {'error': "未找到"}
+    return 200, result
+
+
+def serve(engine, host="127.0.0.1", port=DEFAULT_PORT):
+    """启动本地 HTTP 服务 (阻塞，Ctrl+C 结束)。"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                status, result = handle_query(engine, self.path)
+                body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+            except Exception as e:  # 结果无法序列化等: 仍然返回 JSON，不中断连接
+                status = 500
+                body = json.dumps({'error': f"查询失败: {type(e).__name__}: {e}"}, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"查询服务已启动: http://{host}:{port}/  (Ctrl+C 结束)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
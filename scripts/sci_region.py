@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+
+from sci_mask import MASK_CACHE_DIR_NAME, shapefile_digest, grid_digest
+from sci_maps import grid_step
+
+# -----------------------------------------------------------------
+# 【区域汇总】: 网格 -> 区域 (流域 / 省 / 气候区) 稀疏隶属矩阵
+#
+# 每个多边形图层只做一次空间判断，得到 [grid, region] 稀疏矩阵 W:
+#   点模式:   网格中心落在区域内为 1
+#   面积模式: 网格单元 (Lon/Lat ± 半个网格) 落在区域内的面积比例 (0 ~ 1)
+# 矩阵以 “shapefile 内容哈希 + 网格定义哈希 + 模式” 为键缓存到 MASK_CACHE，
+# 之后所有指标、所有情景只需一次稀疏矩阵乘法就汇总到所有区域:
+#   Total = W^T X                      (区域总和，按面积比例分摊)
+#   Mean  = (W*A)^T X / (W*A)^T valid  (按网格面积 A 加权的区域均值)
+# 缺失值 (NaN) 不计入总和，也不计入均值的分母。
+# -----------------------------------------------------------------
+
+WEIGHT_MODES = ("point", "area")
+EARTH_RADIUS_KM = 6371.0
+REGION_STATS = ["Total", "Mean", "N_Grids", "Area_km2"]
+
+
+class RegionMembership:
+    """
+    grid_ids: 行对应的 Grid_ID (已排序)
+    regions:  列对应的区域名称
+    weights:  [grid, region] 稀疏矩阵 (CSR)
+    area_km2: 每个网格单元的面积
+    """
+
+    def __init__(self, grid_ids, regions, weights, area_km2):
+        self.grid_ids = np.asarray(grid_ids, dtype=np.int64)
+        self.regions = list(regions)
+        self.weights = sparse.csr_matrix(weights)
+        self.area_km2 = np.asarray(area_km2, dtype=np.float64)
+
+
+def cell_area_km2(lat, dx, dy):
+    """经纬度网格单元的面积 (球面)，lat 为单元中心纬度。"""
+    lat = np.asarray(lat, dtype=np.float64)
+    south = np.radians(np.clip(lat - dy / 2, -90, 90))
+    north = np.radians(np.clip(lat + dy / 2, -90, 90))
+    return EARTH_RADIUS_KM ** 2 * np.radians(dx) * (np.sin(north) - np.sin(south))
+
+
+def _compute_membership(lon, lat, dx, dy, shapefile_path, id_column, mode):
+    import geopandas as gpd  # 只有缓存未命中时才需要
+    import shapely
+
+    layer = gpd.read_file(shapefile_path).to_crs(epsg=4326)
+    names = layer[id_column].astype(str).to_numpy() if id_column else np.arange(len(layer)).astype(str)
+    tree = shapely.STRtree(layer.geometry.values)
+
+    if mode == "point":
+        points = shapely.points(lon, lat)
+        grid_idx, region_idx = tree.query(points, predicate='within')
+        weight = np.ones(len(grid_idx))
+    else:
+        # 所有 (网格单元, 区域) 候选对一次求交，权重为落在区域内的面积比例
+        boxes = shapely.box(lon - dx / 2, lat - dy / 2, lon + dx / 2, lat + dy / 2)
+        grid_idx, region_idx = tree.query(boxes, predicate='intersects')
+        inter = shapely.intersection(boxes[grid_idx], layer.geometry.values[region_idx])
+        weight = shapely.area(inter) / (dx * dy)
+        keep = weight > 0
+        grid_idx, region_idx, weight = grid_idx[keep], region_idx[keep], weight[keep]
+
+    # 同名多边形 (例如一个省的多个部分) 合并为一个区域
+    regions, region_col = np.unique(names, return_inverse=True)
+    weights = sparse.coo_matrix((weight, (grid_idx, region_col[region_idx])),
+                                shape=(len(lon), len(regions))).tocsr()
+    weights.sum_duplicates()
+    weights.data = np.minimum(weights.data, 1.0)
+    return regions, weights
+
+
+def load_membership(df, shapefile_path, id_column=None, mode="area", cache_dir=None):
+    """
+    返回 df 中网格对一个多边形图层的 RegionMembership。
+    df 需要包含 Grid_ID / Lon / Lat；id_column 为区域名称所在的列 (None 时用多边形序号)。
+    cache_dir 默认为 shapefile 所在目录下的 MASK_CACHE。
+    """
+    if mode not in WEIGHT_MODES:
+        raise ValueError(f"不支持的权重模式: {mode} (应为 {' / '.join(WEIGHT_MODES)})")
+    shapefile_path = Path(shapefile_path)
+    if not shapefile_path.exists():
+        raise FileNotFoundError(f"未找到 Shapefile: {shapefile_path}")
+
+    grid = df[['Grid_ID', 'Lon', 'Lat']].drop_duplicates('Grid_ID').sort_values('Grid_ID')
+    grid_ids, lon, lat = (grid[c].to_numpy() for c in ('Grid_ID', 'Lon', 'Lat'))
+    lon = lon.astype(np.float64)
+    lat = lat.astype(np.float64)
+    dx, dy = grid_step(lon), grid_step(lat)
+    area = cell_area_km2(lat, dx, dy)
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else shapefile_path.parent / MASK_CACHE_DIR_NAME
+    key = (f"{shapefile_digest(shapefile_path)[:16]}_{grid_digest(grid_ids, lon, lat)[:16]}"
+           f"_{id_column or 'index'}_{mode}")
+    cache_path = cache_dir / f"REGION_{key}.npz"
+    names_path = cache_dir / f"REGION_{key}.regions.csv"
+
+    if cache_path.exists() and names_path.exists():
+        regions = pd.read_csv(names_path, dtype={'Region': str})['Region'].tolist()
+        return RegionMembership(grid_ids, regions, sparse.load_npz(cache_path), area)
+
+    regions, weights = _compute_membership(lon, lat, dx, dy, shapefile_path, id_column, mode)
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    pd.DataFrame({'Region': regions}).to_csv(names_path, index=False)
+    tmp_path = cache_path.with_name(cache_path.stem + '.tmp.npz')
+    sparse.save_npz(tmp_path, weights)
+    tmp_path.replace(cache_path)
+    return RegionMembership(grid_ids, regions, weights, area)
+
+
+def region_aggregate(membership, df, columns):
+    """
+    df:      每个网格一行 (Grid_ID + columns)，不在 membership 中的网格被忽略。
+    columns: 要汇总的指标列 (各情景次数、Delta_* 等)。
+    返回长格式表: Region, Indicator, Total, Mean, N_Grids, Area_km2
+    (N_Grids 为区域内有数据的网格数，Area_km2 为区域内网格单元的总面积)
+    """
+    columns = list(columns)
+    ids = df['Grid_ID'].to_numpy(dtype=np.int64)
+    pos = np.searchsorted(membership.grid_ids, ids).clip(0, max(len(membership.grid_ids) - 1, 0))
+    found = membership.grid_ids[pos] == ids
+
+    n_grid, k = len(membership.grid_ids), len(columns)
+    x = np.full((n_grid, k), np.nan)
+    x[pos[found]] = df.loc[found, columns].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(x)
+
+    # [X | valid | 1] 与 [W | W*A | W>0] 一次稀疏矩阵乘法
+    y = np.hstack([np.where(valid, x, 0.0), valid, np.ones((n_grid, 1))])
+    w = membership.weights
+    w_area = w.multiply(membership.area_km2[:, None]).tocsr()
+    w_member = w.copy()
+    w_member.data = (w_member.data > 0).astype(np.float64)
+    out = sparse.hstack([w, w_area, w_member]).T.tocsr() @ y
+
+    n_region = len(membership.regions)
+    plain, by_area, member = out[:n_region], out[n_region:2 * n_region], out[2 * n_region:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = by_area[:, :k] / by_area[:, k:2 * k]
+
+    return pd.DataFrame({
+        'Region': np.repeat(membership.regions, k),
+        'Indicator': np.tile(columns, n_region),
+        'Total': plain[:, :k].reshape(-1),
+        'Mean': mean.reshape(-1),
+        'N_Grids': member[:, k:2 * k].reshape(-1).astype(np.int64),
+        'Area_km2': np.repeat(by_area[:, -1], k),
+    })
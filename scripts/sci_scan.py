@@ -0,0 +1,189 @@
+import re
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sci_netcdf import suffix_grid_range
+
+# -----------------------------------------------------------------
+# 【完整性扫描】: 情景 x 模型 x 批次
+#
+# 每个原始批次文件 {model}_grids_X_Y.csv 只做廉价检查:
+#   1. 是否存在、文件大小
+#   2. 标题行是否为 CORRECT_COLUMN_NAMES
+#   3. 只投影 Grid_ID / Date 两列 (C 引擎)，检查
+#      网格覆盖 (X..Y 是否都在) 和日期覆盖 (每个网格是否有全部月份)
+# 批次后缀取所有情景、所有模型的并集，并按常见批次宽度补上中间的缺口，
+# 因此整批缺失 (所有模型都没有) 的批次也能被发现。
+# -----------------------------------------------------------------
+
+EXPECTED_PERIOD = ("1980-01-01", "2014-12-01")
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"
+STATUS_EMPTY = "empty"
+STATUS_UNREADABLE = "unreadable"
+STATUS_INCOMPLETE = "incomplete"
+
+# 空行 (只有空白字符)；C 引擎读取时跳过这些行
+BLANK_LINE = re.compile(rb"^[ \t\r]*\n", re.MULTILINE)
+
+
+def expected_dates(period=EXPECTED_PERIOD):
+    """逐月日期 ('1980-01-01' ... '2014-12-01')。"""
+    return pd.date_range(period[0], period[1], freq='MS').strftime('%Y-%m-%d').to_numpy()
+
+
+def discover_suffixes(scenario_dirs, models):
+    """所有情景、所有模型出现过的批次后缀 (只看文件名，不打开文件)。"""
+    suffixes = set()
+    for scenario_dir in scenario_dirs:
+        for mod in models:
+            suffixes.update(f.name.replace(f"{mod}_", "", 1) for f in Path(scenario_dir).glob(f"{mod}_grids_*.csv"))
+    return suffixes
+
+
+def fill_gaps(suffixes):
+    """
+    按 Grid_ID 排序后补上批次之间的缺口。
+    缺口按最常见的批次宽度切分，例如缺少 161-480 且宽度为 160 时补
+    'grids_161_320.csv' 和 'grids_321_480.csv'。
+    """
+    ranges = sorted(suffix_grid_range(s) for s in suffixes)
+    if not ranges:
+        return []
+    widths = [end - start + 1 for start, end in ranges]
+    width = max(set(widths), key=widths.count)
+
+    filled = list(ranges)
+    for (_, prev_end), (next_start, _) in zip(ranges, ranges[1:]):
+        for start in range(prev_end + 1, next_start, width):
+            filled.append((start, min(start + width - 1, next_start - 1)))
+    return [f"grids_{start}_{end}.csv" for start, end in sorted(filled)]
+
+
+def _count_lines(path, block_size=1 << 20):
+    """
+    返回 (数据行数, 数据行中的逗号数)。只统计字节，不解析；
+    空行不计入行数 (与 C 引擎和 sci_ingest._data_line_numbers 一致)。
+    逗号总数与 行数 x (列数 - 1) 不符说明有字段数错误的行。
+    """
+    n_lines = 0
+    n_commas = 0
+    header_commas = None
+    carry = b""  # 上一块末尾不完整的行
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_commas += block.count(b",")
+            # 只在完整的行上统计 (块边界可能切在行中间)
+            block = carry + block
+            cut = block.rfind(b"\n") + 1
+            complete, carry = block[:cut], block[cut:]
+            if header_commas is None and complete:
+                header_commas = complete.split(b"\n", 1)[0].count(b",")
+            n_lines += complete.count(b"\n") - len(BLANK_LINE.findall(complete))
+    if carry.strip():
+        n_lines += 1  # 最后一行没有换行符
+        if header_commas is None:  # 整个文件只有一行 (标题行)
+            header_commas = carry.count(b",")
+    return max(n_lines - 1, 0), n_commas - (header_commas or 0)
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        line = f.readline().decode('latin-1').strip()
+    return [name.strip().strip('"') for name in line.split(',')]
+
+
+def scan_file(task):
+    """
+    检查一个原始批次文件 (可在工人进程中运行)。
+    task: dict(scenario, model, suffix, path, column_names, dates)
+    返回一行报告 (dict)。
+    """
+    path = Path(task['path'])
+    column_names = task['column_names']
+    dates = task['dates']
+    start, end = suffix_grid_range(task['suffix'])
+    expected_ids = np.arange(start, end + 1)
+
+    report = {
+        'Scenario': task['scenario'], 'Model': task['model'], 'Batch': task['suffix'],
+        'Status': STATUS_OK, 'Size_Bytes': 0, 'Rows': 0, 'Bad_Lines': 0, 'Header_OK': False,
+        'Missing_Grids': len(expected_ids), 'Missing_Months': len(expected_ids) * len(dates), 'Issue': '',
+    }
+
+    if not path.exists():
+        report.update(Status=STATUS_MISSING, Issue='文件不存在')
+        return report
+    report['Size_Bytes'] = path.stat().st_size
+    if report['Size_Bytes'] == 0:
+        report.update(Status=STATUS_EMPTY, Issue='空文件')
+        return report
+
+    issues = []
+    report['Header_OK'] = _read_header(path) == list(column_names)
+    if not report['Header_OK']:
+        issues.append('标题行损坏')
+
+    try:
+        # 只投影两列；坏行直接跳过 (按行数差计入 Bad_Lines)
+        df = pd.read_csv(
+            path, engine='c', encoding='latin-1', header=None, skiprows=1, names=column_names,
+            usecols=['Grid_ID', 'Date'], dtype={'Grid_ID': 'float64', 'Date': 'str'}, on_bad_lines='skip',
+        )
+    except Exception as e:
+        report.update(Status=STATUS_UNREADABLE, Issue=f'无法读取: {e}')
+        return report
+
+    n_lines, n_commas = _count_lines(path)
+    report['Rows'] = len(df)
+    report['Bad_Lines'] = max(n_lines - len(df), 0)
+    if report['Bad_Lines']:
+        issues.append(f"{report['Bad_Lines']} 行无法解析")
+    # 多出字段的行在只投影两列时不会报错，但 'calculate_means.py' 会把它们隔离
+    if not report['Bad_Lines'] and n_commas != n_lines * (len(column_names) - 1):
+        report['Bad_Lines'] = 1  # 至少 1 行 (只看逗号数无法知道具体行数)
+        issues.append("存在字段数错误的行")
+
+    # [grid, month] 覆盖矩阵
+    grid_pos = pd.Index(expected_ids).get_indexer(df['Grid_ID'].to_numpy())
+    date_pos = pd.Index(dates).get_indexer(df['Date'].astype(str).str.slice(0, 10).to_numpy())
+    valid = (grid_pos >= 0) & (date_pos >= 0)
+    covered = np.zeros((len(expected_ids), len(dates)), dtype=bool)
+    covered[grid_pos[valid], date_pos[valid]] = True
+
+    report['Missing_Grids'] = int((~covered.any(axis=1)).sum())
+    report['Missing_Months'] = int((~covered).sum())
+    if report['Missing_Grids']:
+        issues.append(f"缺少 {report['Missing_Grids']} 个网格")
+    partial = int(((~covered).any(axis=1) & covered.any(axis=1)).sum())
+    if partial:
+        issues.append(f"{partial} 个网格月份不全")
+    if (~valid).sum():
+        issues.append(f"{int((~valid).sum())} 行 Grid_ID/Date 超出批次范围")
+
+    if report['Missing_Months'] or report['Bad_Lines']:
+        report['Status'] = STATUS_INCOMPLETE
+    report['Issue'] = '; '.join(issues)
+    return report
+
+
+def scan_tasks(scenario_dirs, models, suffixes, column_names, dates):
+    """scenario_dirs: {情景名: 目录}。返回所有 (情景, 模型, 批次) 的任务列表。"""
+    return [
+        dict(scenario=name, model=mod, suffix=suffix, path=str(Path(scenario_dir) / f"{mod}_{suffix}"),
+             column_names=list(column_names), dates=dates)
+        for name, scenario_dir in scenario_dirs.items()
+        for mod in models
+        for suffix in suffixes
+    ]
+
+
+def rerun_list(report):
+    """需要重新生成的 (情景, 模型, 批次)；标题行损坏但数据完整的文件不需要重跑。"""
+    rerun = report[report['Status'] != STATUS_OK]
+    return rerun[['Scenario', 'Model', 'Batch', 'Status', 'Issue']].reset_index(drop=True)
@@ -0,0 +1,115 @@
+import sys
+from pathlib import Path
+
+from sci_netcdf import suffix_grid_range
+
+# -----------------------------------------------------------------
+# 【内存预算调度】: 按内存预算决定并行数，必要时把大批次按网格范围拆分
+#
+# 1. 估算: 由文件大小和前 64 KB 的平均行长估算行数，
+#    再按列类型 (float64 / 字符串 Date) 估算每行在内存中的字节数。
+#    一个任务的峰值 ≈ 解析最大的单个模型文件 + 所有模型保留下来的子集 (及其堆叠)。
+# 2. 拆分: 每个任务的预算为 总预算 / 最大并行数，超过的批次按网格范围拆成子批次，
+#    子批次以 'grids_X_Y.csv' 的形式写入 MEANS_STORE，与普通批次完全相同。
+#    每个源文件先扫描一次建立行索引 (sci_ingest.grid_line_index)，子批次只读取并解析
+#    自己网格的字节，所以解析和保留的数据都随子批次数成比例减少；
+#    每个子范围的结果单独写入 RAW_CACHE，重新运行时不再解析。
+#    拆到每个子批次只有一个网格仍超过预算时，任务标记为 over_budget，由调用方警告。
+# 3. 并行数: min(最大并行数, 总预算 // 最大任务峰值)。
+# -----------------------------------------------------------------
+
+SAMPLE_BYTES = 1 << 16
+
+# 一行在 DataFrame 中的字节数: 数值列为 float64，Date 为 Python 字符串对象 (指针 + 对象)
+NUMERIC_BYTES = 8
+STRING_BYTES = 8 + sys.getsizeof("1980-01-01")
+
+# 解析 CSV 时 (分词缓冲、类型转换) 的放大系数，以及保留数据在拼接 / 堆叠 / 归约时的放大系数
+PARSE_FACTOR = 3.0
+KEEP_FACTOR = 4.0
+
+
+def row_bytes(column_names):
+    """一行长格式数据在内存中的字节数。"""
+    return sum(STRING_BYTES if col == 'Date' else NUMERIC_BYTES for col in column_names)
+
+
+def estimate_rows(path):
+    """由文件大小和开头样本的平均行长估算数据行数 (不解析整个文件)。"""
+    path = Path(path)
+    if not path.exists():
+        return 0
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+    lines = sample.count(b"\n")
+    if lines <= 1:
+        return 1 if size else 0
+    header_len = sample.index(b"\n") + 1
+    line_len = (len(sample[:sample.rindex(b"\n") + 1]) - header_len) / (lines - 1)
+    return int((size - header_len) / max(line_len, 1))
+
+
+def _parse_bytes(file_rows, column_names):
+    """解析最大的单个模型文件 (拆分后子批次只解析自己的行，随子批次数成比例减少)。"""
+    return PARSE_FACTOR * max(file_rows) * row_bytes(column_names)
+
+
+def _keep_bytes(file_rows, column_names):
+    """所有模型保留下来的数据及其拼接 / 堆叠 (随子批次数成比例减少)。"""
+    return KEEP_FACTOR * sum(file_rows) * row_bytes(column_names)
+
+
+def estimate_task_bytes(file_rows, column_names, n_splits=1):
+    """
+    file_rows: 该批次每个模型文件的行数估计。
+    返回拆成 n_splits 个子批次时，单个子批次的峰值内存估计 (字节)。
+    """
+    if not file_rows:
+        return 0
+    return int((_parse_bytes(file_rows, column_names) + _keep_bytes(file_rows, column_names)) / n_splits)
+
+
+def split_range(start, end, n_splits):
+    """把 [start, end] 均分为 n_splits 段 (整数网格范围)。"""
+    n = end - start + 1
+    n_splits = max(1, min(n_splits, n))
+    bounds = [start + (n * i) // n_splits for i in range(n_splits + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(n_splits)]
+
+
+def plan_tasks(batch_rows, column_names, budget_bytes, max_workers):
+    """
+    batch_rows:   {批次后缀: [每个模型文件的行数估计]}
+    budget_bytes: 所有工人合计可用的内存 (字节)；None 表示不限制。
+    返回 (tasks, workers)。每个任务是 dict:
+      source     原始批次后缀 (读取的文件)
+      suffix     输出批次后缀 (拆分后为子范围)
+      grid_range (起始 Grid_ID, 结束 Grid_ID)，未拆分时为 None
+      bytes      峰值内存估计
+      over_budget 拆到最细 (每个子批次一个网格) 仍超过每个任务的预算
+    """
+    per_task_budget = budget_bytes / max_workers if budget_bytes else None
+
+    tasks = []
+    for suffix, file_rows in batch_rows.items():
+        n_splits = 1
+        whole = estimate_task_bytes(file_rows, column_names)
+        if per_task_budget and whole > per_task_budget:
+            start, end = suffix_grid_range(suffix)
+            n_splits = int(min(end - start + 1, -(-whole // per_task_budget)))
+
+        est = estimate_task_bytes(file_rows, column_names, n_splits)
+        over_budget = bool(per_task_budget) and est > per_task_budget
+        if n_splits == 1:
+            tasks.append(dict(source=suffix, suffix=suffix, grid_range=None, bytes=est, over_budget=over_budget))
+            continue
+        for lo, hi in split_range(*suffix_grid_range(suffix), n_splits):
+            tasks.append(dict(source=suffix, suffix=f"grids_{lo}_{hi}.csv", grid_range=(lo, hi), bytes=est,
+                              over_budget=over_budget))
+
+    if not budget_bytes or not tasks:
+        return tasks, max_workers
+    largest = max(t['bytes'] for t in tasks)
+    workers = int(max(1, min(max_workers, budget_bytes // max(largest, 1))))
+    return tasks, workers
@@ -0,0 +1,347 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import os
+import re
+
+# -----------------------------------------------------------------
+# 【中间结果存储】: 替代 TEMP_MEANS / TEMP_STATS 的 CSV 文本文件
+#
+# 每个情景目录下有一个 MEANS_STORE 文件夹:
+#   grids_1_160.values.npy   float32 [grid, month] 均值立方体 (单个批次)
+#   grids_1_160.grid.npy     Grid_ID / Lon / Lat 索引 (按 Grid_ID 排序)
+#   grids_1_160.dates.npy    月份索引 (与 values 的列一一对应)
+#   mean_sci.values.npy ...  consolidate() 之后整个情景的合并立方体
+#
+# 下游脚本用 np.load(mmap_mode='r') 内存映射读取，只读取需要的网格行，
+# 不再有任何文本格式化/解析。
+# -----------------------------------------------------------------
+
+STORE_DIR_NAME = "MEANS_STORE"
+CUBE_STEM = "mean_sci"
+PARTIAL_STEM = f"{CUBE_STEM}.partial"  # 共享立方体写入过程中的文件 (见第 4 节)
+
+GRID_DTYPE = np.dtype([('Grid_ID', '<i8'), ('Lon', '<f8'), ('Lat', '<f8')])
+DATE_DTYPE = np.dtype('<U10')
+VALUE_DTYPE = np.float32
+
+
+class SciCube:
+    """
+    一个 [grid, month] 立方体及其 Grid_ID / 日期索引。
+    values 可以是普通数组，也可以是内存映射 (np.memmap)。
+    """
+
+    def __init__(self, grid, dates, values):
+        self.grid = grid
+        self.dates = dates
+        self.values = values
+
+    @property
+    def grid_ids(self):
+        return self.grid['Grid_ID']
+
+    @property
+    def lon(self):
+        return self.grid['Lon']
+
+    @property
+    def lat(self):
+        return self.grid['Lat']
+
+    def __len__(self):
+        return len(self.grid)
+
+    def rows(self, start, stop):
+        """按行号切片 (内存映射时只会读取这一段)。"""
+        return SciCube(self.grid[start:stop], self.dates, self.values[start:stop])
+
+    def select(self, grid_ids):
+        """按 Grid_ID 选取网格 (Grid_ID 已排序，用 searchsorted 定位)。"""
+        grid_ids = np.asarray(grid_ids, dtype='<i8')
+        pos = np.searchsorted(self.grid_ids, grid_ids).clip(0, max(len(self.grid) - 1, 0))
+        pos = pos[self.grid_ids[pos] == grid_ids]  # 丢弃不存在的 Grid_ID
+        return SciCube(self.grid[pos], self.dates, np.asarray(self.values[pos]))
+
+    def align(self, grid_ids):
+        """
+        按给定 Grid_ID 顺序返回 [len(grid_ids), month] 数组，
+        立方体中不存在的 Grid_ID 对应整行 NaN。
+        """
+        grid_ids = np.asarray(grid_ids, dtype='<i8')
+        pos = np.searchsorted(self.grid_ids, grid_ids).clip(0, max(len(self.grid) - 1, 0))
+        found = self.grid_ids[pos] == grid_ids
+        out = np.full((len(grid_ids), len(self.dates)), np.nan, dtype=VALUE_DTYPE)
+        out[found] = self.values[pos[found]]
+        return out
+
+    def grid_frame(self):
+        """返回 Grid_ID / Lon / Lat 三列的 DataFrame。"""
+        return pd.DataFrame({
+            'Grid_ID': self.grid_ids, 'Lon': self.lon, 'Lat': self.lat
+        })
+
+    def to_frame(self, value_col='Mean_SCI'):
+        """转换回旧的长格式 (Grid_ID, Lon, Lat, Date, Mean_SCI)，仅用于兼容。"""
+        n_grid, n_month = self.values.shape
+        return pd.DataFrame({
+            'Grid_ID': np.repeat(self.grid_ids, n_month),
+            'Lon': np.repeat(self.lon, n_month),
+            'Lat': np.repeat(self.lat, n_month),
+            'Date': np.tile(self.dates, n_grid),
+            value_col: np.asarray(self.values).reshape(-1),
+        })
+
+
+# -----------------------------------------------------------------
+# 1. 长格式 -> 立方体
+# -----------------------------------------------------------------
+def long_to_cube(df, value_col='Mean_SCI'):
+    """
+    将 (Grid_ID, Lon, Lat, Date, value) 长格式表转换为 SciCube。
+    缺失的 (grid, month) 组合填 NaN；重复的 (grid, month) 取非 NaN 值的平均
+    (与原来 groupby(...).mean() 相同)。
+    """
+    grid_ids, grid_pos = np.unique(df['Grid_ID'].to_numpy(dtype='<i8'), return_inverse=True)
+    dates, date_pos = np.unique(df['Date'].astype(str).to_numpy(dtype=DATE_DTYPE), return_inverse=True)
+
+    values = np.full((len(grid_ids), len(dates)), np.nan, dtype=VALUE_DTYPE)
+    flat = grid_pos * len(dates) + date_pos
+    column = df[value_col].to_numpy(dtype=np.float64)
+    if len(np.unique(flat)) == len(flat):
+        values[grid_pos, date_pos] = column
+    else:
+        # 有重复行时按位置累加求平均 (只有少数损坏的文件会走这里)
+        valid = ~np.isnan(column)
+        total = np.bincount(flat[valid], weights=column[valid], minlength=values.size)
+        count = np.bincount(flat[valid], minlength=values.size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = (total / count).astype(VALUE_DTYPE).reshape(values.shape)
+
+    grid = np.zeros(len(grid_ids), dtype=GRID_DTYPE)
+    grid['Grid_ID'] = grid_ids
+    # 每个网格取第一次出现的坐标
+    first = np.zeros(len(grid_ids), dtype=np.intp)
+    first[grid_pos[::-1]] = np.arange(len(grid_pos))[::-1]
+    grid['Lon'] = df['Lon'].to_numpy(dtype='<f8')[first]
+    grid['Lat'] = df['Lat'].to_numpy(dtype='<f8')[first]
+
+    return SciCube(grid, dates, values)
+
+
+# -----------------------------------------------------------------
+# 2. 读写单个批次
+# -----------------------------------------------------------------
+def batch_stem(suffix):
+    """'grids_1_160.csv' -> 'grids_1_160'"""
+    return Path(suffix).name.replace('.csv', '')
+
+
+def natural_key(stem):
+    """'grids_161_320' 排在 'grids_1001_1160' 之前 (按网格编号而非字符串排序)。"""
+    return [int(tok) if tok.isdigit() else tok for tok in re.split(r'(\d+)', stem)]
+
+
+def batch_files(store_dir, stem):
+    """一个批次 (或合并立方体) 在磁盘上的三个文件。"""
+    store_dir = Path(store_dir)
+    return [store_dir / f"{stem}.{part}.npy" for part in ('values', 'dates', 'grid')]
+
+
+def _save_atomic(path, arr):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def write_batch(store_dir, suffix, cube):
+    """
+    保存一个批次。grid 索引文件最后写入，作为“批次已完成”的标志，
+    这样中断的写入不会被下游当作有效批次。
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(exist_ok=True, parents=True)
+    stem = batch_stem(suffix)
+
+    _save_atomic(store_dir / f"{stem}.values.npy", np.asarray(cube.values, dtype=VALUE_DTYPE))
+    _save_atomic(store_dir / f"{stem}.dates.npy", np.asarray(cube.dates, dtype=DATE_DTYPE))
+    _save_atomic(store_dir / f"{stem}.grid.npy", np.asarray(cube.grid, dtype=GRID_DTYPE))
+    return stem
+
+
+def open_batch(store_dir, stem, mmap_mode='r'):
+    store_dir = Path(store_dir)
+    return SciCube(
+        np.load(store_dir / f"{stem}.grid.npy"),
+        np.load(store_dir / f"{stem}.dates.npy"),
+        np.load(store_dir / f"{stem}.values.npy", mmap_mode=mmap_mode),
+    )
+
+
+def list_batches(store_dir):
+    """返回所有已完成批次的 stem，按网格编号自然排序 (不含合并立方体)。"""
+    store_dir = Path(store_dir)
+    stems = [p.name[:-len('.grid.npy')] for p in store_dir.glob("*.grid.npy")]
+    stems = [s for s in stems if s not in (CUBE_STEM, PARTIAL_STEM)]
+    return sorted(stems, key=natural_key)
+
+
+# -----------------------------------------------------------------
+# 3. 合并为整个情景的立方体
+# -----------------------------------------------------------------
+def consolidate(store_dir, stems=None):
+    """
+    将所有批次按 Grid_ID 顺序合并为 mean_sci.*.npy。
+    逐批次写入内存映射文件，峰值内存只有一个批次。
+    """
+    store_dir = Path(store_dir)
+    stems = list_batches(store_dir) if stems is None else stems
+    if not stems:
+        raise FileNotFoundError(f"{store_dir} 中没有任何已完成的批次")
+
+    batches = [open_batch(store_dir, s) for s in stems]
+
+    # 所有批次的月份索引取并集 (正常情况下完全相同)
+    dates = batches[0].dates
+    for b in batches[1:]:
+        if not np.array_equal(b.dates, dates):
+            dates = np.union1d(dates, b.dates)
+
+    grid = np.concatenate([b.grid for b in batches])
+    order = np.argsort(grid['Grid_ID'], kind='stable')
+    grid = grid[order]
+    if np.any(np.diff(grid['Grid_ID']) == 0):
+        raise ValueError("不同批次中存在重复的 Grid_ID")
+
+    tmp_values = store_dir / f"{CUBE_STEM}.values.npy.tmp"
+    out = np.lib.format.open_memmap(tmp_values, mode='w+', dtype=VALUE_DTYPE,
+                                    shape=(len(grid), len(dates)))
+    # 每个批次在合并立方体中的行号
+    row_of = np.empty(len(grid), dtype=np.intp)
+    row_of[order] = np.arange(len(grid))
+
+    offset = 0
+    for b in batches:
+        rows = row_of[offset:offset + len(b)]
+        offset += len(b)
+        if np.array_equal(b.dates, dates):
+            out[rows] = b.values
+        else:
+            block = np.full((len(b), len(dates)), np.nan, dtype=VALUE_DTYPE)
+            block[:, np.searchsorted(dates, b.dates)] = b.values
+            out[rows] = block
+    out.flush()
+    del out
+    os.replace(tmp_values, store_dir / f"{CUBE_STEM}.values.npy")
+
+    _save_atomic(store_dir / f"{CUBE_STEM}.dates.npy", np.asarray(dates, dtype=DATE_DTYPE))
+    _save_atomic(store_dir / f"{CUBE_STEM}.grid.npy", grid)
+    return store_dir / f"{CUBE_STEM}.values.npy"
+
+
+def open_cube(store_dir, mmap_mode='r'):
+    """内存映射打开整个情景的合并立方体。"""
+    return open_batch(store_dir, CUBE_STEM, mmap_mode=mmap_mode)
+
+
+# -----------------------------------------------------------------
+# 4. 共享立方体: 工人直接写入预先分配的合并立方体
+#
+# 父进程按每个批次的 Grid_ID 范围分配行 (第 i 行 = 起始行 + Grid_ID - 范围起点)，
+# 预先创建 mean_sci.partial.*.npy (值全为 NaN，Grid_ID 全为 -1)。
+# 工人以 r+ 方式内存映射打开，把本批次的结果写到自己的行，
+# 只向父进程返回成功与否，不序列化任何数组，也不写批次文件。
+# 所有批次完成后 finalize_shared_cube() 把 partial 文件改名为 mean_sci.*.npy
+# (没有空缺行时不复制任何数据)。
+# -----------------------------------------------------------------
+def allocate_shared_cube(store_dir, n_rows, dates, chunk_rows=4096):
+    """预先分配 [n_rows, month] 的共享立方体 (逐块填 NaN，峰值内存只有一块)。"""
+    store_dir = Path(store_dir)
+    store_dir.mkdir(exist_ok=True, parents=True)
+    values = np.lib.format.open_memmap(store_dir / f"{PARTIAL_STEM}.values.npy", mode='w+',
+                                       dtype=VALUE_DTYPE, shape=(n_rows, len(dates)))
+    for start in range(0, n_rows, chunk_rows):
+        values[start:start + chunk_rows] = np.nan
+    values.flush()
+    del values
+
+    grid = np.lib.format.open_memmap(store_dir / f"{PARTIAL_STEM}.grid.npy", mode='w+',
+                                     dtype=GRID_DTYPE, shape=(n_rows,))
+    grid['Grid_ID'] = -1
+    grid.flush()
+    del grid
+    _save_atomic(store_dir / f"{PARTIAL_STEM}.dates.npy", np.asarray(dates, dtype=DATE_DTYPE))
+
+
+def write_shared_rows(store_dir, row_start, range_start, cube):
+    """
+    (工人中调用) 把一个批次写入共享立方体: Grid_ID g 写到第 row_start + g - range_start 行。
+    批次的月份必须是共享立方体月份的子集。grid 最后写入，作为这些行已完成的标志。
+    """
+    store_dir = Path(store_dir)
+    dates = np.load(store_dir / f"{PARTIAL_STEM}.dates.npy")
+    rows = row_start + np.asarray(cube.grid_ids, dtype=np.int64) - range_start
+
+    values = np.load(store_dir / f"{PARTIAL_STEM}.values.npy", mmap_mode='r+')
+    if not (0 <= rows.min() and rows.max() < len(values)):
+        raise ValueError(f"Grid_ID 超出本批次分配的行范围: {cube.grid_ids[0]} - {cube.grid_ids[-1]}")
+    if np.array_equal(cube.dates, dates):
+        values[rows] = cube.values
+    else:
+        cols = np.searchsorted(dates, cube.dates).clip(0, len(dates) - 1)
+        if not np.array_equal(dates[cols], cube.dates):
+            raise ValueError("批次的月份不在共享立方体的月份索引中")
+        block = np.full((len(rows), len(dates)), np.nan, dtype=VALUE_DTYPE)
+        block[:, cols] = cube.values
+        values[rows] = block
+    values.flush()
+    del values
+
+    grid = np.load(store_dir / f"{PARTIAL_STEM}.grid.npy", mmap_mode='r+')
+    grid[rows] = cube.grid
+    grid.flush()
+    del grid
+
+
+def finalize_shared_cube(store_dir, chunk_rows=4096):
+    """
+    partial -> mean_sci.*.npy。所有行都已写入时只是改名 (零复制)；
+    有空缺行 (批次范围内不存在的 Grid_ID 或失败的批次) 时，逐块复制有效行。
+    返回有效网格数。
+    """
+    store_dir = Path(store_dir)
+    grid = np.load(store_dir / f"{PARTIAL_STEM}.grid.npy")
+    present = grid['Grid_ID'] >= 0
+    n_valid = int(present.sum())
+    if n_valid == 0:
+        raise ValueError(f"{store_dir} 的共享立方体中没有任何已完成的批次")
+
+    if present.all():
+        os.replace(store_dir / f"{PARTIAL_STEM}.values.npy", store_dir / f"{CUBE_STEM}.values.npy")
+    else:
+        values = np.load(store_dir / f"{PARTIAL_STEM}.values.npy", mmap_mode='r')
+        tmp_values = store_dir / f"{CUBE_STEM}.values.npy.tmp"
+        out = np.lib.format.open_memmap(tmp_values, mode='w+', dtype=VALUE_DTYPE,
+                                        shape=(n_valid, values.shape[1]))
+        offset = 0
+        for start in range(0, len(grid), chunk_rows):
+            keep = present[start:start + chunk_rows]
+            block = values[start:start + chunk_rows][keep]
+            out[offset:offset + len(block)] = block
+            offset += len(block)
+        out.flush()
+        del out, values
+        os.replace(tmp_values, store_dir / f"{CUBE_STEM}.values.npy")
+        (store_dir / f"{PARTIAL_STEM}.values.npy").unlink()
+
+    os.replace(store_dir / f"{PARTIAL_STEM}.dates.npy", store_dir / f"{CUBE_STEM}.dates.npy")
+    _save_atomic(store_dir / f"{CUBE_STEM}.grid.npy", grid[present])
+    (store_dir / f"{PARTIAL_STEM}.grid.npy").unlink()
+    return n_valid
+
+
+def discard_shared_cube(store_dir):
+    """删除预先分配的 partial 文件 (有批次失败时不发布不完整的立方体)。"""
+    for path in batch_files(store_dir, PARTIAL_STEM):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sci_index import compute_sci
+
+# -----------------------------------------------------------------
+# 【合成数据】: 与 R 脚本导出格式相同的 {model}_grids_X_Y.csv 目录
+#
+# 没有真实的多 GB 情景数据时，用于测试和基准测试:
+#   - 列名与 CORRECT_COLUMN_NAMES 相同: Grid_ID, Lon, Lat, Date, Qtot, SCI
+#   - 7 个模型、1980-01 ~ 2014-12 共 420 个月、任意网格数、每批 160 个网格
+#   - 网格为中国范围内的规则经纬网格 (网格数越多分辨率越细)
+#   - Qtot: 每个网格有自己的量级和季节循环，模型之间有系统偏差，
+#     情景之间用 log(Qtot) 的线性趋势区分 (产生归因信号)
+#   - SCI: 由 Qtot 用 compute_sci 计算 (与 R 脚本相同的经验分布方法)
+#   - 可选: 损坏标题行、插入无法解析的坏行 (用于检验诊断和隔离逻辑)
+# 同时生成 RATIO_STATS (地图脚本的输入) 和一个简单的边界 shapefile。
+# -----------------------------------------------------------------
+
+SYNTHETIC_MODELS = [
+    "h08", "hydropy", "jules-w2", "lpjml5-7-10-fire",
+    "miroc-integ-land", "watergap2-2e", "web-dhm-sg"
+]
+SYNTHETIC_COLUMNS = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+SYNTHETIC_PERIOD = ("1980-01-01", "2014-12-01")
+SYNTHETIC_BATCH_SIZE = 160
+
+# 中国范围 (经度, 纬度)
+CHINA_BBOX = (73.0, 18.0, 135.0, 54.0)
+
+# 边界多边形 (粗略的中国轮廓，只用于测试掩膜；范围外的网格会被筛掉)
+BOUNDARY_VERTICES = [
+    (74.0, 39.0), (80.0, 45.0), (87.0, 49.0), (97.0, 43.0), (111.0, 43.0), (120.0, 52.0),
+    (134.0, 48.0), (131.0, 42.0), (122.0, 40.0), (122.0, 30.0), (118.0, 24.0), (110.0, 20.0),
+    (100.0, 22.0), (97.0, 28.0), (88.0, 27.0), (79.0, 31.0),
+]
+
+# 损坏的标题行 (R 导出时偶尔出现的截断 / 乱码)
+CORRUPT_HEADERS = ["Grid_ID,Lon,Lat,Dat", "V1,V2,V3,V4,V5,V6", "Grid_ID;Lon;Lat;Date;Qtot;SCI"]
+# 无法解析的坏行
+BAD_LINES = ["NA,NA,NA,NA,NA,NA", "1,2,3", "garbage line without fields", "12,100.25,30.75,1990-01-01,0.5,0.1,9.9"]
+
+
+def synthetic_dates(period=SYNTHETIC_PERIOD):
+    """逐月日期字符串 (默认 420 个月)。"""
+    return pd.date_range(period[0], period[1], freq='MS').strftime('%Y-%m-%d').to_numpy()
+
+
+def synthetic_grid(n_grids, bbox=CHINA_BBOX):
+    """
+    在 bbox 内的规则经纬网格上均匀选取 n_grids 个网格 (Grid_ID 从 1 开始)。
+    分辨率按网格数自动选择 (2 度起逐次减半，直到网格足够)，
+    编号顺序与 R 导出一致: 经度从西到东，同一经度内纬度从北到南。
+    """
+    lon_min, lat_min, lon_max, lat_max = bbox
+    resolution = 2.0
+    while int((lon_max - lon_min) / resolution) * int((lat_max - lat_min) / resolution) < n_grids:
+        resolution /= 2
+
+    lon_axis = lon_min + resolution / 2 + resolution * np.arange(int((lon_max - lon_min) / resolution))
+    lat_axis = lat_max - resolution / 2 - resolution * np.arange(int((lat_max - lat_min) / resolution))
+    lon, lat = np.meshgrid(lon_axis, lat_axis, indexing='ij')
+
+    # 均匀抽取，使网格铺满整个范围 (而不是只占西边几列)
+    cells = np.linspace(0, lon.size - 1, n_grids).round().astype(np.int64)
+    return pd.DataFrame({
+        'Grid_ID': np.arange(1, n_grids + 1, dtype=np.int64),
+        'Lon': lon.ravel()[cells],
+        'Lat': lat.ravel()[cells],
+    })
+
+
+def grid_climate(grid):
+    """每个网格的径流量级和季节相位 (所有情景、所有模型共用)。"""
+    rng = np.random.default_rng(len(grid))
+    return {
+        'level': np.exp(rng.normal(0.0, 0.8, len(grid))),
+        'phase': rng.uniform(0, 12, len(grid)),
+        'amplitude': rng.uniform(0.2, 0.9, len(grid)),
+    }
+
+
+def synthetic_qtot(climate, rows, dates, model_index, trend=0.0, seed=0):
+    """
+    一个模型、一组网格 (rows: 网格位置) 的 [grid, month] Qtot。
+    trend: 整个时段内 log(Qtot) 的线性变化 (情景差异)。
+    seed:  情景的随机种子 (不同情景的逐月扰动不同)。
+    """
+    rng = np.random.default_rng([seed, model_index, int(rows[0]), len(rows)])
+    n_months = len(dates)
+    month = pd.DatetimeIndex(dates).month.to_numpy()
+    t = np.linspace(0.0, 1.0, n_months)
+
+    seasonal = 1 + climate['amplitude'][rows, None] * np.sin(
+        2 * np.pi * (month[None, :] - climate['phase'][rows, None]) / 12)
+    bias = np.exp(rng.normal(0.0, 0.3, len(rows)))[:, None]  # 模型的系统偏差
+    noise = rng.gamma(2.0, 0.5, (len(rows), n_months))
+    return climate['level'][rows, None] * bias * seasonal * noise * np.exp(trend * t)[None, :]
+
+
+def batch_frame(grid, rows, dates, qtot):
+    """把 [grid, month] 的 Qtot 与 SCI 展开为 R 导出的长格式。"""
+    sci = compute_sci(qtot, dates)
+    n_months = len(dates)
+    return pd.DataFrame({
+        'Grid_ID': np.repeat(grid['Grid_ID'].to_numpy()[rows], n_months),
+        'Lon': np.repeat(grid['Lon'].to_numpy()[rows], n_months),
+        'Lat': np.repeat(grid['Lat'].to_numpy()[rows], n_months),
+        'Date': np.tile(dates, len(rows)),
+        'Qtot': qtot.ravel().round(6),
+        'SCI': sci.ravel().round(4),
+    })[SYNTHETIC_COLUMNS]
+
+
+def corrupt_file(path, rng, header=False, bad_lines=0):
+    """损坏一个批次文件: 替换标题行，并在随机位置插入 bad_lines 行坏行。"""
+    lines = Path(path).read_text(encoding='latin-1').splitlines()
+    if header:
+        lines[0] = CORRUPT_HEADERS[rng.integers(len(CORRUPT_HEADERS))]
+    if bad_lines:
+        positions = np.sort(rng.integers(1, len(lines) + 1, bad_lines))[::-1]
+        for pos in positions:
+            lines.insert(int(pos), BAD_LINES[rng.integers(len(BAD_LINES))])
+    Path(path).write_text("\n".join(lines) + "\n", encoding='latin-1')
+
+
+def ratio_stats(grid, sci, threshold=1.0):
+    """
+    由 [grid, month] SCI 生成 RATIO_STATS 布局 (前后两个半时段的事件次数及其比值)。
+    """
+    half = sci.shape[1] // 2
+    columns = {'Grid_ID': grid['Grid_ID'].to_numpy(), 'Lon': grid['Lon'].to_numpy(), 'Lat': grid['Lat'].to_numpy()}
+    counts = {}
+    for name, hit in (('Drought', sci <= -threshold), ('Flood', sci >= threshold)):
+        counts[f"N_{name}_P1"] = hit[:, :half].sum(axis=1)
+        counts[f"N_{name}_P2"] = hit[:, half:].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns[f"{name}_Ratio"] = counts[f"N_{name}_P2"] / counts[f"N_{name}_P1"]
+    return pd.DataFrame({**columns, **counts})
+
+
+def write_scenario(out_dir, scenario_name, n_grids, trend=0.0, models=SYNTHETIC_MODELS,
+                   batch_size=SYNTHETIC_BATCH_SIZE, header_rate=0.0, bad_line_rate=0.0, seed=0):
+    """
+    生成一个情景目录:
+      {model}_grids_X_Y.csv       每个模型、每个批次一个文件
+      {scenario}_RATIO_STATS.csv  地图脚本的输入 (由第一个模型的 SCI 计算)
+    header_rate:   每个文件标题行被损坏的概率
+    bad_line_rate: 每个文件插入坏行的概率 (每个损坏文件插入 1-5 行)
+    seed:          情景的随机种子 (网格的量级和季节循环与种子无关，所有情景相同)
+    返回写入的批次文件数。
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    grid = synthetic_grid(n_grids)
+    climate = grid_climate(grid)
+    dates = synthetic_dates()
+    rng = np.random.default_rng([seed, n_grids])
+
+    ratio_parts = []
+    n_files = 0
+    for start in range(0, n_grids, batch_size):
+        rows = np.arange(start, min(start + batch_size, n_grids))
+        suffix = f"grids_{start + 1}_{rows[-1] + 1}.csv"
+        for i, mod in enumerate(models):
+            qtot = synthetic_qtot(climate, rows, dates, i, trend=trend, seed=seed)
+            df = batch_frame(grid, rows, dates, qtot)
+            path = out_dir / f"{mod}_{suffix}"
+            df.to_csv(path, index=False)
+            n_files += 1
+
+            header = rng.random() < header_rate
+            bad_lines = int(rng.integers(1, 6)) if rng.random() < bad_line_rate else 0
+            if header or bad_lines:
+                corrupt_file(path, rng, header=header, bad_lines=bad_lines)
+
+            if i == 0:
+                sci = df['SCI'].to_numpy().reshape(len(rows), len(dates))
+                ratio_parts.append(ratio_stats(grid.iloc[rows], sci))
+
+    pd.concat(ratio_parts, ignore_index=True).to_csv(out_dir / f"{scenario_name}_RATIO_STATS.csv", index=False)
+    return n_files
+
+
+def write_boundary(shapefile_path, vertices=BOUNDARY_VERTICES):
+    """写出一个简单的边界多边形 shapefile (EPSG:4326)。"""
+    import geopandas as gpd  # 只有生成 shapefile 时才需要
+    from shapely.geometry import Polygon
+
+    shapefile_path = Path(shapefile_path)
+    shapefile_path.parent.mkdir(parents=True, exist_ok=True)
+    gpd.GeoDataFrame({'name': ['synthetic']}, geometry=[Polygon(vertices)], crs="EPSG:4326").to_file(shapefile_path)
+    return shapefile_path
+
+
+# -----------------------------------------------------------------
+# 完整的合成数据目录 (三个情景 + 边界 + 流水线配置)
+# -----------------------------------------------------------------
+
+# 情景键 -> (情景名称, 趋势)；归因定义与真实数据相同
+SYNTHETIC_SCENARIOS = {
+    '1901': ("countclim-1901soc", 0.0),
+    'hist': ("countclim-histsoc", -0.15),
+    'obs': ("obsclim-histsoc", -0.3),
+}
+SYNTHETIC_DRIVERS = {'HA': ['hist', '1901'], 'CC': ['obs', 'hist']}
+SHAPEFILE_NAME = "1query_shape_copy.shp"
+
+
+def synthetic_config(root, scenarios=SYNTHETIC_SCENARIOS, models=SYNTHETIC_MODELS):
+    """合成数据目录对应的流水线配置 (格式同 pipeline_config.json)。"""
+    root = Path(root)
+    return {
+        'scenarios': {key: {'dir': str(root / name), 'name': name} for key, (name, _) in scenarios.items()},
+        'drivers': SYNTHETIC_DRIVERS,
+        'models': list(models),
+        'shapefile': str(root / "boundary" / SHAPEFILE_NAME),
+        'attribution_dir': str(root / "ATTRIBUTION_RESULTS"),
+        'maps_dir': str(root / "FINAL_ATTRIBUTION_MAPS"),
+        'coord_scenario': 'obs',
+        'stages': ["means", "frequency", "attribution", "maps"],
+        'max_parallel_stages': 1,
+        'memory_budget_gb': None,
+    }
+
+
+def write_tree(root, n_grids, scenarios=SYNTHETIC_SCENARIOS, models=SYNTHETIC_MODELS,
+               header_rate=0.0, bad_line_rate=0.0, on_progress=print):
+    """
+    生成所有情景目录、边界 shapefile，以及 <root>/pipeline_config.json。
+    返回配置 (dict)。
+    """
+    import json
+
+    root = Path(root)
+    for seed, (key, (name, trend)) in enumerate(scenarios.items()):
+        n_files = write_scenario(root / name, name, n_grids, trend=trend, models=models,
+                                 header_rate=header_rate, bad_line_rate=bad_line_rate, seed=seed)
+        on_progress(f"  -> 情景 {key} ({name}): {n_files} 个批次文件")
+    write_boundary(root / "boundary" / SHAPEFILE_NAME)
+
+    config = synthetic_config(root, scenarios, models)
+    with open(root / "pipeline_config.json", 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    return config
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from sci_frequency import DROUGHT, FLOOD, percentile_level, threshold_name
+from sci_index import reference_columns
+
+# -----------------------------------------------------------------
+# 【百分位阈值与超过频率曲线】
+#
+# 1. 百分位阈值 ("Drought_Q10" / "Flood_Q95"):
+#    由 *参考情景* 的均值立方体在参考期内逐网格计算百分位，
+#    保存为 *_PERCENTILE_THRESHOLDS.csv；所有情景都按 Grid_ID 取同一组阈值计数，
+#    因此不同情景的次数是可比的 (参考情景本身按定义约为 10% / 5% 的月份)。
+# 2. 超过频率曲线:
+#    在密集的阈值网格 (例如 0 ~ 3，步长 0.05) 上同时计算干旱/洪涝次数。
+#    不对每个网格的月份值排序，只排序阈值网格: 所有月份值一次 searchsorted
+#    得到所在的阈值区间，按网格 bincount 后累加即为每个阈值的次数
+#    (与逐网格排序后二分查找的结果相同，但不需要 O(月份 log 月份) 的排序)，
+#    几十个阈值与一个阈值的成本几乎相同。
+#    列名与频率文件相同 (Drought_1.0 / Flood_0.05)，同名列的次数也相同。
+# -----------------------------------------------------------------
+
+PERCENTILE_FILE_SUFFIX = "_PERCENTILE_THRESHOLDS.csv"
+CURVE_FILE_SUFFIX = "_EXCEEDANCE_CURVE.csv"
+
+
+def percentile_names(threshold_names):
+    """阈值名称中的百分位阈值 (保持顺序)。"""
+    return [name for name in threshold_names if percentile_level(name) is not None]
+
+
+def percentile_thresholds(cube, threshold_names, reference=None, chunk_grids=1000):
+    """
+    cube:      参考情景的 SciCube (可以是内存映射)。
+    reference: 参考期 (起始日期, 结束日期)，None 为整个时段。
+    返回 DataFrame: Grid_ID, Lon, Lat, <每个百分位阈值的逐网格切点>
+    """
+    names = percentile_names(threshold_names)
+    qs = [percentile_level(name) for name in names]
+    cols = np.flatnonzero(reference_columns(cube.dates, reference))
+    if not len(cols):
+        raise ValueError(f"参考期 {reference} 内没有任何月份")
+
+    table = cube.grid_frame()
+    cutoffs = np.full((len(cube), len(names)), np.nan, dtype=np.float32)
+    for start in range(0, len(cube), chunk_grids):
+        block = np.asarray(cube.values[start:start + chunk_grids][:, cols], dtype=np.float64)
+        valid = ~np.isnan(block).all(axis=1)
+        if valid.any() and names:
+            # 所有百分位一次计算 (每个网格只排序一次)
+            cutoffs[start:start + len(block)][valid] = np.nanpercentile(block[valid], qs, axis=1).T
+    for j, name in enumerate(names):
+        table[name] = cutoffs[:, j]
+    return table
+
+
+def grid_cutoffs(table, threshold_names, grid_ids):
+    """
+    把阈值表按 Grid_ID 对齐到 grid_ids，返回 [grid, threshold] 数组
+    (固定阈值的列和参考情景中没有的网格为 NaN，NaN 永远不算超过阈值)。
+    """
+    grid_ids = np.asarray(grid_ids, dtype=np.int64)
+    ref_ids = table['Grid_ID'].to_numpy(dtype=np.int64)
+    order = np.argsort(ref_ids, kind='stable')
+    pos = np.searchsorted(ref_ids, grid_ids, sorter=order)
+    pos = np.clip(pos, 0, max(len(ref_ids) - 1, 0))
+    rows = order[pos] if len(ref_ids) else pos
+    found = (ref_ids[rows] == grid_ids) if len(ref_ids) else np.zeros(len(grid_ids), dtype=bool)
+
+    out = np.full((len(grid_ids), len(threshold_names)), np.nan, dtype=np.float32)
+    for j, name in enumerate(threshold_names):
+        if name in table.columns:
+            out[found, j] = table[name].to_numpy(dtype=np.float32)[rows[found]]
+    return out
+
+
+# -----------------------------------------------------------------
+# 超过频率曲线
+# -----------------------------------------------------------------
+def curve_levels(max_level=3.0, step=0.05):
+    """阈值网格 0, step, ..., max_level (SCI 的绝对值)。"""
+    return np.round(np.arange(0.0, max_level + step / 2, step), 6)
+
+
+def curve_columns(levels):
+    """输出列名: Drought_0.0, Drought_0.05 ... Flood_3.0 (与频率文件的阈值名称相同，可直接归因)。"""
+    return [threshold_name(kind, level) for kind in (DROUGHT, FLOOD) for level in levels]
+
+
+def _bin_counts(index, n_bins):
+    """index: [grid, month] 的分箱编号 (0..n_bins-1)。返回 [grid, bin] 的月份数。"""
+    n_grid = index.shape[0]
+    flat = (np.arange(n_grid)[:, None] * n_bins + index).ravel()
+    return np.bincount(flat, minlength=n_grid * n_bins).reshape(n_grid, n_bins)
+
+
+def exceedance_curve(values, levels):
+    """
+    values: [grid, month] SCI；levels: 阈值网格 (SCI 的绝对值，任意顺序)。
+    返回 (drought, flood)，均为 [grid, level] 的次数 (列顺序与 levels 相同):
+      drought[:, j] = #(SCI <= -levels[j])，flood[:, j] = #(SCI >= levels[j])
+    所有月份值一次 searchsorted 到排序后的阈值网格上，再按网格 bincount、累加，
+    不对每个阈值重新比较整个数组。NaN 不计入任何阈值。
+    """
+    values = np.asarray(values, dtype=np.float32)
+    levels = np.asarray(levels, dtype=np.float32)
+    order = np.argsort(levels, kind='stable')
+    if not np.array_equal(order, np.arange(len(levels))):
+        drought, flood = exceedance_curve(values, levels[order])
+        inverse = np.argsort(order)
+        return drought[:, inverse], flood[:, inverse]
+    n_levels = len(levels)
+    nan = np.isnan(values)
+
+    # 干旱: 切点 -levels 升序排列后，SCI <= c_k 当且仅当 “严格小于 SCI 的切点数” <= k
+    cuts = -levels[::-1]
+    index = np.where(nan, n_levels, np.searchsorted(cuts, values, side='left'))
+    below = np.cumsum(_bin_counts(index, n_levels + 1)[:, :n_levels], axis=1)
+    drought = below[:, ::-1]
+
+    # 洪涝: SCI >= levels[j] 当且仅当 “不大于 SCI 的阈值数” >= j + 1
+    index = np.where(nan, 0, np.searchsorted(levels, values, side='right'))
+    counts = _bin_counts(index, n_levels + 1)
+    flood = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    return drought, flood
+
+
+def curve_frame(cube, levels):
+    """
+    对一个 SciCube 计算超过频率曲线，返回 DataFrame:
+    Grid_ID, Lon, Lat, Drought_<level>..., Flood_<level>...
+    """
+    drought, flood = exceedance_curve(cube.values, levels)
+    frame = cube.grid_frame()
+    curves = pd.DataFrame(np.hstack([drought, flood]), columns=curve_columns(levels), index=frame.index)
+    return pd.concat([frame, curves], axis=1)
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from sci_frequency import exceedance_mask
+
+# -----------------------------------------------------------------
+# 【时间窗口归因】: 子时段 / 季节 / 滑动 N 年窗口的超过次数
+#
+# Date 只解析一次，得到每个月的年份和月份。
+# 超过阈值的掩膜 [grid, month, threshold] 沿时间轴累加一次 (前面补 0):
+#   C[:, t] = 前 t 个月的超过次数
+# 任意连续窗口 [start, end) 的次数 = C[:, end] - C[:, start]，
+# 季节 (例如 JJA) 先把不属于该季节的月份置 0 再累加 (每个季节一个累加数组)，
+# 因此几十个窗口与一个窗口的成本几乎相同，结果为 [grid, window, threshold]。
+# 跨年的季节按季节年计: Y 年的 DJF = Y-1 年 12 月 + Y 年 1、2 月，
+# 季节窗口只包含完整的季节年 (不完整的第一个和最后一个冬季被去掉)。
+# -----------------------------------------------------------------
+
+ALL_MONTHS = "ALL"
+
+DEFAULT_SEASONS = {
+    "DJF": (12, 1, 2),
+    "MAM": (3, 4, 5),
+    "JJA": (6, 7, 8),
+    "SON": (9, 10, 11),
+}
+
+WINDOW_COLUMNS = ['Window', 'Kind', 'Start_Year', 'End_Year', 'Season', 'N_Months']
+
+
+def month_index(dates):
+    """'1980-01-01' ... -> (年份, 月份) 整数数组 (只解析一次)。"""
+    parsed = pd.to_datetime(pd.Index(np.asarray(dates, dtype=str)))
+    return parsed.year.to_numpy(), parsed.month.to_numpy()
+
+
+def build_windows(dates, periods=None, seasons=None, sliding_years=None, sliding_step=1):
+    """
+    periods:       {名称: (起始年, 结束年)} 子时段 (含两端)，例如 {'pre_dam': (1980, 1996)}
+    seasons:       {名称: (月份, ...)} 整个时段内的季节
+    sliding_years: 滑动窗口的年数 (None 为不使用)，步长 sliding_step 年
+    返回窗口表 (WINDOW_COLUMNS + 内部用的 start / end 月份下标，end 不含)。
+    第一个窗口总是整个时段。
+    """
+    years, _ = month_index(dates)
+    first, last = int(years.min()), int(years.max())
+
+    def span(season, start_year, end_year):
+        # 季节年单调不减 (12 月记入下一年后紧接着就是下一年的 1 月)
+        sy = season_years(dates, seasons, season)
+        return int(np.searchsorted(sy, start_year, side='left')), int(np.searchsorted(sy, end_year, side='right'))
+
+    rows = [dict(Window=f"{first}-{last}", Kind="full", Start_Year=first, End_Year=last, Season=ALL_MONTHS)]
+    for name, (start_year, end_year) in (periods or {}).items():
+        rows.append(dict(Window=name, Kind="period", Start_Year=int(start_year), End_Year=int(end_year),
+                         Season=ALL_MONTHS))
+    for name in (seasons or {}):
+        # 只用所有月份都在数据中的季节年
+        sy = season_years(dates, seasons, name)
+        season_year, n = np.unique(sy[season_mask(dates, seasons, name)], return_counts=True)
+        complete = season_year[n == len(seasons[name])]
+        if len(complete):
+            rows.append(dict(Window=name, Kind="season", Start_Year=int(complete.min()), End_Year=int(complete.max()),
+                             Season=name))
+    if sliding_years:
+        for start_year in range(first, last - sliding_years + 2, sliding_step):
+            end_year = start_year + sliding_years - 1
+            rows.append(dict(Window=f"{start_year}-{end_year}", Kind="sliding", Start_Year=start_year,
+                             End_Year=end_year, Season=ALL_MONTHS))
+
+    windows = pd.DataFrame(rows)
+    bounds = [span(r.Season, r.Start_Year, r.End_Year) for r in windows.itertuples()]
+    windows['start'] = [b[0] for b in bounds]
+    windows['end'] = [b[1] for b in bounds]
+    windows['N_Months'] = [int(season_mask(dates, seasons, s)[a:b].sum())
+                           for s, (a, b) in zip(windows['Season'], bounds)]
+    return windows[WINDOW_COLUMNS + ['start', 'end']]
+
+
+def season_years(dates, seasons, season):
+    """
+    每个月所属的季节年。跨年的季节 (月份顺序中出现回绕，例如 DJF = (12, 1, 2))
+    中回绕点之前的月份 (12 月) 记入下一年；其他月份和不跨年的季节就是日历年。
+    """
+    years, months = month_index(dates)
+    if season == ALL_MONTHS:
+        return years
+    order = list(seasons[season])
+    wrap = next((i for i in range(1, len(order)) if order[i] < order[i - 1]), None)
+    if wrap is None:
+        return years
+    return years + np.isin(months, order[:wrap])
+
+
+def season_mask(dates, seasons, season):
+    """属于该季节的月份 (ALL 为全部月份)。"""
+    _, months = month_index(dates)
+    if season == ALL_MONTHS:
+        return np.ones(len(months), dtype=bool)
+    return np.isin(months, seasons[season])
+
+
+def window_counts(values, dates, threshold_names, windows, seasons=None, grid_cutoffs=None):
+    """
+    values: [grid, month] SCI；windows: build_windows 的结果。
+    返回 [grid, window, threshold] int32 超过次数 (NaN 不计入)。
+    """
+    mask = exceedance_mask(values, threshold_names, grid_cutoffs)
+    n_grid, n_month, n_thr = mask.shape
+    counts = np.zeros((n_grid, len(windows), n_thr), dtype=np.int32)
+
+    for season, group in windows.groupby('Season', sort=False):
+        in_season = season_mask(dates, seasons, season)
+        cum = np.zeros((n_grid, n_month + 1, n_thr), dtype=np.int32)
+        np.cumsum(mask & in_season[None, :, None], axis=1, out=cum[:, 1:])
+        w = group.index.to_numpy()
+        counts[:, w] = cum[:, group['end'].to_numpy()] - cum[:, group['start'].to_numpy()]
+    return counts
+
+
+def window_deltas(counts, drivers):
+    """counts: {情景名: [grid, window, threshold]}。返回 {驱动因子: A - B}。"""
+    return {d: counts[a] - counts[b] for d, (a, b) in drivers.items()}
+
+
+def window_summary(deltas, windows, threshold_names, inside=None):
+    """
+    区域 (inside 为真的网格；None 为全部) 汇总的长格式表:
+    WINDOW_COLUMNS + Driver, Indicator, Total_Delta, Mean_Delta, N_Grids
+    """
+    tables = []
+    for driver, delta in deltas.items():
+        d = delta if inside is None else delta[inside]
+        total = d.sum(axis=0, dtype=np.int64)                    # [window, threshold]
+        mean = total / max(len(d), 1)
+        for j, name in enumerate(threshold_names):
+            table = windows[WINDOW_COLUMNS].copy()
+            table['Driver'] = driver
+            table['Indicator'] = name
+            table['Total_Delta'] = total[:, j]
+            table['Mean_Delta'] = mean[:, j]
+            table['N_Grids'] = len(d)
+            tables.append(table)
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 各模块是 scripts/ 下的独立脚本 (没有打包)，测试时直接加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+
+def _long_frame(n_grid=12, n_month=36, seed=0):
+    """随机的长格式集合均值表 (Grid_ID, Lon, Lat, Date, Mean_SCI)，约 5% 为 NaN。"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("1980-01-01", periods=n_month, freq="MS").strftime("%Y-%m-%d")
+    df = pd.DataFrame({
+        'Grid_ID': np.repeat(np.arange(1, n_grid + 1), n_month),
+        'Lon': np.repeat(np.linspace(100, 110, n_grid), n_month),
+        'Lat': np.repeat(np.linspace(20, 30, n_grid), n_month),
+        'Date': np.tile(dates, n_grid),
+        'Mean_SCI': rng.normal(size=n_grid * n_month),
+    })
+    df.loc[df.sample(frac=0.05, random_state=seed).index, 'Mean_SCI'] = np.nan
+    return df
+
+
+@pytest.fixture
+def long_frame():
+    return _long_frame
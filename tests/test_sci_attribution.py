@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from sci_attribution import DEFAULT_DRIVERS, load_scenarios, attribution_frame, model_agreement_frame
+from sci_frequency import model_column, column_models
+
+INDICATORS = ["Drought_1.0", "Flood_1.0"]
+
+
+def _write_scenarios(tmp_path):
+    """三个情景的频率表: 网格集合不同、行顺序打乱，hist 中有一个重复行。"""
+    rng = np.random.default_rng(0)
+    grids = {'obs': [1, 2, 3, 4, 5], 'hist': [5, 3, 2, 1], '1901': [2, 3, 4, 5, 6]}
+    paths = {}
+    for name, ids in grids.items():
+        df = pd.DataFrame({'Grid_ID': ids, 'Lon': [100.0 + i for i in ids], 'Lat': [30.0 + i for i in ids]})
+        for col in INDICATORS:
+            df[col] = rng.integers(0, 20, size=len(ids))
+        if name == 'hist':
+            df = pd.concat([df, df.iloc[[0]]], ignore_index=True)
+        paths[name] = tmp_path / f"{name}.csv"
+        df.to_csv(paths[name], index=False)
+    return paths
+
+
+def _chained_merge(paths, how):
+    """原来的做法: 逐个 add_suffix 再按 Grid_ID 合并，坐标取自 obs。"""
+    merged = None
+    for name, path in paths.items():
+        df = pd.read_csv(path).drop_duplicates('Grid_ID')
+        df = df.rename(columns={c: f"{c}_{name}" for c in INDICATORS})
+        if merged is None:
+            merged = df
+        else:
+            merged = merged.merge(df.drop(columns=['Lon', 'Lat']), on='Grid_ID', how=how)
+    merged = merged.sort_values('Grid_ID').reset_index(drop=True)
+    for d, (a, b) in DEFAULT_DRIVERS.items():
+        for col in INDICATORS:
+            merged[f"Delta_{d}_{col}"] = merged[f"{col}_{a}"] - merged[f"{col}_{b}"]
+    return merged
+
+
+def test_inner_alignment_matches_chained_merge(tmp_path):
+    paths = _write_scenarios(tmp_path)
+    stack = load_scenarios(paths, INDICATORS, coord_scenario='obs')
+    assert stack.grid['Grid_ID'].tolist() == [2, 3, 5]
+
+    df = attribution_frame(stack, count_indicators=INDICATORS)
+    expected = _chained_merge(paths, 'inner')
+    pd.testing.assert_frame_equal(df[expected.columns], expected, check_dtype=False)
+    assert df['Delta_HA_Drought_1.0'].dtype == np.int64
+
+
+def test_left_alignment_keeps_coordinate_scenario(tmp_path):
+    paths = _write_scenarios(tmp_path)
+    stack = load_scenarios(paths, INDICATORS, coord_scenario='obs', how='left')
+    assert stack.grid['Grid_ID'].tolist() == [1, 2, 3, 4, 5]
+    assert stack.grid['Lon'].tolist() == [101.0, 102.0, 103.0, 104.0, 105.0]
+
+    df = attribution_frame(stack, count_indicators=INDICATORS)
+    expected = _chained_merge(paths, 'left')
+    pd.testing.assert_frame_equal(df[expected.columns], expected, check_dtype=False)
+    # 情景缺失的网格为 NaN，次数列因此保持浮点
+    assert np.isnan(df.loc[df['Grid_ID'] == 1, 'Delta_HA_Drought_1.0']).all()
+
+
+def test_indicator_renaming_and_posinf(tmp_path):
+    paths = {}
+    for name, ratio in (('a', [1.5, np.inf]), ('b', [1.0, 2.0])):
+        paths[name] = tmp_path / f"{name}.csv"
+        pd.DataFrame({'Grid_ID': [1, 2], 'Lon': [100.0, 101.0], 'Lat': [30.0, 31.0], 'Ratio': ratio}).to_csv(
+            paths[name], index=False)
+    stack = load_scenarios(paths, {'Ratio': 'R'}, posinf=10.0)
+    assert stack.indicators == ['R']
+    np.testing.assert_array_equal(stack.get('a')[:, 0], [1.5, 10.0])
+    df = attribution_frame(stack, drivers={'X': ('a', 'b')}, risk_ratio=True)
+    np.testing.assert_array_equal(df['Delta_X_R'], [0.5, 8.0])
+    np.testing.assert_array_equal(df['RR_X_R'], [1.5, 5.0])
+
+
+def test_model_agreement(tmp_path):
+    models = ["h08", "jules-w2", "web-dhm-sg"]
+    counts = {
+        # 网格 1: Delta = (+2, +1, -1) -> MMM 2/3，2/3 的模型同号
+        # 网格 2: Delta = (-3, NaN, -1) -> 只计有数据的模型，MMM -2，全部同号
+        'a': [[5, 4, 1], [0, np.nan, 2]],
+        'b': [[3, 3, 2], [3, 1, 3]],
+    }
+    paths = {}
+    for name, rows in counts.items():
+        df = pd.DataFrame({'Grid_ID': [1, 2], 'Lon': [100.0, 101.0], 'Lat': [30.0, 31.0]})
+        for m, model in enumerate(models):
+            df[model_column("Drought_1.0", model)] = [row[m] for row in rows]
+        paths[name] = tmp_path / f"{name}.csv"
+        df.to_csv(paths[name], index=False)
+
+    header = pd.read_csv(paths['a'], nrows=0).columns
+    assert column_models(header, ["Drought_1.0"]) == models
+    stack = load_scenarios(paths, [model_column("Drought_1.0", model) for model in models])
+    df = model_agreement_frame(stack, {'X': ('a', 'b')}, ["Drought_1.0"], models)
+
+    np.testing.assert_array_equal(df['Delta_X_Drought_1.0_h08'], [2, -3])
+    np.testing.assert_array_equal(df['Delta_X_Drought_1.0_jules-w2'], [1, np.nan])
+    np.testing.assert_allclose(df['Delta_X_Drought_1.0_MMM'], [2 / 3, -2])
+    np.testing.assert_allclose(df['Agreement_X_Drought_1.0'], [2 / 3, 1])
+    assert df['Delta_X_Drought_1.0_h08'].dtype == np.int64
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from sci_benchmark import stage_times, compare_previous
+
+
+def _record(stage, wall, cpu, rss, phases=None, phases_cpu=None):
+    return {'stage': stage, 'wall_s': wall, 'cpu_s': cpu, 'peak_rss_mb': rss,
+            'phases': phases or {}, 'phases_cpu': phases_cpu or {}}
+
+
+def test_stage_times_split_wall_and_cpu_by_phase():
+    records = [
+        _record('means.batch', 2.0, 1.5, 300.0), _record('means.batch', 2.0, 1.6, 320.0),
+        _record('means.total', 3.0, 0.2, 100.0), _record('means.consolidate', 0.5, 0.4, 110.0),
+        _record('frequency.total', 1.0, 0.9, 200.0),
+        _record('attribution.total', 10.0, 8.0, 500.0,
+                phases={'spatial_join': 4.0, 'write_html': 1.0}, phases_cpu={'spatial_join': 3.0, 'write_html': 0.5}),
+        _record('maps.total', 6.0, 5.0, 400.0),
+    ]
+    times = stage_times(records).set_index('Stage')
+    assert list(times.columns) == ['Wall_s', 'CPU_s', 'Process_Peak_RSS_MB']
+    assert times.loc['means'].tolist() == [3.5, 3.7, 320.0]
+    # 掩膜和写 HTML 的墙钟时间和 CPU 时间都从归因中拆出
+    assert times.loc['attribution'].tolist() == [5.0, 4.5, 500.0]
+    assert times.loc['mask'].tolist() == [4.0, 3.0, 500.0]
+    assert times.loc['plotting'].tolist() == [7.0, 5.5, 500.0]
+    # 拆分前后总和不变
+    assert times.loc[['attribution', 'mask'], 'CPU_s'].sum() + 0.5 == 8.0
+
+
+def test_stage_times_old_records_without_phase_cpu():
+    record = _record('attribution.total', 10.0, 8.0, 500.0, phases={'spatial_join': 4.0})
+    del record['phases_cpu']
+    times = stage_times([record]).set_index('Stage')
+    assert times.loc['mask', 'Wall_s'] == 4.0
+    assert np.isnan(times.loc['mask', 'CPU_s']) and np.isnan(times.loc['attribution', 'CPU_s'])
+
+
+def test_compare_previous():
+    history = pd.DataFrame({'N_Grids': [100, 100, 200], 'Stage': ['means'] * 3, 'Wall_s': [1.0, 2.0, 5.0]})
+    results = pd.DataFrame({'N_Grids': [100, 400], 'Stage': ['means', 'means'], 'Wall_s': [3.0, 1.0]})
+    out = compare_previous(results, history)
+    assert out['Vs_Previous'].iloc[0] == 1.5
+    assert np.isnan(out['Vs_Previous'].iloc[1])
@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from sci_store import GRID_DTYPE, SciCube, write_batch, consolidate
+from sci_bootstrap import block_weights, bootstrap_chunk, yearly_counts
+
+N_YEARS = 10
+DATES = pd.date_range("1980-01-01", periods=12 * N_YEARS, freq="MS").strftime("%Y-%m-%d").to_numpy()
+THRESHOLDS = ["Drought_1.0"]
+
+
+def _write_store(store_dir, values):
+    grid = np.zeros(len(values), dtype=GRID_DTYPE)
+    grid['Grid_ID'] = np.arange(1, len(values) + 1)
+    write_batch(store_dir, f"grids_1_{len(values)}.csv", SciCube(grid, DATES, values.astype(np.float32)))
+    consolidate(store_dir)
+    return store_dir
+
+
+def _scenarios(seed=0, n_grid=3):
+    """情景 a: 随机值，约 30% 的月份干旱；情景 b: 与 a 相同，但每年多一个干旱月。"""
+    rng = np.random.default_rng(seed)
+    a = rng.uniform(-0.5, 0.5, size=(n_grid, len(DATES)))
+    a[rng.random(a.shape) < 0.3] = -2.0
+    b = a.copy()
+    for year in range(N_YEARS):
+        months = np.arange(12 * year, 12 * (year + 1))
+        for g in range(n_grid):
+            b[g, months[a[g, months] > -1.0][0]] = -2.0
+    return a, b
+
+
+def _task(store_dirs, drivers, weights, n_grid=3):
+    return dict(store_dirs=store_dirs, grid_ids=np.arange(1, n_grid + 1), thresholds=THRESHOLDS,
+                drivers=drivers, weights=weights, alpha=0.05)
+
+
+def test_block_weights_are_contiguous_blocks():
+    n_years, block = 6, 3
+    weights = block_weights(n_years, n_boot=200, block_years=block, seed=1)
+    assert weights.shape == (n_years, 200)
+    # 每次重抽样恰好凑满 n_years 年
+    assert np.all(weights.sum(axis=0) == n_years)
+    # 每一列都是两个长度为 3 的连续年份块之和
+    blocks = [np.isin(np.arange(n_years), np.arange(s, s + block)).astype(np.float32)
+              for s in range(n_years - block + 1)]
+    sums = [x + y for x, y in itertools.product(blocks, repeat=2)]
+    assert all(any(np.array_equal(col, s) for s in sums) for col in weights.T)
+    # 同一个种子得到同样的矩阵；块长超过年数时退化为原样本
+    np.testing.assert_array_equal(weights, block_weights(n_years, 200, block, seed=1))
+    np.testing.assert_array_equal(block_weights(n_years, 5, 50, seed=1), np.ones((n_years, 5)))
+
+
+def test_identical_scenarios_give_p_one(tmp_path):
+    a, _ = _scenarios()
+    dirs = {'a': _write_store(tmp_path / "a", a), 'b': _write_store(tmp_path / "b", a)}
+    out = bootstrap_chunk(_task(dirs, {'X': ('a', 'b')}, block_weights(N_YEARS, 500, 3, seed=0)))
+    np.testing.assert_array_equal(out["P_X_Drought_1.0"], 1.0)
+    np.testing.assert_array_equal(out["CI_Low_X_Drought_1.0"], 0.0)
+    np.testing.assert_array_equal(out["CI_High_X_Drought_1.0"], 0.0)
+
+
+def test_paired_resample_shared_across_scenarios(tmp_path):
+    # b 每年恰好比 a 多一次干旱: 情景共用重抽样年份时，每次重抽样的 Delta 都是 -N_YEARS
+    a, b = _scenarios()
+    dirs = {'a': _write_store(tmp_path / "a", a), 'b': _write_store(tmp_path / "b", b)}
+    out = bootstrap_chunk(_task(dirs, {'X': ('a', 'b')}, block_weights(N_YEARS, 500, 3, seed=0)))
+    np.testing.assert_array_equal(out["CI_Low_X_Drought_1.0"], -N_YEARS)
+    np.testing.assert_array_equal(out["CI_High_X_Drought_1.0"], -N_YEARS)
+    np.testing.assert_array_equal(out["P_X_Drought_1.0"], 0.0)
+
+
+def test_p_value_is_two_sided(tmp_path):
+    rng = np.random.default_rng(3)
+    a = rng.normal(size=(3, len(DATES)))
+    b = rng.normal(size=(3, len(DATES)))
+    b[2] = np.nan  # 没有数据的网格
+    dirs = {'a': _write_store(tmp_path / "a", a), 'b': _write_store(tmp_path / "b", b)}
+    weights = block_weights(N_YEARS, 400, 2, seed=5)
+    out = bootstrap_chunk(_task(dirs, {'X': ('a', 'b')}, weights))
+
+    # 直接由年计数和抽中次数计算 Delta 的自助分布
+    delta = (yearly_counts(a, DATES, THRESHOLDS)[..., 0] - yearly_counts(b, DATES, THRESHOLDS)[..., 0]) @ weights
+    expected = np.minimum(1.0, 2 * np.minimum((delta <= 0).mean(axis=1), (delta >= 0).mean(axis=1)))
+    np.testing.assert_allclose(out["P_X_Drought_1.0"][:2], expected[:2])
+    np.testing.assert_allclose(out["CI_Low_X_Drought_1.0"][:2], np.percentile(delta[:2], 2.5, axis=1))
+    assert np.isnan(out["P_X_Drought_1.0"][2])
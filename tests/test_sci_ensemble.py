@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from sci_ensemble import reduce_ensemble
+
+
+def test_reduce_ensemble_matches_groupby():
+    rng = np.random.default_rng(2)
+    stack = rng.normal(size=(5, 4, 6))
+    stack[rng.random(stack.shape) < 0.3] = np.nan  # 部分模型缺测
+    stack[:, 0, 0] = np.nan                       # 没有任何模型
+    stack[1:, 0, 1] = np.nan                      # 只有一个模型
+
+    # 原来的做法: 长格式表按 (grid, month) 分组
+    model, grid, month = np.indices(stack.shape).reshape(3, -1)
+    df = pd.DataFrame({'grid': grid, 'month': month, 'SCI': stack.ravel()})
+    expected = df.groupby(['grid', 'month'])['SCI'].agg(['mean', 'std', 'min', 'max', 'count'])
+
+    fields = reduce_ensemble(stack)
+    for field, col in [('Mean_SCI', 'mean'), ('Std_SCI', 'std'), ('Min_SCI', 'min'), ('Max_SCI', 'max'),
+                       ('N_Models', 'count')]:
+        np.testing.assert_allclose(fields[field].ravel(), expected[col].to_numpy(), rtol=1e-6, equal_nan=True)
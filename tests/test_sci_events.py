@@ -0,0 +1,51 @@
+import numpy as np
+
+from sci_events import EVENT_METRICS, event_stats, event_frame
+from sci_store import long_to_cube
+
+THRESHOLDS = ["Drought_1.0", "Flood_1.5"]
+
+
+def _loop_events(series, cutoff, is_flood):
+    """逐月循环的游程识别 (参考实现)。"""
+    events = []
+    current = None
+    for x in series:
+        hit = (x >= cutoff) if is_flood else (x <= cutoff)
+        if hit:
+            current = current or []
+            current.append(x)
+        elif current:
+            events.append(current)
+            current = None
+    if current:
+        events.append(current)
+    durations = [len(e) for e in events]
+    return {
+        "Events": len(events),
+        "MeanDur": np.mean(durations) if events else 0.0,
+        "MaxDur": max(durations, default=0),
+        "Severity": sum(abs(x - cutoff) for e in events for x in e),
+        "Peak": max((abs(x) for e in events for x in e), default=0.0),
+    }
+
+
+def test_hand_computed_events():
+    sci = np.array([[0.0, -1.2, -2.0, 0.5, -1.0, 0.0, 1.6, 1.5, 0.0]])
+    stats = event_stats(sci, THRESHOLDS)
+    # 干旱: [-1.2, -2.0] 和 [-1.0]；洪水: [1.6, 1.5]
+    assert stats["Events"].tolist() == [[2, 1]]
+    np.testing.assert_allclose(stats["MeanDur"], [[1.5, 2.0]])
+    assert stats["MaxDur"].tolist() == [[2, 2]]
+    np.testing.assert_allclose(stats["Severity"], [[0.2 + 1.0 + 0.0, 0.1]], atol=1e-6)
+    np.testing.assert_allclose(stats["Peak"], [[2.0, 1.6]], atol=1e-6)
+
+
+def test_event_stats_match_loop(long_frame):
+    cube = long_to_cube(long_frame(n_grid=8, n_month=60, seed=2))
+    frame = event_frame(cube, THRESHOLDS)
+    for g in range(len(cube)):
+        for name, cutoff, is_flood in (("Drought_1.0", -1.0, False), ("Flood_1.5", 1.5, True)):
+            expected = _loop_events(cube.values[g], np.float32(cutoff), is_flood)
+            for metric in EVENT_METRICS:
+                np.testing.assert_allclose(frame[f"{metric}_{name}"].iloc[g], expected[metric], rtol=1e-5, atol=1e-5)
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from sci_frequency import DEFAULT_THRESHOLDS, frequency_frame
+from sci_store import long_to_cube
+
+
+def test_frequency_frame_matches_groupby_counts(long_frame):
+    # 原来的做法: 长格式表按 Grid_ID 分组逐阈值计数
+    df = long_frame()
+    stats = frequency_frame(long_to_cube(df), DEFAULT_THRESHOLDS)
+
+    sci = df['Mean_SCI'].astype(np.float32)
+    expected = pd.DataFrame({
+        'Drought_1.0': (sci <= np.float32(-1.0)), 'Drought_1.5': (sci <= np.float32(-1.5)),
+        'Flood_1.0': (sci >= np.float32(1.0)), 'Flood_1.5': (sci >= np.float32(1.5)),
+    }).groupby(df['Grid_ID']).sum()
+
+    assert stats['Grid_ID'].tolist() == expected.index.tolist()
+    for col in DEFAULT_THRESHOLDS:
+        assert stats[col].tolist() == expected[col].tolist()
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from sci_index import compute_sci
+
+
+def test_tied_values_get_equal_sci():
+    dates = pd.date_range("1980-01-01", periods=12 * 6, freq="MS").strftime("%Y-%m-%d")
+    rng = np.random.default_rng(1)
+    qtot = rng.gamma(2.0, size=(2, len(dates)))
+    # 第一个网格: 1 月有三年的径流完全相同
+    jan = np.flatnonzero(dates.str[5:7] == "01")
+    qtot[0, jan[:3]] = 1.0
+
+    for reference in (None, ("1980-01-01", "1982-12-31")):
+        sci = compute_sci(qtot, dates, reference=reference)
+        assert sci[0, jan[0]] == sci[0, jan[1]] == sci[0, jan[2]]
+        assert np.isfinite(sci).all()
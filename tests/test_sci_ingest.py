@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from sci_ingest import read_raw_batch, grid_line_index, index_slice
+
+COLUMNS = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+
+LINES = [
+    "Grid_ID,Lon,Lat,Date,Qtot,SCI",
+    "1,100.25,30.25,1980-01-01,0.5,0.1",
+    "1,100.25,30.25,1980-02-01,abc,-0.3",         # 数值列无法解析 -> NaN，保留该行
+    "1,100.25,30.25,1980-03-01,0.7,0.2,9",         # 字段数不对 -> 丢弃 (迫使整个文件走抢救路径)
+    "",
+    "2,100.75,30.25,1980-01-01,0.9,1.2",
+    "x,100.75,30.25,1980-02-01,1.1,0.4",           # 关键列无法解析 -> 丢弃
+    "2,100.75,30.25,1980-03-01,1.3,",
+]
+
+
+def test_salvage_matches_coercion(tmp_path):
+    path = tmp_path / "h08_grids_1_2.csv"
+    path.write_text("\n".join(LINES) + "\n", encoding='latin-1')
+
+    df, dropped, engine = read_raw_batch(path, COLUMNS)
+    assert engine == 'salvage'
+
+    # 原来的做法: 跳过坏行，全部按字符串读入后 to_numeric(errors='coerce')，去掉关键列为空的行
+    expected = pd.read_csv(path, dtype=str, on_bad_lines='skip')
+    for col in COLUMNS:
+        if col != 'Date':
+            expected[col] = pd.to_numeric(expected[col], errors='coerce')
+    expected = expected.dropna(subset=['Grid_ID', 'Lon', 'Lat', 'Date']).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(df, expected[COLUMNS])
+    # 行号取自原文件 (空行也计数)
+    assert [d[0] for d in dropped] == [4, 7]
+
+
+def test_cache_returns_same_rows(tmp_path):
+    path = tmp_path / "h08_grids_1_2.csv"
+    path.write_text("\n".join(LINES) + "\n", encoding='latin-1')
+
+    df, dropped, _ = read_raw_batch(path, COLUMNS, cache_dir=tmp_path / "cache")
+    cached, cached_dropped, engine = read_raw_batch(path, COLUMNS, cache_dir=tmp_path / "cache")
+    assert engine == 'cache'
+    pd.testing.assert_frame_equal(df, cached)
+    assert dropped == cached_dropped
+
+
+def test_truncated_row_is_quarantined(tmp_path):
+    # 字段不足的行: C 引擎会用 NaN 补齐，必须与抢救路径一样丢弃并记入隔离报告
+    path = tmp_path / "h08_grids_1_2.csv"
+    path.write_text("\n".join([LINES[0], LINES[1], "1,100.0,30.0,1980-01-01,0.5", LINES[5]]) + "\n",
+                    encoding='latin-1')
+
+    for grid_range in (None, (1, 2)):
+        df, dropped, engine = read_raw_batch(path, COLUMNS, grid_range=grid_range)
+        assert engine == 'salvage'
+        assert len(df) == 2
+        assert [d[:2] for d in dropped] == [(3, "字段数为 5 (应为 6)")]
+
+
+def test_empty_trailing_value_stays_on_fast_path(tmp_path):
+    path = tmp_path / "h08_grids_1_2.csv"
+    path.write_text("\n".join([LINES[0], LINES[1], LINES[7]]) + "\n", encoding='latin-1')
+
+    df, dropped, engine = read_raw_batch(path, COLUMNS)
+    assert engine == 'c'
+    assert dropped == []
+    assert np.isnan(df['SCI'].iloc[1])
+
+
+def test_line_index_slices_match_whole_read(tmp_path):
+    # 子批次按字节范围读取: 各子范围 (第一个子范围带上不属于源文件范围的行) 拼起来等于整文件读取
+    path = tmp_path / "h08_grids_1_4.csv"
+    rows = [LINES[0]] + [f"{g},100.0,30.0,1980-0{m}-01,{g}.{m},0.{m}" for g in (1, 2, 3, 4) for m in (1, 2)]
+    rows.insert(4, "")
+    rows.insert(6, "9,100.0,30.0,1980-01-01,0.5,0.1")  # 不在源文件范围内
+    path.write_text("\r\n".join(rows) + "\r\n", encoding='latin-1')
+
+    whole, _, engine = read_raw_batch(path, COLUMNS)
+    assert engine == 'c'
+    index = grid_line_index(path, COLUMNS)
+    parts = []
+    for grid_range, source_range in (((1, 2), (1, 4)), ((3, 4), None)):
+        line_index = index_slice(index, grid_range, source_range)
+        df, dropped, engine = read_raw_batch(path, COLUMNS, grid_range=grid_range, line_index=line_index,
+                                             source_range=source_range)
+        assert engine == 'c' and dropped == []
+        parts.append(df)
+    combined = pd.concat(parts).sort_values(['Grid_ID', 'Date'], kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(combined, whole.sort_values(['Grid_ID', 'Date'], kind='stable')
+                                  .reset_index(drop=True))
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import sci_manifest
+from sci_manifest import Manifest, file_signature
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    source = tmp_path / "h08_grids_1_160.csv"
+    source.write_text("a,b\n1,2\n")
+    output = tmp_path / "grids_1_160.values.npy"
+    output.write_bytes(b"cube")
+    manifest = Manifest(tmp_path / "MANIFEST.json")
+    manifest.record('means', 'grids_1_160.csv', file_signature([source]), {'models': ['h08']}, [output])
+    manifest.save()
+    return tmp_path, source, output
+
+
+def test_unchanged_outputs_are_not_hashed(recorded, monkeypatch):
+    tmp_path, source, output = recorded
+    # 大小和修改时间都没变时不应读取输出文件
+    monkeypatch.setattr(sci_manifest, 'file_checksum', lambda path: pytest.fail("不应计算校验和"))
+    manifest = Manifest(tmp_path / "MANIFEST.json")
+    assert manifest.is_current('means', 'grids_1_160.csv', file_signature([source]), {'models': ['h08']}, [output])
+
+
+def test_touched_output_with_same_content_is_current(recorded):
+    tmp_path, source, output = recorded
+    st = os.stat(output)
+    os.utime(output, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    manifest = Manifest(tmp_path / "MANIFEST.json")
+    assert manifest.is_current('means', 'grids_1_160.csv', file_signature([source]), {'models': ['h08']}, [output])
+
+
+def test_changes_make_entry_stale(recorded):
+    tmp_path, source, output = recorded
+    manifest = Manifest(tmp_path / "MANIFEST.json")
+    key = ('means', 'grids_1_160.csv')
+    # 参数变化
+    assert not manifest.is_current(*key, file_signature([source]), {'models': ['h08', 'hydropy']}, [output])
+    # 输出内容被改写 (大小相同，修改时间变化)
+    output.write_bytes(b"CUBE")
+    assert not manifest.is_current(*key, file_signature([source]), {'models': ['h08']}, [output])
+    # 输出被删除
+    output.unlink()
+    assert not manifest.is_current(*key, file_signature([source]), {'models': ['h08']}, [output])
+
+
+def test_forgotten_entry_is_rerun(recorded):
+    tmp_path, source, output = recorded
+    manifest = Manifest(tmp_path / "MANIFEST.json")
+    manifest.forget('means', 'grids_1_160.csv')
+    manifest.save()
+    # 中断后重新运行: 读取保存的清单，被删除的条目需要重新计算
+    assert not Manifest(tmp_path / "MANIFEST.json").is_current(
+        'means', 'grids_1_160.csv', file_signature([source]), {'models': ['h08']}, [output])
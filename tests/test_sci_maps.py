@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sci_maps import grid_step, grid_layers, layered_figure
+
+LAYERS = {'Delta_HA_Drought_1.0': "HA 干旱", 'Delta_CC_Drought_1.0': "CC 干旱"}
+
+
+def _frame():
+    # 0.5 度网格上的 4 个点，(101.0, 30.5) 没有网格
+    return pd.DataFrame({
+        'Lon': [100.0, 100.5, 101.0, 100.0], 'Lat': [30.0, 30.0, 30.0, 30.5],
+        'Delta_HA_Drought_1.0': [1.0, 2.0, 3.0, 4.0], 'Delta_CC_Drought_1.0': [-1.0, -2.0, -3.0, -4.0],
+    })
+
+
+def test_grid_layers_place_points_on_regular_grid():
+    df = _frame()
+    assert grid_step(df['Lon']) == 0.5
+    lon_axis, lat_axis, layers = grid_layers(df, list(LAYERS))
+    np.testing.assert_allclose(lon_axis, [100.0, 100.5, 101.0])
+    np.testing.assert_allclose(lat_axis, [30.0, 30.5])
+    np.testing.assert_array_equal(layers['Delta_HA_Drought_1.0'], [[1, 2, 3], [4, np.nan, np.nan]])
+    assert layers['Delta_CC_Drought_1.0'].dtype == np.float32
+
+
+@pytest.mark.parametrize("mode", ["heatmap", "webgl"])
+def test_layered_figure_one_trace_per_layer(mode):
+    fig = layered_figure(_frame(), LAYERS, mode=mode)
+    assert [t.name for t in fig.data] == list(LAYERS)
+    assert [t.visible for t in fig.data] == [True, False]
+    buttons = fig.layout.updatemenus[0].buttons
+    assert [b.args[0]['visible'] for b in buttons] == [[True, False], [False, True]]
+    assert buttons[1].args[1]['title.text'] == "CC 干旱"
+
+
+def test_layered_figure_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        layered_figure(_frame(), LAYERS, mode="svg")
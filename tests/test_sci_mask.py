@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import sci_mask
+from sci_mask import load_mask, apply_mask
+from sci_synthetic import write_boundary
+
+SQUARE = [(100.0, 30.0), (102.0, 30.0), (102.0, 32.0), (100.0, 32.0)]
+
+
+def _grid(lons=(99.5, 100.5, 101.5, 102.5), lat=31.0):
+    return pd.DataFrame({'Grid_ID': range(1, len(lons) + 1), 'Lon': lons, 'Lat': [lat] * len(lons)})
+
+
+def _no_recompute(*args):
+    raise AssertionError("命中缓存时不应重新做空间连接")
+
+
+def test_mask_marks_points_inside_boundary(tmp_path):
+    shp = write_boundary(tmp_path / "boundary.shp", SQUARE)
+    mask = load_mask(_grid(), shp)
+    assert mask['Inside'].tolist() == [False, True, True, False]
+    assert mask['Region_ID'].tolist() == [-1, 0, 0, -1]
+
+    df = pd.DataFrame({'Grid_ID': [4, 3, 2, 1], 'Value': [4.0, 3.0, 2.0, 1.0]})
+    assert apply_mask(df, mask)['Grid_ID'].tolist() == [3, 2]
+
+
+def test_mask_cache_hit_and_invalidation(tmp_path, monkeypatch):
+    shp = write_boundary(tmp_path / "boundary.shp", SQUARE)
+    first = load_mask(_grid(), shp)
+    assert len(list((tmp_path / sci_mask.MASK_CACHE_DIR_NAME).glob("CHINA_MASK_*.csv"))) == 1
+
+    # 同一 shapefile、同一网格: 直接读缓存
+    monkeypatch.setattr(sci_mask, '_compute_mask', _no_recompute)
+    pd.testing.assert_frame_equal(load_mask(_grid(), shp), first)
+
+    # 网格定义或 shapefile 内容变化: 缓存键不同，重新计算
+    with pytest.raises(AssertionError):
+        load_mask(_grid(lons=(99.5, 100.5, 101.5, 103.5)), shp)
+    write_boundary(shp, [(99.0, 30.0), (102.0, 30.0), (102.0, 32.0), (99.0, 32.0)])
+    with pytest.raises(AssertionError):
+        load_mask(_grid(), shp)
+
+    monkeypatch.undo()
+    assert load_mask(_grid(), shp)['Inside'].tolist() == [True, True, True, False]
+    assert len(list((tmp_path / sci_mask.MASK_CACHE_DIR_NAME).glob("CHINA_MASK_*.csv"))) == 2
@@ -0,0 +1,46 @@
+from sci_metrics import StageTimer, profiled, keep_slowest, run_profile_dir, read_metrics, MetricsLog, RUN_ID_ENV
+
+
+def _work(n):
+    return sum(range(n))
+
+
+def test_keep_slowest_only_touches_this_run(tmp_path, monkeypatch):
+    monkeypatch.setenv(RUN_ID_ENV, "run-1")
+    old = run_profile_dir(tmp_path)
+    profiled(old, "grids_1_160.csv", _work, 10)
+
+    monkeypatch.setenv(RUN_ID_ENV, "run-2")
+    profile_dir = run_profile_dir(tmp_path)
+    assert profile_dir != old
+    # 同一目录中不属于本次运行的文件也保持不变
+    profiled(profile_dir, "other.csv", _work, 10)
+    records = []
+    for name, n in (("grids_1_160.csv", 10), ("grids_161_320.csv", 200_000), ("grids_321_400.csv", 100)):
+        with StageTimer("means.batch", batch=name) as timer:
+            assert profiled(profile_dir, name, _work, n) == sum(range(n))
+        records.append(timer.record)
+    records[1]['wall_s'] = 9.0
+
+    assert keep_slowest(profile_dir, records, keep=1) == ["grids_161_320.csv"]
+    assert sorted(p.name for p in profile_dir.iterdir()) == [
+        "grids_161_320.csv.pstats", "grids_161_320.csv.txt", "other.csv.pstats"]
+    assert [p.name for p in old.iterdir()] == ["grids_1_160.csv.pstats"]
+
+
+def test_metrics_log_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv(RUN_ID_ENV, "run-1")
+    log = MetricsLog(tmp_path / "PIPELINE_METRICS.jsonl")
+    with log.stage("means.total") as timer:
+        with timer.phase("read"):
+            _work(1000)
+        timer.add(rows=10, bytes_read=100)
+    monkeypatch.setenv(RUN_ID_ENV, "run-2")
+    log.finish(log.start("means.total"))
+
+    records = read_metrics([log.path], run="run-1")
+    assert len(records) == 1
+    assert records[0]['rows'] == 10 and records[0]['bytes_read'] == 100
+    assert set(records[0]['phases']) == set(records[0]['phases_cpu']) == {"read"}
+    assert records[0]['phases_cpu']['read'] <= records[0]['cpu_s'] + 1e-3
+    assert len(read_metrics([log.path])) == 2
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from sci_index import compute_sci
+from sci_netcdf import (build_grid_index, china_qtot, batch_suffixes, suffix_grid_range, read_model_batch,
+                        open_model_qtot)
+
+LON = np.array([100.25, 100.75, 101.25])
+LAT = np.array([31.25, 30.75, 30.25, 29.75])  # ISIMIP: 从北到南
+
+
+def _write_qtot(nc_dir, model="h08", seed=0):
+    """两个十年文件 (1975-1984, 1985-2014)，格点 (100.75, 30.75) 没有数据。"""
+    rng = np.random.default_rng(seed)
+    time = pd.date_range("1975-01-01", "2014-12-01", freq="MS")
+    qtot = rng.gamma(2.0, 1e-5, size=(len(time), len(LAT), len(LON)))
+    qtot[:, 1, 1] = np.nan
+    ds = xr.Dataset({'qtot': (('time', 'lat', 'lon'), qtot)}, coords={'time': time, 'lat': LAT, 'lon': LON})
+    split = np.searchsorted(time, pd.Timestamp("1985-01-01"))
+    for part, name in ((slice(None, split), "1975_1984"), (slice(split, None), "1985_2014")):
+        ds.isel(time=part).to_netcdf(nc_dir / f"{model}_gswp3-w5e5_obsclim_histsoc_default_qtot_global_monthly_{name}.nc")
+    return ds
+
+
+def test_grid_index_matches_r_numbering(tmp_path):
+    _write_qtot(tmp_path)
+    with open_model_qtot(tmp_path, "h08") as ds:
+        da = china_qtot(ds)
+        assert str(da['time'].values[0])[:7] == "1980-01"
+        grid = build_grid_index(da)
+
+    # 经度从西到东，同一经度内纬度从北到南，跳过没有数据的格点
+    expected = [(lon, lat) for lon in LON for lat in LAT if (lon, lat) != (100.75, 30.75)]
+    assert grid['Grid_ID'].tolist() == list(range(1, len(expected) + 1))
+    assert list(zip(grid['Lon'], grid['Lat'])) == expected
+
+    suffixes = batch_suffixes(grid, 5)
+    assert suffixes == ["grids_1_5.csv", "grids_6_10.csv", "grids_11_11.csv"]
+    assert suffix_grid_range(suffixes[1]) == (6, 10)
+
+
+def test_read_model_batch_long_format(tmp_path):
+    source = _write_qtot(tmp_path)
+    with open_model_qtot(tmp_path, "h08") as ds:
+        grid = build_grid_index(china_qtot(ds))
+    rows = grid.iloc[2:4]
+
+    df = read_model_batch(tmp_path, "h08", rows)
+    assert list(df.columns) == ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+    assert df['Date'].iloc[0] == "1980-01-01" and df['Date'].iloc[-1] == "2014-12-01"
+    n_month = 35 * 12
+    assert len(df) == len(rows) * n_month
+
+    period = source['qtot'].sel(time=slice("1980-01-01", "2014-12-31"))
+    for i, (gid, lon, lat) in enumerate(rows.itertuples(index=False)):
+        block = df.iloc[i * n_month:(i + 1) * n_month]
+        assert (block['Grid_ID'] == gid).all()
+        qtot = period.sel(lon=lon, lat=lat).values
+        np.testing.assert_array_equal(block['Qtot'].to_numpy(), qtot)
+        np.testing.assert_allclose(block['SCI'].to_numpy(), compute_sci(qtot[None, :], block['Date'].to_numpy())[0])
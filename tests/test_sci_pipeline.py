@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from sci_pipeline import STATUS_OK, STATUS_FAILED, STATUS_SKIPPED, load_config, build_stages, run_pipeline
+
+
+def _config(tmp_path, **extra):
+    config = {
+        'scenarios': {key: {'dir': str(tmp_path / key), 'name': f"scen-{key}"} for key in ('1901', 'hist', 'obs')},
+        'drivers': {'HA': ['hist', '1901'], 'CC': ['obs', 'hist']},
+        'shapefile': str(tmp_path / "boundary.shp"),
+        'attribution_dir': str(tmp_path / "ATTR"),
+        'maps_dir': str(tmp_path / "MAPS"),
+    }
+    config.update(extra)
+    path = tmp_path / "pipeline_config.json"
+    path.write_text(json.dumps(config), encoding='utf-8')
+    return path
+
+
+def _write_ratio_stats(tmp_path):
+    for key in ('1901', 'hist', 'obs'):
+        (tmp_path / key).mkdir(exist_ok=True)
+        (tmp_path / key / f"scen-{key}_RATIO_STATS.csv").write_text("Grid_ID,Lon,Lat\n", encoding='utf-8')
+
+
+def test_stage_graph(tmp_path):
+    _write_ratio_stats(tmp_path)
+    config = load_config(_config(tmp_path, percentile_reference='1901', memory_budget_gb=8))
+    stages = build_stages(config)
+
+    assert stages['means:hist']['deps'] == []
+    assert stages['means:hist']['overrides']['memory_budget_gb'] == 4
+    # 百分位切点来自参考情景，所以还要等它的 means
+    assert stages['frequency:hist']['deps'] == ["means:hist", "means:1901"]
+    assert stages['attribution']['deps'] == ["frequency:1901", "frequency:hist", "frequency:obs"]
+    # 地图读取 R 导出的 RATIO_STATS，不依赖任何阶段
+    assert stages['maps']['deps'] == []
+    assert stages['maps']['overrides']['scenario_paths']['obs'].endswith("scen-obs_RATIO_STATS.csv")
+    assert stages['significance']['deps'] == ["means:1901", "means:hist", "means:obs", "attribution"]
+
+    # 只运行部分阶段时，依赖只指向选中的阶段
+    config = load_config(_config(tmp_path, stages=["attribution", "maps"]))
+    assert {k: v['deps'] for k, v in build_stages(config).items()} == {'attribution': [], 'maps': []}
+
+
+def test_config_errors(tmp_path):
+    # 缺少 RATIO_STATS 时在启动前报错
+    with pytest.raises(ValueError, match="RATIO_STATS"):
+        load_config(_config(tmp_path))
+    assert load_config(_config(tmp_path, stages=["means", "frequency"]))['stages'] == ["means", "frequency"]
+    with pytest.raises(ValueError, match="未定义的情景"):
+        load_config(_config(tmp_path, drivers={'X': ['hist', 'ssp585']}, stages=["attribution"]))
+    with pytest.raises(ValueError, match="未知的阶段"):
+        load_config(_config(tmp_path, stages=["plots"]))
+
+
+def test_failed_stage_skips_downstream(tmp_path):
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    (scripts / "ok.py").write_text("print('ok')\n", encoding='utf-8')
+    (scripts / "fail.py").write_text("raise SystemExit(1)\n", encoding='utf-8')
+    stages = {
+        'means:a': dict(script="ok.py", overrides={}, deps=[]),
+        'means:b': dict(script="fail.py", overrides={}, deps=[]),
+        'frequency:a': dict(script="ok.py", overrides={}, deps=['means:a']),
+        'frequency:b': dict(script="ok.py", overrides={}, deps=['means:b']),
+        'attribution': dict(script="ok.py", overrides={}, deps=['frequency:a', 'frequency:b']),
+    }
+    results = run_pipeline(stages, scripts, tmp_path / "logs", max_parallel=2, on_event=lambda msg: None)
+    assert {k: v['status'] for k, v in results.items()} == {
+        'means:a': STATUS_OK, 'means:b': STATUS_FAILED, 'frequency:a': STATUS_OK,
+        'frequency:b': STATUS_SKIPPED, 'attribution': STATUS_SKIPPED,
+    }
+    assert (tmp_path / "logs" / "means_a.log").read_text(encoding='utf-8').strip() == "ok"
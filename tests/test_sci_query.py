@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sci_query import QueryEngine, handle_query
+from sci_store import STORE_DIR_NAME, long_to_cube, write_batch, consolidate
+
+
+@pytest.fixture
+def engine(tmp_path, long_frame):
+    df = long_frame(n_grid=4, n_month=12)
+    df['Lon'] = np.repeat([100.0, 100.5, 101.0, 101.5], 12)
+    df['Lat'] = 30.0
+    store = tmp_path / "hist" / STORE_DIR_NAME
+    write_batch(store, "grids_1_4.csv", long_to_cube(df))
+    consolidate(store)
+
+    csv_path = tmp_path / "FINAL_ATTRIBUTION_STATS_CHINA_ONLY.csv"
+    pd.DataFrame({'Grid_ID': [3, 1, 2, 4], 'Lon': [101.0, 100.0, 100.5, 101.5], 'Lat': [30.0] * 4,
+                  'Delta_HA_Drought_1.0': [3.0, 1.0, np.nan, 4.0], 'RR_HA_Drought_1.0': [np.inf, 1.0, 2.0, 0.5]}
+                 ).to_csv(csv_path, index=False)
+    return QueryEngine(csv_path, {'hist': tmp_path / "hist"})
+
+
+def test_grid_query(engine):
+    status, result = handle_query(engine, "/grid?id=2")
+    assert status == 200
+    assert result['Grid_ID'] == 2 and result['Lon'] == 100.5
+    # NaN / inf 转为 null，结果是合法 JSON
+    assert result['values'] == {'Delta_HA_Drought_1.0': None, 'RR_HA_Drought_1.0': 2.0}
+    assert len(result['series']['hist']) == len(result['dates']) == 12
+    json.dumps(result, allow_nan=False)
+
+    status, result = handle_query(engine, "/grid?id=3&series=0&columns=RR_HA_Drought_1.0")
+    assert status == 200
+    assert result['values'] == {'RR_HA_Drought_1.0': None} and 'series' not in result
+
+
+def test_bbox_and_nearest(engine):
+    status, result = handle_query(engine, "/bbox?lon_min=100.2&lon_max=101.2&lat_min=29&lat_max=31")
+    assert status == 200
+    assert [g['Grid_ID'] for g in result['grids']] == [2, 3]
+
+    status, result = handle_query(engine, "/nearest?lon=101.4&lat=30&k=2&series=0")
+    assert status == 200
+    assert [g['Grid_ID'] for g in result['grids']] == [4, 3]
+    assert result['grids'][0]['distance_km'] < result['grids'][1]['distance_km']
+
+    assert handle_query(engine, "/columns") == (200, ['Delta_HA_Drought_1.0', 'RR_HA_Drought_1.0'])
+
+
+def test_error_statuses(engine):
+    assert handle_query(engine, "/grid?id=99")[0] == 404
+    assert handle_query(engine, "/unknown")[0] == 404
+    assert handle_query(engine, "/grid")[0] == 400
+    assert handle_query(engine, "/grid?id=abc")[0] == 400
+    assert handle_query(engine, "/nearest?lon=100&lat=30&k=0")[0] == 400
+    assert handle_query(engine, "/grid?id=1&columns=Nope")[0] == 400
+
+
+def test_unexpected_failure_returns_500(engine, monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError("缓存文件损坏")
+    monkeypatch.setattr(engine, 'grid', broken)
+    status, result = handle_query(engine, "/grid?id=1")
+    assert status == 500
+    assert "缓存文件损坏" in result['error']
+    # 服务继续可用
+    assert handle_query(engine, "/columns")[0] == 200
@@ -0,0 +1,68 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+import sci_region
+from sci_region import load_membership, region_aggregate, cell_area_km2
+
+
+def _write_regions(path):
+    # 两个区域: 西 (100-101E) 和东 (101-102E)，东区由两个多边形组成；纬度 30-31N
+    layer = gpd.GeoDataFrame({'name': ["West", "East", "East"]},
+                             geometry=[box(100, 30, 101, 31), box(101, 30, 101.5, 31), box(101.5, 30, 102, 31)],
+                             crs="EPSG:4326")
+    layer.to_file(path)
+    return path
+
+
+def _grid_frame():
+    # 0.5 度网格中心: 每个区域 4 个，另有一个在区域外 (Grid_ID 9)
+    lon = [100.25, 100.75, 100.25, 100.75, 101.25, 101.75, 101.25, 101.75, 105.25]
+    lat = [30.25, 30.25, 30.75, 30.75, 30.25, 30.25, 30.75, 30.75, 30.25]
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'Grid_ID': range(1, 10), 'Lon': lon, 'Lat': lat,
+                       'A': rng.normal(size=9), 'B': rng.integers(0, 9, size=9).astype(float)})
+    df.loc[1, 'A'] = np.nan
+    return df
+
+
+def test_point_aggregate_matches_groupby(tmp_path):
+    shp = _write_regions(tmp_path / "regions.shp")
+    df = _grid_frame()
+    membership = load_membership(df, shp, id_column='name', mode="point")
+    assert membership.regions == ["East", "West"]
+    out = region_aggregate(membership, df, ['A', 'B'])
+
+    # 原来的做法: 空间连接后按区域 groupby，均值按网格面积加权，NaN 不计入
+    region = np.where(df['Lon'] < 101, "West", np.where(df['Lon'] < 102, "East", None))
+    inside = df.assign(Region=region, Area=cell_area_km2(df['Lat'], 0.5, 0.5)).dropna(subset=['Region'])
+    for col in ('A', 'B'):
+        got = out[out['Indicator'] == col].set_index('Region')
+        valid = inside.dropna(subset=[col])
+        total = valid.groupby('Region')[col].sum()
+        mean = (valid[col] * valid['Area']).groupby(valid['Region']).sum() / valid.groupby('Region')['Area'].sum()
+        np.testing.assert_allclose(got.loc[total.index, 'Total'], total)
+        np.testing.assert_allclose(got.loc[mean.index, 'Mean'], mean)
+        assert got.loc[total.index, 'N_Grids'].tolist() == valid.groupby('Region').size().tolist()
+    np.testing.assert_allclose(out.groupby('Region')['Area_km2'].first().sort_index(),
+                               inside.groupby('Region')['Area'].sum().sort_index())
+
+
+def test_area_weights_split_cells(tmp_path, monkeypatch):
+    shp = _write_regions(tmp_path / "regions.shp")
+    # 网格单元 (101.0 ± 0.25) 跨过东西两区的边界: 各占一半
+    df = pd.DataFrame({'Grid_ID': [1, 2], 'Lon': [101.0, 101.5], 'Lat': [30.5, 30.5], 'A': [4.0, np.nan]})
+    membership = load_membership(df, shp, id_column='name', mode="area")
+    np.testing.assert_allclose(membership.weights.toarray(), [[0.5, 0.5], [1.0, 0.0]])
+    out = region_aggregate(membership, df, ['A']).set_index('Region')
+    np.testing.assert_allclose(out['Total'], [2.0, 2.0])
+    np.testing.assert_allclose(out['Mean'], [4.0, 4.0])
+
+    # 第二次直接读取缓存的稀疏矩阵
+    def no_recompute(*args):
+        raise AssertionError("命中缓存时不应重新计算隶属矩阵")
+    monkeypatch.setattr(sci_region, '_compute_membership', no_recompute)
+    cached = load_membership(df, shp, id_column='name', mode="area")
+    assert cached.regions == membership.regions
+    np.testing.assert_allclose(cached.weights.toarray(), membership.weights.toarray())
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from sci_scan import STATUS_OK, STATUS_INCOMPLETE, STATUS_MISSING, _count_lines, scan_file, fill_gaps
+
+COLUMNS = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+DATES = pd.date_range("1980-01-01", periods=3, freq="MS").strftime("%Y-%m-%d").to_numpy()
+
+
+def _rows(grids=(1, 2)):
+    return [f"{g},100.0,30.0,{d},0.5,0.1" for g in grids for d in DATES]
+
+
+def _task(path):
+    return dict(scenario="hist", model="h08", suffix="grids_1_2.csv", path=str(path), column_names=COLUMNS, dates=DATES)
+
+
+def test_blank_lines_are_not_bad_lines(tmp_path):
+    path = tmp_path / "h08_grids_1_2.csv"
+    rows = _rows()
+    lines = [",".join(COLUMNS)] + rows[:2] + ["", "  "] + rows[2:] + [""]
+    path.write_bytes("\r\n".join(lines).encode('latin-1') + b"\n\n")
+
+    # 块边界切在行中间时结果不变
+    for block_size in (1 << 20, 7, 1):
+        assert _count_lines(path, block_size) == (len(rows), len(rows) * (len(COLUMNS) - 1))
+    report = scan_file(_task(path))
+    assert report['Status'] == STATUS_OK, report['Issue']
+    assert report['Bad_Lines'] == 0 and report['Rows'] == len(rows)
+
+
+def test_bad_and_missing_rows_are_reported(tmp_path):
+    path = tmp_path / "h08_grids_1_2.csv"
+    lines = [",".join(COLUMNS)] + _rows(grids=(1,)) + ["1,2,3,4,5,6,7,8"]
+    path.write_text("\n".join(lines), encoding='latin-1')  # 最后一行没有换行符
+
+    report = scan_file(_task(path))
+    assert report['Status'] == STATUS_INCOMPLETE
+    assert report['Bad_Lines'] == 1
+    assert report['Missing_Grids'] == 1 and report['Missing_Months'] == len(DATES)
+
+    missing = scan_file(_task(tmp_path / "h08_grids_3_4.csv"))
+    assert missing['Status'] == STATUS_MISSING
+
+
+def test_fill_gaps():
+    assert fill_gaps({"grids_1_160.csv", "grids_481_640.csv", "grids_641_700.csv"}) == [
+        "grids_1_160.csv", "grids_161_320.csv", "grids_321_480.csv", "grids_481_640.csv", "grids_641_700.csv"]
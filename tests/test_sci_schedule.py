@@ -0,0 +1,39 @@
+from sci_schedule import estimate_task_bytes, plan_tasks
+
+COLUMNS = ['Grid_ID', 'Lon', 'Lat', 'Date', 'Qtot', 'SCI']
+
+
+def test_plan_tasks_splits_to_budget():
+    rows = {"grids_1_100.csv": [10_000] * 7, "grids_101_120.csv": [100] * 7}
+    whole = estimate_task_bytes(rows["grids_1_100.csv"], COLUMNS)
+    tasks, workers = plan_tasks(rows, COLUMNS, whole, max_workers=4)
+
+    big = [t for t in tasks if t['source'] == "grids_1_100.csv"]
+    assert len(big) > 1
+    # 子范围连续且覆盖整个源文件
+    ranges = [t['grid_range'] for t in big]
+    assert ranges[0][0] == 1 and ranges[-1][1] == 100
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(t['suffix'] == f"grids_{lo}_{hi}.csv" for t, (lo, hi) in zip(big, ranges))
+    assert all(t['bytes'] <= whole / 4 and not t['over_budget'] for t in tasks)
+
+    small = [t for t in tasks if t['source'] == "grids_101_120.csv"]
+    assert small == [dict(source="grids_101_120.csv", suffix="grids_101_120.csv", grid_range=None,
+                          bytes=estimate_task_bytes(rows["grids_101_120.csv"], COLUMNS), over_budget=False)]
+    assert 1 <= workers <= 4
+
+
+def test_plan_tasks_flags_budget_too_small():
+    # 拆到每个子批次一个网格仍超出预算: 标记 over_budget 而不是静默超出
+    rows = {"grids_1_2.csv": [10_000] * 7}
+    tasks, workers = plan_tasks(rows, COLUMNS, 1, max_workers=2)
+    assert [t['grid_range'] for t in tasks] == [(1, 1), (2, 2)]
+    assert all(t['over_budget'] for t in tasks)
+    assert workers == 1
+
+
+def test_plan_tasks_without_budget():
+    rows = {"grids_1_2.csv": [10] * 7}
+    tasks, workers = plan_tasks(rows, COLUMNS, None, max_workers=3)
+    assert [t['grid_range'] for t in tasks] == [None]
+    assert workers == 3
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from sci_store import (PARTIAL_STEM, long_to_cube, write_batch, consolidate, open_cube, batch_files,
+                       allocate_shared_cube, write_shared_rows, finalize_shared_cube, discard_shared_cube)
+
+
+def test_cube_round_trip(tmp_path, long_frame):
+    df = long_frame(n_grid=10)
+    first = long_to_cube(df[df['Grid_ID'] <= 4])
+    second = long_to_cube(df[df['Grid_ID'] > 4])
+    # 批次写入顺序与 Grid_ID 顺序无关
+    write_batch(tmp_path, "grids_5_10.csv", second)
+    write_batch(tmp_path, "grids_1_4.csv", first)
+    consolidate(tmp_path)
+
+    cube = open_cube(tmp_path)
+    expected = long_to_cube(df)
+    assert np.array_equal(cube.grid, expected.grid)
+    assert np.array_equal(cube.dates, expected.dates)
+    np.testing.assert_array_equal(cube.values, expected.values)
+
+
+def test_long_to_cube_averages_duplicates(long_frame):
+    df = long_frame(n_grid=2, n_month=3)
+    df.loc[0, 'Mean_SCI'] = 1.0
+    dup = df.iloc[[0]].assign(Mean_SCI=2.0)
+    cube = long_to_cube(pd.concat([df, dup], ignore_index=True))
+    assert cube.values[0, 0] == np.float32(1.5)
+
+
+def test_shared_cube_round_trip(tmp_path, long_frame):
+    df = long_frame(n_grid=10)
+    expected = long_to_cube(df)
+    # 两个批次: Grid_ID 1-4 在第 0 行开始，5-12 在第 4 行开始 (11、12 不存在，留空)
+    allocate_shared_cube(tmp_path, 12, expected.dates)
+    write_shared_rows(tmp_path, 4, 5, long_to_cube(df[df['Grid_ID'] > 4]))
+    write_shared_rows(tmp_path, 0, 1, long_to_cube(df[df['Grid_ID'] <= 4]))
+    assert finalize_shared_cube(tmp_path) == 10
+
+    cube = open_cube(tmp_path)
+    assert np.array_equal(cube.grid, expected.grid)
+    np.testing.assert_array_equal(cube.values, expected.values)
+    assert not any(p.exists() for p in batch_files(tmp_path, PARTIAL_STEM))
+
+
+def test_discard_shared_cube(tmp_path, long_frame):
+    allocate_shared_cube(tmp_path, 4, long_to_cube(long_frame(n_grid=4)).dates)
+    discard_shared_cube(tmp_path)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from sci_frequency import DEFAULT_THRESHOLDS, frequency_frame, parse_threshold
+from sci_store import long_to_cube
+from sci_threshold import (curve_levels, curve_columns, curve_frame, exceedance_curve, percentile_thresholds,
+                           grid_cutoffs)
+
+
+def test_curve_columns_use_frequency_names():
+    levels = curve_levels(3.0, 0.05)
+    columns = curve_columns(levels)
+    assert columns[:3] == ["Drought_0.0", "Drought_0.05", "Drought_0.1"]
+    assert columns[-1] == "Flood_3.0"
+    assert set(DEFAULT_THRESHOLDS) <= set(columns)
+    # 列名可解析回原来的切点
+    assert [parse_threshold(c)[1] for c in columns[len(levels):]] == list(levels)
+
+
+def test_exceedance_curve_matches_direct_comparison(long_frame):
+    cube = long_to_cube(long_frame(n_grid=6, n_month=48, seed=1))
+    values = np.asarray(cube.values)
+    levels = curve_levels(2.0, 0.25)
+    drought, flood = exceedance_curve(values, levels)
+    for j, level in enumerate(levels.astype(np.float32)):
+        np.testing.assert_array_equal(drought[:, j], (values <= -level).sum(axis=1))
+        np.testing.assert_array_equal(flood[:, j], (values >= level).sum(axis=1))
+
+    # 阈值网格不必有序
+    shuffled = levels[[3, 0, 8, 1, 5, 2, 7, 4, 6]]
+    d2, f2 = exceedance_curve(values, shuffled)
+    order = np.searchsorted(levels, shuffled)
+    np.testing.assert_array_equal(d2, drought[:, order])
+    np.testing.assert_array_equal(f2, flood[:, order])
+
+    # 与频率文件中同名列的次数相同
+    curve = curve_frame(cube, levels)
+    stats = frequency_frame(cube, DEFAULT_THRESHOLDS)
+    for name in DEFAULT_THRESHOLDS:
+        np.testing.assert_array_equal(curve[name], stats[name])
+
+
+def test_percentile_thresholds_per_grid(long_frame):
+    df = long_frame(n_grid=4, n_month=120, seed=3)
+    cube = long_to_cube(df)
+    table = percentile_thresholds(cube, ["Drought_Q10", "Flood_1.0", "Flood_Q95"], reference=("1980-01-01", "1984-12-01"))
+    assert list(table.columns) == ['Grid_ID', 'Lon', 'Lat', 'Drought_Q10', 'Flood_Q95']
+
+    ref = df[df['Date'] <= "1984-12-01"]
+    expected = ref.groupby('Grid_ID')['Mean_SCI'].quantile([0.10, 0.95]).unstack()
+    np.testing.assert_allclose(table['Drought_Q10'], expected[0.10].astype(np.float32), rtol=1e-5)
+    np.testing.assert_allclose(table['Flood_Q95'], expected[0.95].astype(np.float32), rtol=1e-5)
+
+    # 按 Grid_ID 对齐: 参考情景中没有的网格、固定阈值的列为 NaN
+    cutoffs = grid_cutoffs(table, ["Flood_Q95", "Flood_1.0"], [4, 99, 1])
+    np.testing.assert_array_equal(cutoffs[[0, 2], 0], table.set_index('Grid_ID').loc[[4, 1], 'Flood_Q95'])
+    assert np.isnan(cutoffs[1]).all() and np.isnan(cutoffs[:, 1]).all()
+    pd.testing.assert_frame_equal(table[['Grid_ID']], cube.grid_frame()[['Grid_ID']])
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from sci_windows import build_windows, season_years, DEFAULT_SEASONS
+
+
+def test_december_belongs_to_following_winter():
+    dates = np.asarray(pd.date_range("1980-01-01", "1982-12-01", freq="MS").strftime("%Y-%m-%d"))
+    sy = season_years(dates, DEFAULT_SEASONS, "DJF")
+    assert sy[dates.tolist().index("1980-12-01")] == 1981
+    assert sy[dates.tolist().index("1981-01-01")] == 1981
+
+    windows = build_windows(dates, seasons={"DJF": DEFAULT_SEASONS["DJF"]}).set_index('Window')
+    djf = windows.loc["DJF"]
+    # 1980 年的冬季缺少 1979 年 12 月，1983 年的冬季只有 1982 年 12 月: 都不完整，去掉
+    assert (djf['Start_Year'], djf['End_Year']) == (1981, 1982)
+    assert djf['N_Months'] == 6
+    # 窗口按季节年切片，其中属于 DJF 的月份正好是两个完整的冬季
+    months = dates[djf['start']:djf['end']]
+    assert [d for d in months if d[5:7] in ("12", "01", "02")] == [
+        "1980-12-01", "1981-01-01", "1981-02-01", "1981-12-01", "1982-01-01", "1982-02-01"]